@@ -1,13 +1,46 @@
 ﻿import os
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, Response, request, jsonify, render_template, send_file, stream_with_context, url_for
+import asyncio
+import contextvars
+import cProfile
+import gc
+import hashlib
+import hmac
+import html
+import secrets
 import time
 import re
 import requests
-from functools import lru_cache
-from typing import Dict, Any, Optional, Tuple, List
+import threading
+from functools import lru_cache, wraps
+from typing import Dict, Any, Optional, Tuple, List, Generator, Iterator
 from Bio.Seq import Seq
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook, load_workbook
 import io
+import pstats
+import sys
+import tempfile
+import json
+import sqlite3
+import zlib
+import gzip
+import uuid
+from collections import Counter, OrderedDict, deque
+from concurrent import futures
+from itertools import chain, islice
+from contextlib import contextmanager
+from urllib.parse import quote
+
+try:
+    import httpx  # only needed for the async assessment path (asgi.py)
+except ImportError:
+    httpx = None
+try:
+    import orjson  # faster API serialization; the json module is used without it
+except ImportError:
+    orjson = None
 
 # --- Template Setup ---
 # This section will automatically create the necessary HTML files in a 'templates' folder.
@@ -79,8 +112,8 @@ def setup_templates():
         button:hover{background:var(--primary-dark)}
         .result-header{border-radius:10px 10px 0 0}
         .result-header h4{font-size:1.2em;letter-spacing:.2px}
-        .accordion-toggle .chevron{display:inline-block;margin-left:.4em;transition:transform .2s ease}
-        .accordion-toggle.open .chevron{transform:rotate(180deg)}
+        .accordion-toggle .chevron, .viewer-toggle .chevron{display:inline-block;margin-left:.4em;transition:transform .2s ease}
+        .accordion-toggle.open .chevron, .viewer-toggle.open .chevron{transform:rotate(180deg)}
         /* Rounded corners when collapsed; squared bottom when open */
         .accordion-toggle{border-radius:10px}
         .accordion-toggle.open{border-radius:10px 10px 0 0}
@@ -223,12 +256,25 @@ def setup_templates():
     .splice-prompt-buttons button.no-btn { background-color: #dc3545; }
     .splice-prompt-buttons button.no-btn:hover { background-color: #c82333; }
     .warning { color: #dc3545; font-weight: 600; }
+    #batch-status { margin: 0.75em 0; font-size: 0.9em; }
+    #batch-table-wrap { max-height: 420px; overflow: auto; }
+    #batch-table { border-collapse: collapse; width: 100%; font-size: 0.85em; }
+    #batch-table th, #batch-table td { border: 1px solid #e5e7eb; padding: 4px 6px; text-align: left; }
+    #batch-table th { position: sticky; top: 0; background: #f8fafc; }
+    body.dark #batch-table th { background: #111827; }
+    body.dark #batch-table th, body.dark #batch-table td { border-color: #1f2937; }
+    #all-transcripts-option { display: block; margin: 0.5em 0; font-size: 0.9em; }
+    .transcript-comparison { border-collapse: collapse; width: 100%; font-size: 0.85em; margin-top: 0.5em; }
+    .transcript-comparison th, .transcript-comparison td { border: 1px solid #e5e7eb; padding: 4px 6px; text-align: left; vertical-align: top; }
+    .transcript-comparison tr.primary td { font-weight: 600; }
+    body.dark .transcript-comparison th, body.dark .transcript-comparison td { border-color: #1f2937; }
 </style>
 
 <h3>AVEC: Automated Variant Eligibility Calculator</h3>
 <p>Enter a variant to assess its eligibility for ASO therapy.</p>
 <p class="warning">Results depend on underlying data sources and external services and may be incomplete or unavailable. This tool does not replace clinical judgement or a physician!</p>
 <form id="assessment-form"> <label for="query">Variant:</label> <input id="query" required placeholder="e.g., NM_015427.4:c.1054G>A"> <button type="submit">Assess</button> </form>
+<label id="all-transcripts-option"><input type="checkbox" id="all-transcripts"> Compare exon skipping across all protein-coding transcripts</label>
 <div id="loader">Assessing...</div>
 <div id="results"></div>
 
@@ -239,14 +285,18 @@ def setup_templates():
 </h4>
 
 <div id="batch-content" style="display: none;">
-    <p>Upload a .csv, .txt, or .xlsx file with one variant per line in the first column.</p>
+    <p>Upload a .csv, .txt, or .xlsx file with one variant per line in the first column, or a VCF (.vcf or bgzipped .vcf.gz, GRCh38).</p>
     <form id="batch-form">
         <label for="batch-file">Batch File:</label>
-        <input type="file" id="batch-file" name="file" accept=".csv,.txt,.xlsx,.tsv" required>
+        <input type="file" id="batch-file" name="file" accept=".csv,.txt,.xlsx,.tsv,.vcf,.gz" required>
         <button type="submit">Process Batch</button>
     </form>
-    <div id="batch-loader" style="display:none; text-align: center; padding: 1em;">
-        Processing file... This may take several minutes for large files.
+    <div id="batch-status" style="display:none;"></div>
+    <div id="batch-table-wrap" style="display:none;">
+        <table id="batch-table">
+            <thead><tr><th>Row</th><th>Variant</th><th>Gene</th><th>Exon Skipping</th><th>Splice Correction</th><th>WT-Upregulation</th><th>Knockdown</th><th>Overall</th></tr></thead>
+            <tbody></tbody>
+        </table>
     </div>
 </div>
 
@@ -267,7 +317,8 @@ document.getElementById('assessment-form').addEventListener('submit', async func
     
     // Initial assessment payload contains only the query
     const payload = { 
-        query: document.getElementById('query').value 
+        query: document.getElementById('query').value,
+        all_transcripts: document.getElementById('all-transcripts').checked
         // splice_user_input is omitted, so backend defaults to DB check
     }; 
     
@@ -283,47 +334,101 @@ document.getElementById('assessment-form').addEventListener('submit', async func
     }
 });
 
+// Exon skipping of the variant's exon in each protein-coding transcript (all_transcripts)
+function transcriptComparisonTable(rows) {
+    let html = '<h5>Transcript Comparison</h5><table class="transcript-comparison"><thead><tr>' +
+        '<th>Transcript</th><th>Exon</th><th>Assessment</th><th>Checks Passed</th><th>Fraction of Protein</th><th>Overlapping Domains</th></tr></thead><tbody>';
+    for (const row of rows) {
+        const tags = [row.primary ? 'assessed' : '', row.mane_select ? 'MANE Select' : '', row.canonical ? 'canonical' : ''].filter(Boolean);
+        const checks = row.checks ? `${Object.values(row.checks).filter(Boolean).length}/${Object.keys(row.checks).length}` : '';
+        const exon = row.total_exon_number ? `${row.total_exon_number}${row.coding_exon_number ? ` (coding ${row.coding_exon_number})` : ''}` : '';
+        html += `<tr class="${row.primary ? 'primary' : ''}">` +
+            `<td>${row.transcript_id}${tags.length ? `<br><small>${tags.join(', ')}</small>` : ''}</td>` +
+            `<td>${exon}</td><td title="${(row.reason || '').replace(/"/g, '&quot;')}">${row.classification || 'N/A'}</td>` +
+            `<td>${checks}</td><td>${row.frac_cds || ''}</td><td>${(row.domain_names || []).join(', ')}</td></tr>`;
+    }
+    return html + '</tbody></table>';
+}
+
+// Batch results arrive as NDJSON events (start, row, progress, done, error) and are
+// rendered as they come; the workbook is offered for download at the end.
+const BATCH_TABLE_COLUMNS = ["Variant", "Gene", "Exon Skipping Assessment", "Splice Correction Assessment", "WT-Upregulation", "Knockdown", "Overall Eligibility"];
+
+function appendBatchRow(tbody, index, row) {
+    const tr = document.createElement('tr');
+    [index + 1, ...BATCH_TABLE_COLUMNS.map(c => row[c] ?? '')].forEach(value => {
+        const td = document.createElement('td');
+        td.textContent = value;
+        tr.appendChild(td);
+    });
+    tbody.appendChild(tr);
+}
+
+function showBatchProgress(status, event, finished) {
+    const rate = event.rows_per_s !== undefined ? `${event.rows_per_s.toFixed(1)} rows/s` : '';
+    status.textContent = `${finished ? 'Done' : 'Processing'}: ${event.rows} rows assessed in ${event.elapsed_s.toFixed(0)} s ${rate ? '(' + rate + ')' : ''}`;
+}
+
 document.getElementById('batch-form').addEventListener('submit', async function(e) {
     e.preventDefault();
-    const batchLoader = document.getElementById('batch-loader');
     const fileInput = document.getElementById('batch-file');
+    const status = document.getElementById('batch-status');
+    const tableWrap = document.getElementById('batch-table-wrap');
+    const tbody = document.querySelector('#batch-table tbody');
 
     if (fileInput.files.length === 0) {
         alert("Please select a file to upload.");
         return;
     }
 
-    batchLoader.style.display = 'block';
+    tbody.innerHTML = '';
+    status.textContent = 'Uploading and planning the batch...';
+    status.style.display = 'block';
+    tableWrap.style.display = 'block';
     const formData = new FormData();
     formData.append('file', fileInput.files[0]);
 
     try {
-        const response = await fetch('/batch_assess', {
+        const response = await fetch('/batch_assess?stream=ndjson', {
             method: 'POST',
             body: formData
         });
-
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.style.display = 'none';
-            a.href = url;
-            const timestamp = new Date().toISOString().slice(0, 19).replace(/[-T:]/g, "");
-            a.download = `avec_batch_results_${timestamp}.xlsx`;
-            document.body.appendChild(a);
-            a.click();
-            window.URL.revokeObjectURL(url);
-            a.remove();
-        } else {
+        if (!response.ok) {
             const errorData = await response.json();
-            alert(`Error processing file: ${errorData.error}`);
+            status.textContent = `Error processing file: ${errorData.error}`;
+            return;
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        const handle = (event) => {
+            if (event.event === 'row') {
+                appendBatchRow(tbody, event.index, event.row);
+            } else if (event.event === 'progress') {
+                showBatchProgress(status, event, false);
+            } else if (event.event === 'done') {
+                showBatchProgress(status, event, true);
+                const link = document.createElement('a');
+                link.href = event.download;
+                link.textContent = ' Download results (.xlsx)';
+                status.appendChild(link);
+            } else if (event.event === 'error') {
+                status.textContent = `Error processing file: ${event.error}`;
+            }
+        };
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\\n');
+            buffered = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => handle(JSON.parse(line)));
         }
+        if (buffered.trim()) handle(JSON.parse(buffered));
     } catch (error) {
         console.error("Batch fetch error:", error);
-        alert("A critical error occurred while communicating with the server.");
+        status.textContent = "A critical error occurred while communicating with the server.";
     } finally {
-        batchLoader.style.display = 'none';
         fileInput.value = '';
     }
 });
@@ -377,7 +482,8 @@ async function reassessWithSpliceInput(spliceInput) {
         query: document.getElementById('query').value,
         splice_user_input: spliceInput, // 'yes' or 'no'
         // include previously chosen MoA if available to avoid losing state
-        moa_user_input: window.userMoaInput
+        moa_user_input: window.userMoaInput,
+        all_transcripts: document.getElementById('all-transcripts').checked
     };
 
     try {
@@ -420,7 +526,8 @@ async function reassessWithMoaInput(moaChoice) {
         query: document.getElementById('query').value,
         moa_user_input: moaChoice, // 'GoF' or 'LoF'
         // include previously chosen splice input if available to avoid losing state
-        splice_user_input: window.userSpliceInput
+        splice_user_input: window.userSpliceInput,
+        all_transcripts: document.getElementById('all-transcripts').checked
     };
 
     try {
@@ -521,9 +628,13 @@ function displayResults(data) {
         const orphaURL = data.summary.gene ? `https://www.orpha.net/en/disease/gene/${encodeURIComponent(data.summary.gene)}` : null;
         const orphaLinkHTML = orphaURL ? `<a href="${orphaURL}" target="_blank" rel="noopener noreferrer">${data.summary.gene}</a>` : 'N/A';
 
+        if (data.warnings && data.warnings.length > 0) {
+            html += `<p class="note">${data.warnings.join('<br>')}</p>`;
+        }
         html += `<div class="summary-block"><h4>Query Summary</h4><ul>
                         <li><strong>Gene:</strong> ${geneHTML}</li>
                         <li><strong>Transcript:</strong> ${transcriptHTML}</li>
+                        ${data.summary.coordinates ? `<li><strong>Coordinates:</strong> GRCh38 ${data.summary.coordinates.GRCh38}${data.summary.coordinates.GRCh37 ? `, GRCh37 ${data.summary.coordinates.GRCh37}` : ''}</li>` : ''}
                         <li><strong>Mode of Inheritance:</strong> ${moiHTML}</li>
                         <li><strong>Haploinsufficiency:</strong> ${haploHTML}</li>
                         <li><strong>Orphanet:</strong> ${orphaLinkHTML}</li>
@@ -532,6 +643,11 @@ function displayResults(data) {
                         </ul></div>`;
     }
 
+    if (data.visualization_url) {
+        html += `<div id="viewer-toggle" class="result-header unable-to-assess viewer-toggle" style="cursor: pointer; user-select: none;">
+                     <h4>Genome Viewer <span class="chevron">&#9662;</span></h4>
+                 </div>`;
+    }
     html += '<div id="igv-container" style="display:none;"></div>';
     
     // Mechanism of Action block below visualization
@@ -730,6 +846,9 @@ function displayResults(data) {
                                 </ul></li>
                             </ul>`;
                 }
+                if (strategy === 'Exon_Skipping' && data.transcript_comparison) {
+                    html += transcriptComparisonTable(data.transcript_comparison);
+                }
                 html += `</div></div>`;
             }
             // --- END: MODIFIED LOGIC ---
@@ -826,8 +945,24 @@ function displayResults(data) {
         });
     });
 
-    if (data.visualization) {
-        renderIGV('igv-container', data.visualization);
+    // The viewer payload is fetched the first time the viewer is opened
+    const viewerToggle = document.getElementById('viewer-toggle');
+    if (viewerToggle) {
+        let viewerLoaded = false;
+        viewerToggle.addEventListener('click', function() {
+            const container = document.getElementById('igv-container');
+            const opening = !this.classList.contains('open');
+            this.classList.toggle('open', opening);
+            if (!opening) { container.style.display = 'none'; return; }
+            container.style.display = 'block';
+            if (viewerLoaded) return;
+            viewerLoaded = true;
+            container.textContent = 'Loading genome viewer...';
+            fetch(data.visualization_url)
+                .then(r => r.ok ? r.json() : Promise.reject(r.status))
+                .then(vis => renderIGV('igv-container', vis))
+                .catch(() => { viewerLoaded = false; container.textContent = 'Unable to load the genome viewer.'; });
+        });
     }
 }
 </script>
@@ -870,12 +1005,60 @@ function displayResults(data) {
 <ul>
     <li><strong>Parameter:</strong> <code>query</code></li>
     <li><strong>Description:</strong> The variant to assess in a recognized HGVS-like format.</li>
-    <li><strong>Examples:</strong> <code>NM_015427.4:c.1054G>A</code>, <code>FKTN c.1312G>A</code></li>
+    <li><strong>Examples:</strong> <code>NM_015427.4:c.1054G>A</code>, <code>FKTN c.1312G>A</code>, <code>chr9-105620775-G-A</code> (GRCh38 chrom-pos-ref-alt, VCF style), <code>GRCh37:chr9-108383055-G-A</code> or <code>NC_000009.11:g.108383055G>A</code> (GRCh37, lifted over to GRCh38 when the server has the chain file; see <code>liftover</code> in <code>/healthz</code>)</li>
+    <li><strong>Optional:</strong> <code>timings=1</code> adds a <code>timings</code> object with the total and per-stage time in milliseconds.</li>
+    <li><strong>Optional:</strong> <code>view=compact</code> returns the compact schema: classifications, strategies and checks as codes (e.g. <code>LIKELY_ELIGIBLE</code>, <code>exon_skipping</code>, <code>in_frame</code>), reasons as plain <code>text</code> with their <code>links</code>, and a <code>schema_version</code> (also in the <code>X-Schema-Version</code> header). The code lists are published at <code>{{ url_for('api_schema', _external=True) }}</code>.</li>
+    <li><strong>Optional:</strong> <code>transcripts=all</code> assesses the exon containing an exonic variant in every protein-coding transcript of the gene and adds a <code>transcript_comparison</code> list (transcript ID, MANE/canonical flags, exon numbers, classification, reason, checks, fraction of protein and overlapping domains; the first entry is the primary transcript).</li>
 </ul>
 
 <h4>Example Usage (cURL)</h4>
 <pre><code>curl -X GET "{{ url_for('api_assess', _external=True) }}?query=NM_000552.4:c.545G>A"</code></pre>
 
+<h4>API Keys and Quotas</h4>
+<p>
+    Send your API key in the <code>X-API-Key</code> header. Each key has a daily quota of assessments (a batch item counts as one; the quota resets at midnight UTC).
+    Responses carry <code>X-RateLimit-Limit</code> and <code>X-RateLimit-Remaining</code>; once the quota is used up, requests get HTTP 429 with <code>Retry-After</code>.
+    <code>GET {{ url_for('api_usage', _external=True) }}</code> shows your quota and recent usage. Requests without a key share a common quota.
+</p>
+
+<h4>Batch Requests</h4>
+<p>
+    <code>POST {{ url_for('api_assess_batch', _external=True) }}</code> assesses up to 1000 variants in one request through the batch pipeline
+    (duplicates are assessed once and VEP is queried in bulk). The body is a JSON list of queries, each a string or an object with
+    <code>query</code> and optional <code>splice_user_input</code> / <code>moa_user_input</code>. The <code>view</code>, <code>timings</code>
+    and <code>transcripts</code> parameters work as above. The response has a <code>results</code> list in input order
+    (<code>query</code>, <code>status</code> and either <code>result</code> or <code>error</code>) and the batch <code>totals</code>.
+    Send <code>Content-Encoding: gzip</code> to upload a compressed body; responses are compressed for <code>Accept-Encoding: gzip</code>.
+</p>
+<p>
+    A batch with more than 100 distinct queries runs as a job instead: the response is HTTP 202 with its <code>batch_id</code>.
+    Its status is listed by <code>GET {{ url_for('api_result_batches', _external=True) }}</code>, and once complete its rows
+    are returned by <code>GET {{ url_for('api_results', _external=True) }}?batch_id=...</code> (the <code>results_url</code> of the response).
+</p>
+<pre><code>curl --compressed -X POST "{{ url_for('api_assess_batch', _external=True) }}?view=compact" -H "Content-Type: application/json" \\
+     -d '["NM_000552.4:c.545G>A", {"query": "FKTN c.1312G>A", "splice_user_input": "no"}]'</code></pre>
+
+<h4>Past Batch Results</h4>
+<p>
+    Every completed batch is stored (its ID is returned in the <code>X-Batch-Id</code> header of the batch download).
+    <code>GET {{ url_for('api_results', _external=True) }}</code> returns stored rows, newest batch first, filtered by any of:
+</p>
+<ul>
+    <li><code>batch_id</code>, <code>variant</code>, <code>gene</code>, <code>transcript_id</code> (exact match)</li>
+    <li><code>exon_skipping</code>, <code>splice_switching</code>, <code>wt_upregulation</code>, <code>knockdown</code>, <code>overall</code>: a classification such as <code>Likely Eligible</code></li>
+    <li><code>existing_aso</code> and the exon skipping checks (<code>es_in_frame</code>, <code>es_no_domain_overlap</code>, ...): <code>true</code> or <code>false</code></li>
+    <li><code>limit</code> (default 100, at most 1000) and <code>offset</code> for paging</li>
+</ul>
+<pre><code>curl -G "{{ url_for('api_results', _external=True) }}" --data-urlencode "exon_skipping=Likely Eligible"</code></pre>
+<p><code>GET {{ url_for('api_result_batches', _external=True) }}</code> lists recent batches.</p>
+
+<h4>Genome Viewer Data</h4>
+<p>
+    Exonic assessments include a <code>visualization_url</code>. <code>GET /api/v1/visualization/&lt;transcript&gt;/&lt;variant&gt;</code>
+    (a variant as <code>chrom:start-end</code> in GRCh38, or a variant ID) returns the IGV payload used by the web viewer:
+    a <code>locus</code>, a <code>variantTrack</code> and a <code>domainTrack</code> with the transcript's protein domains in genomic coordinates.
+</p>
+
 <h4>Response</h4>
 <p>The API returns a JSON object containing the full assessment, structured identically to the data used by the web interface.</p>
 <ul>
@@ -909,7 +1092,7 @@ function displayResults(data) {
     "moi": [ "X-linked" ],
     "transcript_id": "ENST00000357033.9"
   },
-  "visualization": { ... }
+  "visualization_url": "/api/v1/visualization/ENST00000357033/X:31819974-31819974?name=..."
 }</code></pre>
 
 <h4>Fair Use</h4>
@@ -918,116 +1101,378 @@ function displayResults(data) {
 {% endblock %}
 """
 
-    # Write files with explicit UTF-8 encoding
-    with open('templates/base.html', 'w', encoding='utf-8') as f: f.write(base_html)
-    with open('templates/index.html', 'w', encoding='utf-8') as f: f.write(index_html)
-    with open('templates/about.html', 'w', encoding='utf-8') as f: f.write(about_html)
-    with open('templates/cite.html', 'w', encoding='utf-8') as f: f.write(cite_html)
-    with open('templates/api_docs.html', 'w', encoding='utf-8') as f: f.write(api_docs_html)
-# Run the setup function to ensure templates exist
-setup_templates()
+    # Write files with explicit UTF-8 encoding, skipping files that are already up to date
+    for name, content in [('base.html', base_html), ('index.html', index_html), ('about.html', about_html),
+                          ('cite.html', cite_html), ('api_docs.html', api_docs_html)]:
+        path = os.path.join('templates', name)
+        try:
+            with open(path, encoding='utf-8') as f:
+                if f.read() == content:
+                    continue
+        except OSError:
+            pass
+        with open(path, 'w', encoding='utf-8') as f: f.write(content)
 
 # ===== CONFIGURATION =====
-ENSEMBL_REST = "https://rest.ensembl.org"
+# Upstream URLs can be overridden (e.g. to point at bench/stub_server.py)
+ENSEMBL_REST = os.environ.get("AVEC_ENSEMBL_REST", "https://rest.ensembl.org")
 HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
-N1C_API_URL = "https://gene-registry.onrender.com/api/data?table=N1C_projects" 
-N1C_API_ASSESSED_URL = "https://gene-registry.onrender.com/api/data?table=assessed_variants"
-# Global DataFrames to be loaded at startup
-clingen_df: Optional[pd.DataFrame] = None
-goflof_df: Optional[pd.DataFrame] = None
-splicevar_df: Optional[pd.DataFrame] = None
-n1c_variants_df: Optional[pd.DataFrame] = None 
-n1c_assessed_df: Optional[pd.DataFrame] = None 
-sscvdb_df: Optional[pd.DataFrame] = None 
-
-# Supplementary N1C table with gene-level features (uORF, NAT, PE)
-n1c_supp_df: Optional[pd.DataFrame] = None 
-
+# Pause before each Ensembl request (seconds); keeps us well under the public rate limit
+ENSEMBL_DELAY = float(os.environ.get("AVEC_ENSEMBL_DELAY", "0.1"))
+# Per-attempt timeout, and the time one call may spend on retries before giving up (seconds)
+ENSEMBL_TIMEOUT = float(os.environ.get("AVEC_ENSEMBL_TIMEOUT", "30"))
+ENSEMBL_CALL_BUDGET = float(os.environ.get("AVEC_ENSEMBL_BUDGET", "20"))
+N1C_API_URL = os.environ.get("AVEC_N1C_API_URL", "https://gene-registry.onrender.com/api/data?table=N1C_projects")
+N1C_API_ASSESSED_URL = os.environ.get("AVEC_N1C_ASSESSED_URL", "https://gene-registry.onrender.com/api/data?table=assessed_variants")
 # --- Data Loading ---
-def load_databases():
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+# Touched by /admin/reload so that every worker's watcher also reloads
+RELOAD_STAMP_PATH = os.path.join(DATA_DIR, '.reload')
+
+def _digest_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+def _fetch_json(url: str) -> Tuple[Any, str]:
+    response = requests.get(url, timeout=30)
+    response.raise_for_status() # Will raise an error if the request fails
+    return response.json(), hashlib.sha256(response.content).hexdigest()[:12]
+
+def _load_clingen(path: str) -> Tuple[pd.DataFrame, str]:
+    return pd.read_csv(path).set_index('gene_symbol'), _digest_file(path)
+
+def _load_goflof(path: str) -> Tuple[pd.DataFrame, str]:
+    return pd.read_csv(path).set_index('GENE'), _digest_file(path)
+
+def _load_splicevar(path: str) -> Tuple[pd.DataFrame, str]:
+    df = pd.read_excel(path)
+    # Sanitize SpliceVarDB data (critical for lookups)
+    df.columns = df.columns.str.strip()
+    if 'hgvs' in df.columns and 'gene' in df.columns:
+        df['hgvs'] = df['hgvs'].astype(str).str.strip()
+        df['gene'] = df['gene'].astype(str).str.strip()
+    return df, _digest_file(path)
+
+def _load_sscvdb(path: str) -> Tuple[pd.DataFrame, str]:
+    df = pd.read_excel(path)
+    df.columns = df.columns.str.strip()
+    if 'Variant ID' in df.columns:
+        df['Variant ID'] = df['Variant ID'].astype(str).str.strip()
+    return df, _digest_file(path)
+
+def _load_n1c_supp(path: str) -> Tuple[pd.DataFrame, str]:
+    # Supplementary N1C table with gene-level features (uORF, NAT, PE)
+    df = pd.read_excel(path)
+    df.columns = df.columns.str.strip()
+    for col in ['Gene', 'uORF', 'NAT', 'PE']:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip()
+    return df, _digest_file(path)
+
+def _load_n1c_variants(url: str) -> Tuple[pd.DataFrame, str]:
+    # N=1 Collaborative Projects registry
+    data, digest = _fetch_json(url)
+    df = pd.DataFrame(data)
+    # Sanitize the N1C columns we will search on
+    if 'Gene' in df.columns:
+        df['Gene'] = df['Gene'].astype(str).str.strip()
+    if 'Coding DNA change (c.)' in df.columns:
+        df['Coding DNA change (c.)'] = df['Coding DNA change (c.)'].astype(str).str.strip()
+    return df, digest
+
+def _load_n1c_assessed(url: str) -> Tuple[pd.DataFrame, str]:
+    # N1C assessed variants (curated)
+    data, digest = _fetch_json(url)
+    df = pd.DataFrame(data)
+    # Sanitize all string columns; c. notation is matched via _get_c_notation_from_row
+    for col in list(df.columns):
+        if isinstance(col, str):
+            df[col] = df[col].astype(str).str.strip()
+    return df, digest
+
+# name -> (file path or URL, loader, required for readiness)
+# Local files come first so gene characteristics are available before the remote fetches finish.
+# The GoF/LoF table (HGMD-derived) and SSCVDB are licensed and not shipped in data/; drop
+# them there to enable their checks. Until then they are reported as "missing" and the
+# assessments say which checks were skipped.
+DATASETS: Dict[str, Tuple[str, Any, bool]] = {
+    'clingen': (os.path.join(DATA_DIR, 'Clingen-Curation-Activity-Summary-Report-2025-10-15.csv'), _load_clingen, True),
+    'goflof': (os.path.join(DATA_DIR, 'goflof_HGMD2019_v032021_allfeat.csv'), _load_goflof, False),
+    'n1c_supp': (os.path.join(DATA_DIR, 'N1C_Variant_Supp_Table.xlsx'), _load_n1c_supp, False),
+    'splicevar': (os.path.join(DATA_DIR, 'splicevardb.xlsx'), _load_splicevar, True),
+    'sscvdb': (os.path.join(DATA_DIR, 'SSCVDB.xlsx'), _load_sscvdb, False),
+    'n1c_variants': (N1C_API_URL, _load_n1c_variants, True),
+    'n1c_assessed': (N1C_API_ASSESSED_URL, _load_n1c_assessed, True),
+}
+
+def _is_remote(source: str) -> bool:
+    return source.startswith('http://') or source.startswith('https://')
+
+class ReferenceSnapshot:
     """
-    Loads all necessary data files and fetches N1C registry data
-    into global pandas DataFrames.
+    One immutable generation of the reference tables, their lookup key arrays and
+    versions. A request binds a snapshot once, so a reload that lands mid-request
+    cannot mix tables from two generations.
     """
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    DATA_DIR = os.path.join(BASE_DIR, 'data')
-
-    clingen_path = os.path.join(DATA_DIR, 'Clingen-Curation-Activity-Summary-Report-2025-10-15.csv')
-    goflof_path = os.path.join(DATA_DIR, 'goflof_HGMD2019_v032021_allfeat.csv')
-    splicevar_path = os.path.join(DATA_DIR, 'splicevardb.xlsx')
-    sscvdb_path = os.path.join(DATA_DIR, 'SSCVDB.xlsx')
-    n1c_supp_path = os.path.join(DATA_DIR, 'N1C_Variant_Supp_Table.xlsx')
+    __slots__ = ('frames', 'keys', 'versions')
+
+    def __init__(self, frames: Dict[str, pd.DataFrame], keys: Dict[str, np.ndarray], versions: Dict[str, str]):
+        self.frames = frames
+        self.keys = keys
+        self.versions = versions
+
+    def frame(self, name: str) -> Optional[pd.DataFrame]:
+        return self.frames.get(name)
+
+class ReferenceRegistry:
+    """Holds the current ReferenceSnapshot and swaps in new dataset versions atomically."""
+
+    def __init__(self):
+        self._snapshot = ReferenceSnapshot({}, {}, {})
+        self._publish_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._file_mtimes: Dict[str, float] = {}
+        self._stamp_mtime: Optional[float] = None
+        self.listeners: List[Any] = []
+
+    def snapshot(self) -> ReferenceSnapshot:
+        return self._snapshot
+
+    def publish(self, name: str, df: pd.DataFrame, version: str):
+        """Replaces one dataset. Readers see either the old or the new snapshot, never a mix."""
+        keys = _dataset_keys(name, df)
+        with self._publish_lock:
+            current = self._snapshot
+            stale_keys = {k for k in current.keys if k.startswith(name + '_')}
+            self._snapshot = ReferenceSnapshot(
+                {**current.frames, name: df},
+                {**{k: v for k, v in current.keys.items() if k not in stale_keys}, **keys},
+                {**current.versions, name: version},
+            )
 
-    global clingen_df, goflof_df, splicevar_df, n1c_variants_df, n1c_assessed_df, sscvdb_df, n1c_supp_df
-    print("Loading databases...")
-    try:
-        clingen_df = pd.read_csv(clingen_path).set_index('gene_symbol')
-        goflof_df = pd.read_csv(goflof_path).set_index('GENE')
-        
-        # Load SpliceVarDB from Excel
-        splicevar_df = pd.read_excel(splicevar_path)
-        # Sanitize SpliceVarDB data (critical for lookups)
-        splicevar_df.columns = splicevar_df.columns.str.strip()
-        if 'hgvs' in splicevar_df.columns and 'gene' in splicevar_df.columns:
-            splicevar_df['hgvs'] = splicevar_df['hgvs'].astype(str).str.strip()
-            splicevar_df['gene'] = splicevar_df['gene'].astype(str).str.strip()
-        print(f"Loaded and sanitized SpliceVarDB data for {len(splicevar_df)} variants.")
-
-        # Load SSCVDB from Excel
+    def load(self, name: str) -> bool:
+        """Loads one dataset off the request path and publishes it if its content changed."""
+        source, loader, _ = DATASETS[name]
+        status = dataset_status[name]
+        if status["state"] != "ready":
+            status.update({"state": "loading", "error": None})
+        started = time.time()
         try:
-            sscvdb_df = pd.read_excel(sscvdb_path)
-            sscvdb_df.columns = sscvdb_df.columns.str.strip()
-            if 'Variant ID' in sscvdb_df.columns:
-                sscvdb_df['Variant ID'] = sscvdb_df['Variant ID'].astype(str).str.strip()
-            print(f"Loaded SSCVDB entries: {len(sscvdb_df)}")
+            mtime = None if _is_remote(source) else os.path.getmtime(source)
+            df, version = loader(source)
         except Exception as e:
-            print(f"Warning: Could not load SSCVDB.xlsx: {e}")
+            # Keep serving the previous version if there is one
+            if status["state"] != "ready":
+                status["state"] = "missing" if isinstance(e, FileNotFoundError) else "failed"
+            status.update({"error": str(e), "seconds": round(time.time() - started, 2)})
+            print(f"Warning: Could not load dataset '{name}': {e}")
+            return False
+        if mtime is not None:
+            self._file_mtimes[name] = mtime
+        if self._snapshot.versions.get(name) == version:
+            status.update({"state": "ready", "error": None, "checked_at": _utc_now()})
+            return False
+        self.publish(name, df, version)
+        status.update({"state": "ready", "rows": len(df), "error": None, "version": version,
+                       "loaded_at": _utc_now(), "seconds": round(time.time() - started, 2)})
+        print(f"Loaded dataset '{name}' version {version} ({len(df)} rows) in {status['seconds']}s.")
+        return True
+
+    def reload(self, names: Optional[List[str]] = None) -> List[str]:
+        """Reloads the given datasets (default: all) and returns the names that changed."""
+        with self._reload_lock:
+            changed = [name for name in (names or list(DATASETS)) if self.load(name)]
+        for listener in self.listeners:
+            try:
+                listener(changed)
+            except Exception:
+                import traceback; traceback.print_exc()
+        return changed
+
+    def changed_files(self) -> List[str]:
+        """Names of file-backed datasets whose file was modified since it was loaded."""
+        changed = []
+        for name, (source, _, _) in DATASETS.items():
+            # Datasets that failed (e.g. a missing file) are retried once their file shows up
+            if _is_remote(source) or dataset_status[name]["state"] in ("pending", "loading"):
+                continue
+            try:
+                mtime = os.path.getmtime(source)
+            except OSError:
+                continue
+            if self._file_mtimes.get(name) != mtime:
+                changed.append(name)
+        return changed
 
-        # Load N1C supplementary table (uORF / NAT / PE per gene)
+    def reload_requested(self) -> bool:
+        """True when another worker touched the reload stamp since we last looked."""
         try:
-            n1c_supp_df = pd.read_excel(n1c_supp_path)
-            n1c_supp_df.columns = n1c_supp_df.columns.str.strip()
-            for col in ['Gene', 'uORF', 'NAT', 'PE']:
-                if col in n1c_supp_df.columns:
-                    n1c_supp_df[col] = n1c_supp_df[col].astype(str).str.strip()
-            print(f"Loaded N1C supplementary table entries: {len(n1c_supp_df)}")
-        except Exception as e:
-            print(f"Warning: Could not load N1C_Variant_Supp_Table.xlsx: {e}")
-
-        # Fetch and load N1C N-of-1 Projects data
-        print("Fetching N=1 Collaborative Projects registry data...")
-        response = requests.get(N1C_API_URL, timeout=30)
-        response.raise_for_status() # Will raise an error if the request fails
-        n1c_data = response.json()
-        n1c_variants_df = pd.DataFrame(n1c_data)
-        
-        # Sanitize the N1C columns we will search on
-        if 'Gene' in n1c_variants_df.columns:
-            n1c_variants_df['Gene'] = n1c_variants_df['Gene'].astype(str).str.strip()
-        if 'Coding DNA change (c.)' in n1c_variants_df.columns:
-            n1c_variants_df['Coding DNA change (c.)'] = n1c_variants_df['Coding DNA change (c.)'].astype(str).str.strip()
-        print(f"Successfully loaded {len(n1c_variants_df)} projects from the N1C registry.")
-
-        # Fetch and load N1C assessed variants (curated) data
-        print("Fetching N1C assessed variants data...")
-        response2 = requests.get(N1C_API_ASSESSED_URL, timeout=30)
-        response2.raise_for_status()
-        n1c_assessed_data = response2.json()
-        n1c_assessed_df = pd.DataFrame(n1c_assessed_data)
-        # Sanitize columns commonly used for matching
-        if 'Gene' in n1c_assessed_df.columns:
-            n1c_assessed_df['Gene'] = n1c_assessed_df['Gene'].astype(str).str.strip()
-        # Normalize any potential c. notation columns to a unified helper accessor later
-        for col in list(n1c_assessed_df.columns):
-            if isinstance(col, str):
-                n1c_assessed_df[col] = n1c_assessed_df[col].astype(str).str.strip()
-        print(f"Successfully loaded {len(n1c_assessed_df)} curated assessed variants from the N1C registry.")
+            mtime = os.path.getmtime(RELOAD_STAMP_PATH)
+        except OSError:
+            return False
+        requested = self._stamp_mtime is not None and mtime != self._stamp_mtime
+        self._stamp_mtime = mtime
+        return requested
+
+    def watch(self, interval: float):
+        """Polls for modified data files or a reload stamp, forever. Run in a daemon thread."""
+        self.reload_requested()
+        while True:
+            time.sleep(interval)
+            try:
+                if self.reload_requested():
+                    self.reload()
+                else:
+                    changed = self.changed_files()
+                    if changed:
+                        self.reload(changed)
+            except Exception:
+                import traceback; traceback.print_exc()
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"An error occurred during database loading: {e}")
-        exit(1)
+REFERENCE = ReferenceRegistry()
+_bound_reference: contextvars.ContextVar[Optional[ReferenceSnapshot]] = contextvars.ContextVar('bound_reference', default=None)
+
+def current_reference() -> ReferenceSnapshot:
+    """The snapshot bound to the running assessment, or the registry's current one."""
+    return _bound_reference.get() or REFERENCE.snapshot()
+
+def _utc_now() -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+# Per-dataset load status reported by /healthz and /readyz
+dataset_status: Dict[str, Dict[str, Any]] = {
+    name: {"state": "pending", "required": required, "rows": None, "error": None, "seconds": None}
+    for name, (_, _, required) in DATASETS.items()
+}
+
+def load_databases():
+    """
+    Loads all necessary data files and fetches N1C registry data
+    into the reference registry. A failing dataset is reported in
+    dataset_status instead of stopping the server.
+    """
+    print("Loading databases...")
+    REFERENCE.reload()
+
+def start_background_loading() -> threading.Thread:
+    """Loads all datasets in a daemon thread so the app can serve requests immediately."""
+    thread = threading.Thread(target=load_databases, name="reference-loader", daemon=True)
+    thread.start()
+    return thread
+
+def start_reference_watcher(interval: Optional[float] = None) -> Optional[threading.Thread]:
+    """Starts polling data files for changes every AVEC_RELOAD_INTERVAL seconds (0 disables)."""
+    interval = float(os.environ.get('AVEC_RELOAD_INTERVAL', '60')) if interval is None else interval
+    if interval <= 0:
+        return None
+    thread = threading.Thread(target=REFERENCE.watch, args=(interval,), name="reference-watcher", daemon=True)
+    thread.start()
+    return thread
+
+def request_reload(names: Optional[List[str]] = None) -> threading.Thread:
+    """
+    Reloads datasets in a background thread. When all datasets are requested, the
+    reload stamp is touched as well so the other workers' watchers follow.
+    """
+    if not names:
+        try:
+            with open(RELOAD_STAMP_PATH, 'a'):
+                os.utime(RELOAD_STAMP_PATH, None)
+            REFERENCE.reload_requested()  # don't reload a second time for our own stamp
+        except OSError:
+            pass
+    thread = threading.Thread(target=REFERENCE.reload, args=(names,), name="reference-reload", daemon=True)
+    thread.start()
+    return thread
+
+def dataset_ready(name: str) -> bool:
+    return dataset_status[name]["state"] == "ready"
+
+DATASET_LABELS = {
+    'clingen': ('ClinGen curations', 'mode of inheritance and haploinsufficiency'),
+    'goflof': ('GoF/LoF table', 'known mechanism of action'),
+    'n1c_supp': ('N1C supplementary table', 'curated uORF/NAT/poison exon evidence'),
+    'splicevar': ('SpliceVarDB', 'splice switching database lookup'),
+    'sscvdb': ('SSCVDB', 'SSCVDB splice lookup'),
+    'n1c_variants': ('N1C registry', 'N1C registry check'),
+    'n1c_assessed': ('N1C assessed variants', 'N1C curated assessment check'),
+}
+
+def dataset_warnings(snapshot: Optional[ReferenceSnapshot] = None) -> List[str]:
+    """Describes which checks were skipped because their dataset is loading or failed to load."""
+    snapshot = snapshot or current_reference()
+    warnings = []
+    for name in DATASETS:
+        if name in snapshot.frames:
+            continue
+        label, skipped = DATASET_LABELS[name]
+        state = dataset_status[name]["state"]
+        why = {"failed": "failed to load", "missing": "is not installed"}.get(state, "is still loading")
+        warnings.append(f"{label} {why}; {skipped} was skipped.")
+    return warnings
+
+def is_ready() -> bool:
+    """True once every dataset required for a complete assessment is loaded."""
+    return all(dataset_ready(name) for name, (_, _, required) in DATASETS.items() if required)
+
+# --- Shared Reference Keys ---
+# Lookup columns are copied into numpy unicode arrays once after loading. A numpy
+# array is a single buffer, so comparing against it in a forked gunicorn worker
+# reads the pages inherited from the master instead of touching (and thereby
+# copying) one Python string object per row.
+
+def _key_array(series: pd.Series, upper: bool = False, lower: bool = False) -> np.ndarray:
+    """Returns a stripped, case-normalized copy of a column as a fixed-width numpy string array."""
+    values = series.astype(str).str.strip()
+    if upper:
+        values = values.str.upper()
+    elif lower:
+        values = values.str.lower()
+    return np.asarray(values.to_numpy(), dtype=str)
+
+def _dataset_keys(name: str, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Builds the numpy lookup arrays for one reference dataset."""
+    keys: Dict[str, np.ndarray] = {}
+    if name == 'n1c_variants' and 'Gene' in df.columns:
+        keys['n1c_variants_gene'] = _key_array(df['Gene'], upper=True)
+    elif name == 'n1c_assessed' and 'Gene' in df.columns:
+        keys['n1c_assessed_gene'] = _key_array(df['Gene'], upper=True)
+    elif name == 'n1c_supp' and 'Gene' in df.columns:
+        keys['n1c_supp_gene'] = _key_array(df['Gene'])
+    elif name == 'splicevar' and 'gene' in df.columns:
+        keys['splicevar_gene'] = _key_array(df['gene'], upper=True)
+    elif name == 'sscvdb' and 'Variant ID' in df.columns:
+        keys['sscvdb_variant_id'] = _key_array(df['Variant ID'], lower=True)
+    return keys
+
+def rows_matching(df: Optional[pd.DataFrame], key: str, value: str, contains: bool = False) -> Optional[pd.DataFrame]:
+    """
+    Returns the rows of df whose lookup key equals (or contains) value,
+    or None if no key array exists for df.
+    """
+    arr = current_reference().keys.get(key)
+    if df is None or arr is None or len(arr) != len(df):
+        return None
+    mask = np.char.find(arr, value) >= 0 if contains else arr == value
+    return df.iloc[np.flatnonzero(mask)]
+
+def process_memory() -> Dict[str, int]:
+    """Reads resident/shared/private memory (kB) of the current process from /proc."""
+    usage: Dict[str, int] = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'):
+                    usage[name] = int(rest.split()[0])
+    except (OSError, ValueError):
+        import resource
+        usage['MaxRss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
 
 def _format_sscvdb_variant_id_from_vep(vep_entry: Dict[str, Any]) -> Optional[str]:
     """Formats a VEP entry to SSCVDB Variant ID style: chr<chrom>-<pos>-<ref>-<alt>.
@@ -1046,47 +1491,1002 @@ def _format_sscvdb_variant_id_from_vep(vep_entry: Dict[str, Any]) -> Optional[st
     except Exception:
         return None
 
+# Genomic variant IDs as written by VCF tools and SSCVDB: chr1-12345-A-G (also 1:12345:A:G, 1_12345_A_G).
+# GRCh38 unless prefixed with another assembly: GRCh37:chr1-12345-A-G (or hg19:...)
+VARIANT_ID_RE = re.compile(r'^(?:(GRCh3[78]|hg19|hg38|b37)[:_ ]+)?(?:chr)?([0-9]{1,2}|X|Y|MT?)[-:_](\d+)[-:_]([ACGTN]+)[-:_]([ACGTN]+)$', re.IGNORECASE)
+# Substitutions on the GRCh37 RefSeq chromosome accessions (NC_000001.10:g.12345A>G); VEP
+# only knows the GRCh38 versions, so these are lifted over like GRCh37 variant IDs
+GRCH37_GENOMIC_HGVS_RE = re.compile(r'^(NC_0000\d\d\.\d+):g\.(\d+)([ACGT])>([ACGT])$', re.IGNORECASE)
+GRCH37_ACCESSIONS = {
+    "NC_000001.10": "1", "NC_000002.11": "2", "NC_000003.11": "3", "NC_000004.11": "4", "NC_000005.9": "5",
+    "NC_000006.11": "6", "NC_000007.13": "7", "NC_000008.10": "8", "NC_000009.11": "9", "NC_000010.10": "10",
+    "NC_000011.9": "11", "NC_000012.11": "12", "NC_000013.10": "13", "NC_000014.8": "14", "NC_000015.9": "15",
+    "NC_000016.9": "16", "NC_000017.10": "17", "NC_000018.9": "18", "NC_000019.9": "19", "NC_000020.10": "20",
+    "NC_000021.8": "21", "NC_000022.10": "22", "NC_000023.10": "X", "NC_000024.9": "Y",
+}
+ASSEMBLY_ALIASES = {"grch37": "GRCh37", "hg19": "GRCh37", "b37": "GRCh37", "grch38": "GRCh38", "hg38": "GRCh38"}
+
+def _variant_id_parts(query: str) -> Optional[Tuple[str, str, int, str, str]]:
+    """(assembly, chrom, pos, ref, alt) of a genomic variant ID or GRCh37 g. substitution, as written."""
+    query = query.strip() if query else ""
+    match = VARIANT_ID_RE.match(query)
+    if match:
+        chrom = match.group(2).upper()
+        assembly = ASSEMBLY_ALIASES[match.group(1).lower()] if match.group(1) else "GRCh38"
+        return assembly, ("MT" if chrom == "M" else chrom), int(match.group(3)), match.group(4).upper(), match.group(5).upper()
+    match = GRCH37_GENOMIC_HGVS_RE.match(query)
+    chrom = GRCH37_ACCESSIONS.get(match.group(1).upper()) if match else None
+    if chrom:
+        return "GRCh37", chrom, int(match.group(2)), match.group(3).upper(), match.group(4).upper()
+    return None
+
+def parse_variant_id(query: str) -> Optional[Tuple[str, int, str, str]]:
+    """
+    Parses a chrom-pos-ref-alt ID (VCF alleles, 1-based position) into GRCh38
+    (chrom, pos, ref, alt). GRCh37 inputs are lifted over; LiftoverError if they
+    cannot be.
+    """
+    parts = _variant_id_parts(query)
+    if not parts:
+        return None
+    assembly, chrom, pos, ref, alt = parts
+    if assembly == "GRCh37":
+        return lift_to_grch38((chrom, pos, ref, alt))
+    return chrom, pos, ref, alt
+
+def format_variant_id(chrom: str, pos: int, ref: str, alt: str) -> str:
+    """SSCVDB Variant ID style: chr<chrom>-<pos>-<ref>-<alt>."""
+    return f"chr{chrom}-{pos}-{ref}-{alt}"
+
+def vep_region_notation(chrom: str, pos: int, ref: str, alt: str) -> Tuple[str, str]:
+    """
+    Ensembl region and allele ("1:1050-1050:1", "A") for a VCF-style variant.
+    The padding base VCF puts in front of indels is trimmed: deletions become
+    allele "-" and insertions a region whose end is one before its start.
+    """
+    if len(ref) > 1 or len(alt) > 1:
+        if ref[0] == alt[0]:
+            ref, alt, pos = ref[1:], alt[1:], pos + 1
+    return f"{chrom}:{pos}-{pos + len(ref) - 1}:1", alt or "-"
+
+def reference_mismatch(coordinate: Tuple[str, int, str, str], vep_entry: Dict[str, Any]) -> Optional[str]:
+    """
+    The GRCh38 reference allele VEP reports for a vep_region answer when it differs
+    from the variant's REF (VEP takes only the ALT and reads REF from the genome), else None.
+    """
+    _, _, ref, alt = coordinate
+    if (len(ref) > 1 or len(alt) > 1) and ref[0] == alt[0]:
+        ref = ref[1:]
+    genome_ref = (vep_entry.get('allele_string') or '').split('/')[0].upper()
+    return genome_ref if genome_ref and genome_ref != (ref or "-") else None
+
+# --- Assembly Liftover ---
+# GRCh37 inputs are mapped to GRCh38 before VEP, so everything downstream (VEP,
+# exon models, the IGV locus, ClinVar links) stays GRCh38. The mapping uses the
+# UCSC hg19ToHg38.over.chain.gz chain file (AVEC_CHAIN_FILE), indexed in memory
+# once per process; the same index maps GRCh38 positions back for the reported
+# GRCh37 coordinates. Without the file, GRCh37 inputs are reported as not assessable.
+# The chain only maps positions: a lifted REF that differs from the GRCh38 base (where
+# GRCh38 fixed a GRCh37 error) is caught against VEP's reference allele and reported.
+
+CHAIN_FILE_PATH = os.environ.get('AVEC_CHAIN_FILE', os.path.join(DATA_DIR, 'hg19ToHg38.over.chain.gz'))
+PRIMARY_CHROMOSOME_RE = re.compile(r'^([0-9]{1,2}|X|Y|MT)$')
+_COMPLEMENT = str.maketrans("ACGTN", "TGCAN")
+
+class LiftoverError(ValueError):
+    """A GRCh37 variant could not be mapped to GRCh38."""
+
+class IntervalIndex:
+    """
+    Static index of half-open intervals for point queries. Intervals are sorted by
+    start next to the running maximum of their ends, so a query walks back from the
+    last interval starting at or before the point only while an earlier interval
+    can still reach it (chain blocks barely overlap, so that is one or two steps).
+    """
+    def __init__(self, starts: List[int], ends: List[int], values: List[Any]):
+        order = np.argsort(np.asarray(starts, dtype=np.int64), kind='stable')
+        self.starts = np.asarray(starts, dtype=np.int64)[order]
+        self.ends = np.asarray(ends, dtype=np.int64)[order]
+        self.max_ends = np.maximum.accumulate(self.ends) if len(order) else self.ends
+        self.values = [values[i] for i in order]
+
+    def at(self, point: int) -> List[Any]:
+        hits = []
+        i = int(np.searchsorted(self.starts, point, side='right')) - 1
+        while i >= 0 and self.max_ends[i] > point:
+            if self.ends[i] > point:
+                hits.append(self.values[i])
+            i -= 1
+        return hits
+
+def _chain_chromosome(name: str) -> str:
+    name = re.sub(r'^chr', '', name, flags=re.IGNORECASE)
+    return "MT" if name.upper() == "M" else name
+
+class ChainIndex:
+    """
+    Both directions of a UCSC chain file ("forward": reference to query assembly,
+    "reverse": back), one IntervalIndex of aligned blocks per source chromosome.
+    Blocks on alternate contigs are left out.
+    """
+    def __init__(self, path: str):
+        blocks = {"forward": {}, "reverse": {}}
+
+        def add(direction, chrom, start, size, value):
+            starts, ends, values = blocks[direction].setdefault(chrom, ([], [], []))
+            starts.append(start); ends.append(start + size); values.append(value)
+
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as f:
+            for line in f:
+                fields = line.split()
+                if not fields:
+                    continue
+                if fields[0] == 'chain':
+                    # chain score tName tSize tStrand tStart tEnd qName qSize qStrand qStart qEnd id
+                    score, t_chrom, q_chrom = float(fields[1]), _chain_chromosome(fields[2]), _chain_chromosome(fields[7])
+                    q_size, q_reverse = int(fields[8]), fields[9] == '-'
+                    t, q = int(fields[5]), int(fields[10])
+                    keep = bool(PRIMARY_CHROMOSOME_RE.match(t_chrom) and PRIMARY_CHROMOSOME_RE.match(q_chrom))
+                    continue
+                size = int(fields[0])
+                if keep:
+                    # value: (source start, target chromosome, target of source start, reversed, score);
+                    # q coordinates of a '-' chain count from the end of the chromosome
+                    if q_reverse:
+                        q_forward = q_size - q - size
+                        add("forward", t_chrom, t, size, (t, q_chrom, q_size - 1 - q, True, score))
+                        add("reverse", q_chrom, q_forward, size, (q_forward, t_chrom, t + size - 1, True, score))
+                    else:
+                        add("forward", t_chrom, t, size, (t, q_chrom, q, False, score))
+                        add("reverse", q_chrom, q, size, (q, t_chrom, t, False, score))
+                if len(fields) >= 3:
+                    t += size + int(fields[1])
+                    q += size + int(fields[2])
+        self.indexes = {direction: {chrom: IntervalIndex(*lists) for chrom, lists in by_chrom.items()}
+                        for direction, by_chrom in blocks.items()}
+        self.blocks = sum(len(lists[0]) for lists in blocks["forward"].values())
+
+    def map_position(self, direction: str, chrom: str, pos: int) -> Optional[Tuple[str, int, bool]]:
+        """(chromosome, 1-based position, strand reversed) of pos on the other assembly, from the best-scoring chain."""
+        index = self.indexes[direction].get(chrom)
+        hits = index.at(pos - 1) if index else []
+        if not hits:
+            return None
+        source_start, target_chrom, target_start, reverse, _ = max(hits, key=lambda hit: hit[4])
+        offset = pos - 1 - source_start
+        return target_chrom, (target_start - offset if reverse else target_start + offset) + 1, reverse
+
+    def lift(self, coordinate: Tuple[str, int, str, str], direction: str = "forward") -> Optional[Tuple[str, int, str, str]]:
+        """A VCF-style variant on the other assembly, or None if any of its reference bases does not map (or maps apart)."""
+        chrom, pos, ref, alt = coordinate
+        first = self.map_position(direction, chrom, pos)
+        last = self.map_position(direction, chrom, pos + len(ref) - 1)
+        if not first or not last or first[0] != last[0] or first[2] != last[2] or abs(last[1] - first[1]) != len(ref) - 1:
+            return None
+        if not first[2]:
+            return first[0], first[1], ref, alt
+        if len(ref) != len(alt):
+            # The VCF padding base of an indel would end up on the wrong side
+            return None
+        return first[0], last[1], ref[::-1].translate(_COMPLEMENT), alt[::-1].translate(_COMPLEMENT)
+
+_chain_index: Optional[ChainIndex] = None
+_chain_index_lock = threading.Lock()
+liftover_status: Dict[str, Any] = {"status": "not loaded", "path": CHAIN_FILE_PATH}
+
+def chain_index() -> Optional[ChainIndex]:
+    """The GRCh37 -> GRCh38 chain index, loaded on first use; None if the chain file is unavailable."""
+    global _chain_index
+    if liftover_status["status"] == "not loaded":
+        with _chain_index_lock:
+            if liftover_status["status"] == "not loaded":
+                started = time.perf_counter()
+                if not os.path.exists(CHAIN_FILE_PATH):
+                    liftover_status["status"] = "missing"
+                else:
+                    try:
+                        _chain_index = ChainIndex(CHAIN_FILE_PATH)
+                        liftover_status.update(status="loaded", blocks=_chain_index.blocks,
+                                               seconds=round(time.perf_counter() - started, 2))
+                        print(f"Loaded chain file {CHAIN_FILE_PATH} ({_chain_index.blocks} blocks) in {liftover_status['seconds']}s.")
+                    except (OSError, ValueError, IndexError) as e:
+                        liftover_status.update(status="error", error=str(e))
+                        print(f"Could not load chain file {CHAIN_FILE_PATH}: {e}")
+    return _chain_index
+
+def lift_to_grch38(coordinate: Tuple[str, int, str, str]) -> Tuple[str, int, str, str]:
+    index = chain_index()
+    if index is None:
+        raise LiftoverError("GRCh37 input needs the GRCh37 to GRCh38 chain file, which is not available on this server.")
+    lifted = index.lift(coordinate)
+    if lifted is None:
+        raise LiftoverError(f"GRCh37 variant {format_variant_id(*coordinate)} could not be lifted over to GRCh38.")
+    return lifted
+
+def lift_to_grch37(coordinate: Tuple[str, int, str, str]) -> Optional[Tuple[str, int, str, str]]:
+    index = chain_index()
+    return index.lift(coordinate, "reverse") if index else None
+
+def variant_coordinates(query: str, coordinate: Tuple[str, int, str, str]) -> Dict[str, Any]:
+    """The input assembly and the variant ID on both assemblies (GRCh37 is None where it does not map)."""
+    assembly, *original = _variant_id_parts(query)
+    grch37 = tuple(original) if assembly == "GRCh37" else lift_to_grch37(coordinate)
+    return {"input_assembly": assembly, "GRCh38": format_variant_id(*coordinate),
+            "GRCh37": format_variant_id(*grch37) if grch37 else None}
+
+def _sscvdb_has_variant(variant_key: str) -> bool:
+    """Checks whether an SSCVDB Variant ID (chr-pos-ref-alt) is present."""
+    sscvdb_df = current_reference().frame('sscvdb')
+    matches = rows_matching(sscvdb_df, 'sscvdb_variant_id', variant_key.strip().lower())
+    if matches is None:
+        matches = sscvdb_df[sscvdb_df['Variant ID'].str.strip().str.lower() == variant_key.strip().lower()]
+    return not matches.empty
+
+# --- Metrics ---
+# Process-local counters and latency histograms, exported at /metrics in the
+# Prometheus text format. Each gunicorn worker reports its own numbers; the
+# scraper aggregates by instance.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Metrics:
+    """Thread-safe counters and histograms keyed by metric name and label set."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], List[float]] = {}
+
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            # One count per bucket, then sum and count
+            hist = self._histograms.setdefault(key, [0.0] * (len(LATENCY_BUCKETS) + 2))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        lines: List[str] = []
+        described = set()
+        def header(name):
+            if name not in described and name in self._help:
+                kind, text = self._help[name]
+                lines.extend([f"# HELP {name} {text}", f"# TYPE {name} {kind}"])
+            described.add(name)
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{_prom_labels(labels)} {value:g}")
+        for (name, labels), hist in histograms:
+            header(name)
+            for bound, count in zip(LATENCY_BUCKETS, hist):
+                lines.append(f"{name}_bucket{_prom_labels(labels + (('le', f'{bound:g}'),))} {count:g}")
+            lines.append(f"{name}_bucket{_prom_labels(labels + (('le', '+Inf'),))} {hist[-1]:g}")
+            lines.append(f"{name}_sum{_prom_labels(labels)} {hist[-2]:.6f}")
+            lines.append(f"{name}_count{_prom_labels(labels)} {hist[-1]:g}")
+        return lines
+
+def _prom_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+METRICS = Metrics()
+METRICS.describe("avec_stage_seconds", "histogram", "Time spent per assessment stage.")
+METRICS.describe("avec_assessment_seconds", "histogram", "Wall time of whole single-variant assessments.")
+METRICS.describe("avec_ensembl_request_seconds", "histogram", "Latency of individual Ensembl REST attempts.")
+METRICS.describe("avec_ensembl_requests_total", "counter", "Ensembl REST attempts by endpoint and outcome.")
+METRICS.describe("avec_ensembl_retries_total", "counter", "Ensembl REST attempts that were retries.")
+METRICS.describe("avec_ensembl_throttled_total", "counter", "Ensembl REST responses with status 429.")
+METRICS.describe("avec_result_cache_total", "counter", "Result cache lookups by outcome (HIT, MISS, BYPASS).")
+METRICS.describe("avec_ensembl_cache_total", "counter", "Ensembl response cache lookups by endpoint and result.")
+METRICS.describe("avec_cache_requests_total", "counter", "Memory cache lookups by cache, traffic class and result.")
+
+def record_ensembl_attempt(path: str, status: str, seconds: float, attempt: int):
+    """Records one Ensembl REST attempt (status is the HTTP status code or "error")."""
+    endpoint = _endpoint_name(path)
+    METRICS.observe("avec_ensembl_request_seconds", seconds, {"endpoint": endpoint})
+    METRICS.inc("avec_ensembl_requests_total", {"endpoint": endpoint, "status": status})
+    if attempt:
+        METRICS.inc("avec_ensembl_retries_total", {"endpoint": endpoint})
+    if status == "429":
+        METRICS.inc("avec_ensembl_throttled_total", {"endpoint": endpoint})
+
+# Per-stage timings (ms) of the assessment running in the current context
+_stage_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("stage_timings", default=None)
+
+@contextmanager
+def stage(name: str):
+    """Times a block as assessment stage `name` (histogram plus the per-request timings block)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        METRICS.observe("avec_stage_seconds", seconds, {"stage": name})
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0.0) + seconds * 1000, 3)
+
+# --- Request Coalescing (single-flight) ---
+# Concurrent identical Ensembl GETs (same URL and parameters) share one upstream
+# request: the first caller fetches, later callers wait for its result. Results
+# are shared objects and must be treated as read-only.
+
+def _endpoint_name(path: str) -> str:
+    """Endpoint label for statistics: the path without its trailing identifier."""
+    if path.startswith("/vep/human/region"):
+        # Region VEP paths end in region and allele (and the bulk POST has neither)
+        return "/vep/human/region"
+    if path in ("/lookup/id", "/sequence/id", "/vep/human/hgvs"):
+        # Bulk POSTs share the endpoint of the per-ID GETs
+        return path
+    return path.rsplit('/', 1)[0] or path
+
+def _request_key(base_url: str, path: str, params: Optional[Dict[str, Any]]) -> Tuple:
+    return (base_url, path, tuple(sorted((k, str(v)) for k, v in (params or {}).items())))
+
+class CoalescingStats:
+    """Per-endpoint counts of requests, upstream calls and coalesced (shared) calls."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, coalesced: bool):
+        with self._lock:
+            counts = self._counts.setdefault(endpoint, {"requests": 0, "upstream": 0, "coalesced": 0})
+            counts["requests"] += 1
+            counts["coalesced" if coalesced else "upstream"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {endpoint: dict(counts) for endpoint, counts in self._counts.items()}
+
+ENSEMBL_COALESCING_STATS = CoalescingStats()
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Thread-safe single-flight group shared by all EnsemblClient instances in a process."""
+    def __init__(self, stats: CoalescingStats):
+        self.stats = stats
+        self._lock = threading.Lock()
+        self._flights: Dict[Tuple, _Flight] = {}
+
+    def do(self, endpoint: str, key: Tuple, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        self.stats.record(endpoint, coalesced=not leader)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+class AsyncSingleFlight:
+    """
+    asyncio single-flight group; one per AsyncEnsemblClient (and thus per event loop).
+    The call runs in its own task that every caller awaits, so a caller that is
+    cancelled (e.g. its client disconnected) only stops waiting; the others still
+    get the result.
+    """
+    def __init__(self, stats: CoalescingStats):
+        self.stats = stats
+        self._flights: Dict[Tuple, asyncio.Task] = {}
+
+    async def do(self, endpoint: str, key: Tuple, fn):
+        flight = self._flights.get(key)
+        self.stats.record(endpoint, coalesced=flight is not None)
+        if flight is None:
+            flight = self._flights[key] = asyncio.ensure_future(fn())
+            flight.add_done_callback(lambda task: self._landed(key, task))
+        return await asyncio.shield(flight)
+
+    def _landed(self, key: Tuple, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller had stopped waiting
+
+ENSEMBL_SINGLE_FLIGHT = SingleFlight(ENSEMBL_COALESCING_STATS)
+
+def ensembl_coalescing_stats() -> Dict[str, Dict[str, int]]:
+    """Per-endpoint single-flight statistics for this process (sync and async clients)."""
+    return ENSEMBL_COALESCING_STATS.snapshot()
+
+# --- Record / Playback ---
+# AVEC_ENSEMBL_MODE selects how Ensembl clients reach the REST API:
+#   live      talk to Ensembl (default)
+#   record    talk to Ensembl and save every definitive response (200 or 4xx)
+#   playback  answer only from the saved responses; a miss raises PlaybackMiss
+# Responses are saved in AVEC_ENSEMBL_STORE (SQLite). Requests are keyed by path
+# and sorted parameters (not host), and response bodies are content-addressed
+# and compressed, so the many identical bodies ([] or 4xx) are stored once.
+
+ENSEMBL_MODES = ("live", "record", "playback")
+ENSEMBL_MODE = os.environ.get("AVEC_ENSEMBL_MODE", "live").strip().lower()
+ENSEMBL_STORE_PATH = os.environ.get("AVEC_ENSEMBL_STORE", os.path.join(DATA_DIR, 'ensembl_store.sqlite'))
+if ENSEMBL_MODE not in ENSEMBL_MODES:
+    raise ValueError(f"AVEC_ENSEMBL_MODE must be one of {', '.join(ENSEMBL_MODES)}, not {ENSEMBL_MODE!r}")
+METRICS.describe("avec_ensembl_store_total", "counter", "Record/playback store operations by outcome.")
+
+class PlaybackMiss(LookupError):
+    """Raised in playback mode for a request that was never recorded."""
+
+class ResponseStore:
+    """Content-addressed store of Ensembl responses (request key -> body hash -> compressed JSON body)."""
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS requests (key TEXT PRIMARY KEY, request TEXT, body TEXT, recorded REAL)")
+            db.execute("CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, data BLOB)")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+        return db
+
+    @staticmethod
+    def request_text(path: str, params: Optional[Dict[str, Any]]) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted((k, str(v)) for k, v in (params or {}).items()))
+        return f"GET {path}?{query}"
+
+    def get(self, path: str, params: Optional[Dict[str, Any]]) -> Tuple[bool, Any]:
+        """(found, value) for a request."""
+        key = hashlib.sha256(self.request_text(path, params).encode('utf-8')).hexdigest()
+        row = self._connect().execute(
+            "SELECT bodies.data FROM requests JOIN bodies ON bodies.hash = requests.body WHERE requests.key = ?", (key,)
+        ).fetchone()
+        return (True, json.loads(zlib.decompress(row[0]))) if row else (False, None)
+
+    def put(self, path: str, params: Optional[Dict[str, Any]], value: Any):
+        request_text = self.request_text(path, params)
+        key = hashlib.sha256(request_text.encode('utf-8')).hexdigest()
+        body = json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        body_hash = hashlib.sha256(body).hexdigest()
+        with self._connect() as db:
+            db.execute("INSERT OR IGNORE INTO bodies VALUES (?, ?)", (body_hash, zlib.compress(body, 9)))
+            db.execute("INSERT OR REPLACE INTO requests VALUES (?, ?, ?, ?)", (key, request_text, body_hash, time.time()))
+
+_response_stores: Dict[str, ResponseStore] = {}
+_response_stores_lock = threading.Lock()
+
+def response_store(path: str = None) -> ResponseStore:
+    """Shared ResponseStore per file for this process."""
+    path = path or ENSEMBL_STORE_PATH
+    with _response_stores_lock:
+        if path not in _response_stores:
+            _response_stores[path] = ResponseStore(path)
+        return _response_stores[path]
+
+def _replay(store: ResponseStore, path: str, params: Optional[Dict[str, Any]]) -> Any:
+    found, value = store.get(path, params)
+    METRICS.inc("avec_ensembl_store_total", {"mode": "playback", "outcome": "hit" if found else "miss"})
+    if not found:
+        raise PlaybackMiss(f"No recorded Ensembl response for {store.request_text(path, params)} in {store.path}")
+    return value
+
+def _keep(client: Any, path: str, params: Optional[Dict[str, Any]], value: Any) -> Any:
+    """Returns a definitive response, saving it first in record mode."""
+    if client.mode == "record":
+        client.store.put(path, params, value)
+        METRICS.inc("avec_ensembl_store_total", {"mode": "record", "outcome": "saved"})
+    return value
+
+# --- Circuit Breakers and Hedging ---
+# Each Ensembl endpoint has a process-wide circuit breaker. A 5xx, a 429 or a
+# transport error (timeout, refused connection) is a failure; after
+# AVEC_BREAKER_FAILURES consecutive failures the breaker opens and calls to the
+# endpoint fail fast for AVEC_BREAKER_COOLDOWN seconds. After that a single trial
+# request is let through (half-open): its success closes the breaker, its failure
+# opens it again, and the outcomes of calls admitted before it are ignored. Calls that fail fast, or run out of retries or of their time budget, are
+# answered from the record/playback store when it has the response and raise
+# EnsemblUnavailable otherwise; assessments that hit it are not cached.
+#
+# With AVEC_ENSEMBL_HEDGE=1, VEP GETs that have not answered after the
+# endpoint's recent p95 latency are sent a second time and the first answer wins.
+# The loser keeps its hedge pool thread until it answers or times out, so requests
+# are not hedged while all HEDGE_POOL_SIZE threads are busy.
+
+BREAKER_FAILURES = int(os.environ.get("AVEC_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("AVEC_BREAKER_COOLDOWN", "30"))
+ENSEMBL_HEDGE = os.environ.get("AVEC_ENSEMBL_HEDGE", "0").lower() in ("1", "true", "yes")
+HEDGED_ENDPOINTS = {"/vep/human/hgvs", "/vep/human/region"}
+HEDGE_MIN_DELAY = 0.25
+HEDGE_MIN_SAMPLES = 20
+HEDGE_POOL_SIZE = 16
+METRICS.describe("avec_ensembl_breaker_trips_total", "counter", "Times an Ensembl endpoint's circuit breaker opened.")
+METRICS.describe("avec_ensembl_breaker_rejected_total", "counter", "Ensembl calls failed fast by an open circuit breaker.")
+METRICS.describe("avec_ensembl_fallback_total", "counter", "Unavailable Ensembl calls by fallback outcome (store hit or error).")
+METRICS.describe("avec_ensembl_hedged_total", "counter", "Hedged Ensembl requests by winner (primary or backup).")
+METRICS.describe("avec_ensembl_hedge_skipped_total", "counter", "Ensembl requests not hedged because the hedge pool was busy.")
+
+class EnsemblUnavailable(RuntimeError):
+    """An Ensembl endpoint failed (or its circuit breaker is open) and no stored response was available."""
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Ensembl ({endpoint}) is currently unavailable.")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Thread-safe closed / open / half-open breaker for one endpoint."""
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._trial = 0  # token of the running half-open trial, 0 when there is none
+        self._trials = 0
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> Optional[int]:
+        """
+        Admits a call and returns its token for success() / failure(): 0 while closed,
+        the trial's number while half-open. Returns None when the call must fail fast.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open" and now - self.opened_at >= self.cooldown:
+                self.state, self._trial = "half_open", 0
+            if self.state == "closed":
+                return 0
+            # A trial that never reported back (its caller was cancelled) is replaced after a cooldown
+            if self.state == "half_open" and (not self._trial or now - self._trial_started >= self.cooldown):
+                self._trials += 1
+                self._trial, self._trial_started = self._trials, now
+                return self._trial
+            self.rejected += 1
+        METRICS.inc("avec_ensembl_breaker_rejected_total", {"endpoint": self.name})
+        return None
+
+    def success(self, token: int):
+        with self._lock:
+            if self.state == "closed" or (self._trial and token == self._trial):
+                self.state, self.consecutive, self._trial = "closed", 0, 0
+
+    def failure(self, token: int):
+        with self._lock:
+            tripped = False
+            if self.state == "closed":
+                self.consecutive += 1
+                tripped = self.consecutive >= self.failures
+            elif self._trial and token == self._trial:
+                self.consecutive += 1
+                tripped = True
+            if tripped:
+                self.state, self.opened_at, self._trial = "open", time.monotonic(), 0
+                self.trips += 1
+        if tripped:
+            METRICS.inc("avec_ensembl_breaker_trips_total", {"endpoint": self.name})
+            print(f"Circuit breaker opened for Ensembl {self.name} after {self.consecutive} consecutive failures")
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_after = self.retry_after()
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive, "trips": self.trips,
+                    "rejected": self.rejected, "retry_after_s": round(retry_after, 1)}
+
+class BreakerRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(endpoint)
+            return self._breakers[endpoint]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.snapshot() for b in sorted(breakers, key=lambda b: b.name)}
+
+ENSEMBL_BREAKERS = BreakerRegistry()
+
+class LatencyTracker:
+    """Latencies of the last successful requests per endpoint, for the hedging delay."""
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+
+    def observe(self, endpoint: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self.size)).append(seconds)
+
+    def p95(self, endpoint: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+ENSEMBL_LATENCY = LatencyTracker()
+
+def hedge_delay(endpoint: str) -> Optional[float]:
+    """Seconds to wait before hedging a request to endpoint, or None to not hedge it."""
+    if not ENSEMBL_HEDGE or endpoint not in HEDGED_ENDPOINTS:
+        return None
+    p95 = ENSEMBL_LATENCY.p95(endpoint)
+    return max(HEDGE_MIN_DELAY, p95) if p95 is not None else None
+
+_hedge_pool: Optional[futures.ThreadPoolExecutor] = None
+_hedge_pool_lock = threading.Lock()
+
+def hedge_pool() -> futures.ThreadPoolExecutor:
+    # Created on first use, i.e. in the worker (threads do not survive fork)
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = futures.ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="ensembl-hedge")
+        return _hedge_pool
+
+_hedge_slots = threading.BoundedSemaphore(HEDGE_POOL_SIZE)
+
+def hedge_submit(fn, *args, **kwargs) -> Optional[futures.Future]:
+    """Runs fn on the hedge pool, or returns None when all of its threads are busy."""
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    future = hedge_pool().submit(fn, *args, **kwargs)
+    future.add_done_callback(lambda _: _hedge_slots.release())
+    return future
+
+# Endpoints that were unavailable during the assessment running in the current context
+_ensembl_unavailable: contextvars.ContextVar[Optional[set]] = contextvars.ContextVar("ensembl_unavailable", default=None)
+
+def _unavailable(client: Any, path: str, params: Optional[Dict[str, Any]], breaker: CircuitBreaker) -> Any:
+    """Answers a call that cannot reach Ensembl from the record/playback store, else raises EnsemblUnavailable."""
+    store = client.store or (response_store() if os.path.exists(ENSEMBL_STORE_PATH) else None)
+    if store is not None:
+        found, value = store.get(path, params)
+        if found:
+            METRICS.inc("avec_ensembl_fallback_total", {"endpoint": breaker.name, "outcome": "store"})
+            return value
+    METRICS.inc("avec_ensembl_fallback_total", {"endpoint": breaker.name, "outcome": "error"})
+    unavailable = _ensembl_unavailable.get()
+    if unavailable is not None:
+        unavailable.add(breaker.name)
+    raise EnsemblUnavailable(breaker.name, breaker.retry_after() or BREAKER_COOLDOWN)
+
+# --- Fair Ensembl Scheduling ---
+# The Ensembl requests of a deployment share AVEC_ENSEMBL_RATE request starts per
+# second (0 turns the limiter off; the per-client AVEC_ENSEMBL_DELAY pacing still
+# applies). Each of the WEB_CONCURRENCY worker processes paces its own share. Requests
+# waiting for a start are served by class: the web UI ("interactive") first, then
+# API callers ("api"), then batches ("batch"), then cache prewarming ("background").
+# Within a class the tenants (API keys; "ui" for the web UI) take turns, so one
+# caller's loop cannot crowd out everyone else. Sync and async clients share it.
+
+ENSEMBL_RATE = float(os.environ.get('AVEC_ENSEMBL_RATE', '15'))
+ENSEMBL_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+SCHEDULING_CLASSES = ("interactive", "api", "batch", "background")
+
+class Tenant:
+    """An API caller: the tenant of an API key, or the shared anonymous tenant."""
+    def __init__(self, name: str, daily_quota: int = 0, scheduling_class: Optional[str] = None):
+        self.name = name
+        self.daily_quota = daily_quota
+        # Fixed scheduling class (internal tenants); API tenants follow the traffic class
+        self.scheduling_class = scheduling_class
+        # Quota units used today, once this request has been charged
+        self.used: Optional[int] = None
+
+_tenant: contextvars.ContextVar[Optional[Tenant]] = contextvars.ContextVar("tenant", default=None)
+
+def scheduling_class() -> str:
+    tenant = _tenant.get()
+    if tenant is not None and tenant.scheduling_class:
+        return tenant.scheduling_class
+    if _traffic_class.get() == "batch":
+        return "batch"
+    return "interactive" if tenant is None else "api"
+
+class _Waiter:
+    """A request waiting for a start; async waiters are woken through their event loop."""
+    __slots__ = ("loop", "event")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else None
+
+class FairScheduler:
+    """
+    Spaces request starts by 1/rate seconds. Waiters queue per class and tenant;
+    each start goes to the first class (SCHEDULING_CLASSES order) with waiters and,
+    within it, to its tenants in turn. Threads wait with acquire(), coroutines with
+    acquire_async().
+    """
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._cond = threading.Condition()
+        self._queues: Dict[str, "OrderedDict[str, deque]"] = {name: OrderedDict() for name in SCHEDULING_CLASSES}
+        self._next_start = 0.0
+
+    def _head(self) -> Optional[_Waiter]:
+        for queues in self._queues.values():
+            for waiters in queues.values():
+                return waiters[0]
+        return None
+
+    def _caller(self) -> Tuple[str, str]:
+        name = scheduling_class()
+        tenant = _tenant.get()
+        tenant_name = tenant.name if tenant is not None else "ui"
+        METRICS.inc("avec_tenant_ensembl_requests_total", {"tenant": tenant_name, "class": name})
+        return name, tenant_name
+
+    def _wake_head(self):
+        """Called with the lock held whenever the head of the queues may have changed."""
+        self._cond.notify_all()
+        head = self._head()
+        if head is not None and head.loop is not None:
+            head.loop.call_soon_threadsafe(head.event.set)
+
+    def _remove(self, name: str, tenant_name: str, waiter: _Waiter, now: Optional[float] = None):
+        """Takes waiter out of its queue (with now: as the start just granted, sending its tenant to the back)."""
+        waiters = self._queues[name].pop(tenant_name)
+        waiters.remove(waiter)
+        if waiters:
+            self._queues[name][tenant_name] = waiters
+        if now is not None:
+            self._next_start = max(now, self._next_start) + self.interval
+        self._wake_head()
+
+    def acquire(self):
+        """Blocks until the calling request may start."""
+        name, tenant_name = self._caller()
+        if not self.interval:
+            return
+        waiter = _Waiter()
+        started = time.monotonic()
+        with self._cond:
+            self._queues[name].setdefault(tenant_name, deque()).append(waiter)
+            while True:
+                now = time.monotonic()
+                if self._head() is waiter:
+                    if now >= self._next_start:
+                        break
+                    self._cond.wait(self._next_start - now)
+                else:
+                    self._cond.wait()
+            self._remove(name, tenant_name, waiter, now)
+        METRICS.observe("avec_ensembl_scheduler_wait_seconds", time.monotonic() - started, {"class": name})
+
+    async def acquire_async(self):
+        """Waits (without blocking the event loop) until the calling request may start."""
+        name, tenant_name = self._caller()
+        if not self.interval:
+            return
+        waiter = _Waiter(asyncio.get_running_loop())
+        started = time.monotonic()
+        with self._cond:
+            self._queues[name].setdefault(tenant_name, deque()).append(waiter)
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    if self._head() is waiter:
+                        if now >= self._next_start:
+                            self._remove(name, tenant_name, waiter, now)
+                            break
+                        delay = self._next_start - now
+                    else:
+                        delay = None
+                        waiter.event.clear()
+                if delay is None:
+                    await waiter.event.wait()
+                else:
+                    await asyncio.sleep(delay)
+        except BaseException:
+            # Cancelled while queued: do not leave a waiter at the head that never starts
+            with self._cond:
+                if any(waiter in waiters for waiters in self._queues[name].values()):
+                    self._remove(name, tenant_name, waiter)
+            raise
+        METRICS.observe("avec_ensembl_scheduler_wait_seconds", time.monotonic() - started, {"class": name})
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            waiting = {name: sum(len(t) for t in queues.values()) for name, queues in self._queues.items()}
+        return {"rate": ENSEMBL_RATE, "workers": ENSEMBL_WORKERS, "waiting": waiting}
+
+ENSEMBL_SCHEDULER = FairScheduler(ENSEMBL_RATE / ENSEMBL_WORKERS)
+METRICS.describe("avec_tenant_ensembl_requests_total", "counter", "Ensembl requests by tenant and scheduling class.")
+METRICS.describe("avec_ensembl_scheduler_wait_seconds", "histogram", "Time Ensembl requests waited for the shared rate limiter.")
+
 class EnsemblClient:
-    def __init__(self, base_url=ENSEMBL_REST, headers=HEADERS, delay=0.1):
+    def __init__(self, base_url=ENSEMBL_REST, headers=HEADERS, delay=ENSEMBL_DELAY, mode=None, store_path=None):
         self.base_url = base_url.rstrip('/')
         self.session = requests.Session()
         self.session.headers.update(headers)
         self.delay = delay
+        self.mode = mode or ENSEMBL_MODE
+        self.store = response_store(store_path) if self.mode != "live" else None
 
     def _get(self, path, params=None, max_retries=5):
+        key = _request_key(self.base_url, path, params)
+        found, value = cached_response(path, key)
+        if found:
+            return value
+        value = ENSEMBL_SINGLE_FLIGHT.do(_endpoint_name(path), key, lambda: self._fetch(path, params, max_retries))
+        cache_response(path, key, value)
+        return value
+
+    def _fetch(self, path, params=None, max_retries=5, payload=None):
+        """GET path, or POST payload to it; POSTs are only made in live mode (they are not recorded)."""
+        if self.mode == "playback":
+            return _replay(self.store, path, params)
+        endpoint = _endpoint_name(path)
+        breaker = ENSEMBL_BREAKERS.get(endpoint)
         url = f"{self.base_url}{path}"
+        deadline = time.monotonic() + ENSEMBL_CALL_BUDGET
         backoff = 1.0
         for attempt in range(max_retries):
+            token = breaker.allow()
+            if token is None:
+                break
             time.sleep(self.delay)
+            ENSEMBL_SCHEDULER.acquire()
+            started = time.perf_counter()
+            wait = 0.0
             try:
-                resp = self.session.get(url, params=params, timeout=30)
+                delay = hedge_delay(endpoint) if payload is None else None
+                if payload is not None:
+                    resp = self.session.post(url, params=params, json=payload, timeout=ENSEMBL_TIMEOUT * 4)
+                elif delay is not None:
+                    resp = self._hedged_get(url, params, endpoint, delay)
+                else:
+                    resp = self.session.get(url, params=params, timeout=ENSEMBL_TIMEOUT)
+                elapsed = time.perf_counter() - started
+                record_ensembl_attempt(path, str(resp.status_code), elapsed, attempt)
                 if resp.status_code == 200:
-                    try: return resp.json()
-                    except ValueError: return resp.text
+                    breaker.success(token)
+                    ENSEMBL_LATENCY.observe(endpoint, elapsed)
+                    try: return _keep(self, path, params, resp.json())
+                    except ValueError: return _keep(self, path, params, resp.text)
                 elif resp.status_code in (429, 503):
-                    wait = float(resp.headers.get('Retry-After', backoff))
-                    time.sleep(wait); backoff *= 2
+                    breaker.failure(token)
+                    wait = float(resp.headers.get('Retry-After', backoff)); backoff *= 2
                 elif 500 <= resp.status_code < 600:
-                    time.sleep(backoff); backoff *= 2
+                    breaker.failure(token)
+                    wait = backoff; backoff *= 2
                 else:
-                    if 400 <= resp.status_code < 500: return None
+                    breaker.success(token)
+                    if 400 <= resp.status_code < 500: return _keep(self, path, params, None)
             except requests.RequestException:
-                if attempt + 1 == max_retries: raise
-                time.sleep(backoff); backoff *= 2
-        return None
+                record_ensembl_attempt(path, "error", time.perf_counter() - started, attempt)
+                breaker.failure(token)
+                wait = backoff; backoff *= 2
+            if time.monotonic() + wait > deadline:
+                break
+            time.sleep(wait)
+        return _unavailable(self, path, params, breaker)
+
+    def _hedged_get(self, url, params, endpoint, delay):
+        """GET that is sent again if it has not answered after delay seconds; the first response wins."""
+        primary = hedge_submit(self.session.get, url, params=params, timeout=ENSEMBL_TIMEOUT)
+        if primary is None:
+            METRICS.inc("avec_ensembl_hedge_skipped_total", {"endpoint": endpoint})
+            return self.session.get(url, params=params, timeout=ENSEMBL_TIMEOUT)
+        if futures.wait([primary], timeout=delay).done:
+            return primary.result()
+        backup = hedge_submit(self.session.get, url, params=params, timeout=ENSEMBL_TIMEOUT)
+        if backup is None:
+            METRICS.inc("avec_ensembl_hedge_skipped_total", {"endpoint": endpoint})
+            return primary.result()
+        error = None
+        for future in futures.as_completed([primary, backup]):
+            try:
+                resp = future.result()
+            except requests.RequestException as e:
+                error = e
+                continue
+            METRICS.inc("avec_ensembl_hedged_total", {"endpoint": endpoint, "winner": "primary" if future is primary else "backup"})
+            return resp
+        raise error
 
+    def get_release(self): return self._get("/info/data")
     def lookup_id_expand(self, identifier): return self._get(f"/lookup/id/{identifier}", params={'expand': '1'})
     def vep_hgvs(self, hgvs_string): return self._get(f"/vep/human/hgvs/{hgvs_string.strip()}", params={'variant_class': 1})
+    def vep_region(self, chrom, pos, ref, alt):
+        region, allele = vep_region_notation(chrom, pos, ref, alt)
+        return self._get(f"/vep/human/region/{region}/{allele}", params={'variant_class': 1, 'hgvs': 1})
+    def vep_region_bulk(self, variants):
+        """
+        VEP for many (chrom, pos, ref, alt) variants, VEP_BULK_SIZE per POST. Returns
+        {variant: vep_region-style result} for every variant of an answered request
+        (None where VEP returned nothing). Live mode only; otherwise returns {}.
+        """
+        results = {}
+        if self.mode != "live":
+            return results
+        for i in range(0, len(variants), VEP_BULK_SIZE):
+            lines = _vep_bulk_lines(variants[i:i + VEP_BULK_SIZE])
+            data = self._fetch("/vep/human/region", payload={"variants": list(lines), "variant_class": 1, "hgvs": 1})
+            results.update(_vep_bulk_results(lines, data))
+        return results
+    def vep_hgvs_bulk(self, notations):
+        """
+        VEP for many HGVS notations, VEP_BULK_SIZE per POST. Returns {notation:
+        vep_hgvs-style result} for the notations VEP answered. Live mode only.
+        """
+        results = {}
+        if self.mode != "live":
+            return results
+        for chunk in _chunks(notations, VEP_BULK_SIZE):
+            results.update(_vep_hgvs_bulk_results(chunk, self._fetch("/vep/human/hgvs", payload={"hgvs_notations": chunk, "variant_class": 1})))
+        return results
+    def lookup_ids_expand(self, identifiers):
+        """
+        Expanded models for many stable IDs, {id: model} for those found: one POST
+        per LOOKUP_BULK_SIZE IDs in live mode, lookup_id_expand for each otherwise.
+        """
+        if self.mode != "live":
+            return {i: model for i in identifiers if (model := self.lookup_id_expand(i))}
+        models = {}
+        for chunk in _chunks(identifiers, LOOKUP_BULK_SIZE):
+            models.update(_bulk_lookup_results(chunk, self._fetch("/lookup/id", params={'expand': '1'}, payload={"ids": chunk})))
+        return models
+    def get_cds_sequences(self, transcript_ids):
+        """CDS of many transcripts, {id: sequence} for those found (SEQUENCE_BULK_SIZE per POST in live mode)."""
+        if self.mode != "live":
+            return {i: seq for i in transcript_ids if (seq := self.get_cds_sequence(i))}
+        sequences = {}
+        for chunk in _chunks(transcript_ids, SEQUENCE_BULK_SIZE):
+            sequences.update(_bulk_sequence_results(chunk, self._fetch("/sequence/id", params={"type": "cds"}, payload={"ids": chunk})))
+        return sequences
     def get_cds_sequence(self, transcript_id):
         data = self._get(f"/sequence/id/{transcript_id}", params={"type": "cds"})
         return data.get("seq") if isinstance(data, dict) else None
     def get_domains(self, protein_id):
-        all_features = self._get(f"/overlap/translation/{protein_id}", params={"feature": "protein_feature"})
-        if not all_features or not isinstance(all_features, list): return []
-        domain_sources = {'CDD','Pfam','SMART','PROSITE profiles','PROSITE patterns','SUPERFAMILY','PRINTS','TIGRFAM','ProDom'}
-        preliminary_domains = [f for f in all_features if f.get('type') in domain_sources]
-        unique_interpro_domains = {f['interpro']: f for f in preliminary_domains if f.get('interpro')}
-        return list(unique_interpro_domains.values())
+        return _filter_domains(self._get(f"/overlap/translation/{protein_id}", params={"feature": "protein_feature"}))
     def overlap_region_variation(self, chrom, start, end):
         data = self._get(f"/overlap/region/human/{chrom}:{start}-{end}", params={'feature': 'variation'})
         return data if isinstance(data, list) else []
@@ -1098,60 +2498,465 @@ class EnsemblClient:
         """Fetches gene data for a given symbol."""
         data = self._get(f"/lookup/symbol/human/{symbol}", params={'expand': '0'})
         return data if isinstance(data, dict) else None
-    
-# --- Helper & Parsing Functions ---
 
-def _evaluate_splice_variant_position(variant_hgvs: str, vep_data: Dict[str, Any], details: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+# Variants per POST /vep/human/region request (the Ensembl REST limit)
+VEP_BULK_SIZE = 200
+
+def _vep_bulk_lines(variants) -> Dict[str, Tuple[str, int, str, str]]:
+    """VCF-like input lines for a bulk VEP request, mapped back to their variant."""
+    return {f"{chrom} {pos} . {ref} {alt} . . .": (chrom, pos, ref, alt) for chrom, pos, ref, alt in variants}
+
+def _vep_bulk_results(lines: Dict[str, Tuple[str, int, str, str]], data: Any) -> Dict[Tuple[str, int, str, str], Any]:
+    if not isinstance(data, list):
+        return {}
+    results = dict.fromkeys(lines.values())
+    for entry in data:
+        variant = lines.get(entry.get('input')) if isinstance(entry, dict) else None
+        if variant:
+            results[variant] = [entry]
+    return results
+
+def _vep_hgvs_bulk_results(notations: List[str], data: Any) -> Dict[str, Any]:
+    # Notations VEP did not answer are left to a GET, which reports why
+    if not isinstance(data, list):
+        return {}
+    wanted = set(notations)
+    return {entry['input']: [entry] for entry in data if isinstance(entry, dict) and entry.get('input') in wanted}
+
+# IDs per POST /lookup/id and POST /sequence/id request (the Ensembl REST limits)
+LOOKUP_BULK_SIZE = 1000
+SEQUENCE_BULK_SIZE = 50
+
+def _chunks(items, size: int) -> Iterator[List[Any]]:
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _bulk_lookup_results(identifiers: List[str], data: Any) -> Dict[str, Any]:
+    if not isinstance(data, dict):
+        return {}
+    return {i: data[i] for i in identifiers if isinstance(data.get(i), dict)}
+
+def _bulk_sequence_results(identifiers: List[str], data: Any) -> Dict[str, str]:
+    if not isinstance(data, list):
+        return {}
+    wanted = set(identifiers)
+    sequences = {}
+    for entry in data:
+        if isinstance(entry, dict) and entry.get('seq'):
+            identifier = entry.get('query') or entry.get('id')
+            if identifier in wanted:
+                sequences[identifier] = entry['seq']
+    return sequences
+
+def _filter_domains(all_features) -> List[Dict[str, Any]]:
+    """Keeps one protein_feature per InterPro entry from the domain databases we trust."""
+    if not all_features or not isinstance(all_features, list): return []
+    domain_sources = {'CDD','Pfam','SMART','PROSITE profiles','PROSITE patterns','SUPERFAMILY','PRINTS','TIGRFAM','ProDom'}
+    preliminary_domains = [f for f in all_features if f.get('type') in domain_sources]
+    unique_interpro_domains = {f['interpro']: f for f in preliminary_domains if f.get('interpro')}
+    return list(unique_interpro_domains.values())
+
+class AsyncEnsemblClient:
     """
-    Assesses a validated splice-altering variant based on its genomic position.
-    This logic is shared by database-found variants and user-validated variants.
+    asyncio counterpart of EnsemblClient (same methods, awaitable). One instance is
+    shared by all requests on an event loop: at most max_in_flight Ensembl requests
+    run at once and request starts are spaced by delay, so hundreds of assessments
+    can wait on Ensembl concurrently without exceeding the rate budget.
     """
-    core_hgvs_match = re.search(r'(c\..*)', variant_hgvs, re.IGNORECASE)
-    if not core_hgvs_match: 
-        return None
-    core_canonical_hgvs = core_hgvs_match.group(1).lower()
+    def __init__(self, base_url=ENSEMBL_REST, headers=HEADERS, delay=ENSEMBL_DELAY, max_in_flight=15, mode=None, store_path=None):
+        if httpx is None:
+            raise RuntimeError("AsyncEnsemblClient requires the 'httpx' package.")
+        self.mode = mode or ENSEMBL_MODE
+        self.store = response_store(store_path) if self.mode != "live" else None
+        self.base_url = base_url.rstrip('/')
+        self.session = httpx.AsyncClient(headers=headers, timeout=ENSEMBL_TIMEOUT)
+        self.delay = delay
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._pace_lock = asyncio.Lock()
+        self._next_start = 0.0
+        self._single_flight = AsyncSingleFlight(ENSEMBL_COALESCING_STATS)
+
+    async def _pace(self):
+        async with self._pace_lock:
+            now = time.monotonic()
+            wait = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _get(self, path, params=None, max_retries=5):
+        key = _request_key(self.base_url, path, params)
+        found, value = cached_response(path, key)
+        if found:
+            return value
+        value = await self._single_flight.do(_endpoint_name(path), key, lambda: self._fetch(path, params, max_retries))
+        cache_response(path, key, value)
+        return value
+
+    async def _fetch(self, path, params=None, max_retries=5, payload=None):
+        if self.mode == "playback":
+            return _replay(self.store, path, params)
+        endpoint = _endpoint_name(path)
+        breaker = ENSEMBL_BREAKERS.get(endpoint)
+        url = f"{self.base_url}{path}"
+        deadline = time.monotonic() + ENSEMBL_CALL_BUDGET
+        backoff = 1.0
+        for attempt in range(max_retries):
+            token = breaker.allow()
+            if token is None:
+                break
+            await self._pace()
+            await ENSEMBL_SCHEDULER.acquire_async()
+            started = time.perf_counter()
+            wait = 0.0
+            try:
+                delay = hedge_delay(endpoint) if payload is None else None
+                async with self._in_flight:
+                    if payload is not None:
+                        resp = await self.session.post(url, params=params, json=payload, timeout=ENSEMBL_TIMEOUT * 4)
+                    elif delay is not None:
+                        resp = await self._hedged_get(url, params, endpoint, delay)
+                    else:
+                        resp = await self.session.get(url, params=params)
+                elapsed = time.perf_counter() - started
+                record_ensembl_attempt(path, str(resp.status_code), elapsed, attempt)
+                if resp.status_code == 200:
+                    breaker.success(token)
+                    ENSEMBL_LATENCY.observe(endpoint, elapsed)
+                    try: return _keep(self, path, params, resp.json())
+                    except ValueError: return _keep(self, path, params, resp.text)
+                elif resp.status_code in (429, 503):
+                    breaker.failure(token)
+                    wait = float(resp.headers.get('Retry-After', backoff)); backoff *= 2
+                elif 500 <= resp.status_code < 600:
+                    breaker.failure(token)
+                    wait = backoff; backoff *= 2
+                else:
+                    breaker.success(token)
+                    if 400 <= resp.status_code < 500: return _keep(self, path, params, None)
+            except httpx.HTTPError:
+                record_ensembl_attempt(path, "error", time.perf_counter() - started, attempt)
+                breaker.failure(token)
+                wait = backoff; backoff *= 2
+            if time.monotonic() + wait > deadline:
+                break
+            await asyncio.sleep(wait)
+        return _unavailable(self, path, params, breaker)
+
+    async def _hedged_get(self, url, params, endpoint, delay):
+        primary = asyncio.ensure_future(self.session.get(url, params=params))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        backup = asyncio.ensure_future(self.session.get(url, params=params))
+        pending, error = {primary, backup}, None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    METRICS.inc("avec_ensembl_hedged_total", {"endpoint": endpoint, "winner": "primary" if task is primary else "backup"})
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def aclose(self):
+        await self.session.aclose()
+
+    async def get_release(self): return await self._get("/info/data")
+    async def lookup_id_expand(self, identifier): return await self._get(f"/lookup/id/{identifier}", params={'expand': '1'})
+    async def vep_hgvs(self, hgvs_string): return await self._get(f"/vep/human/hgvs/{hgvs_string.strip()}", params={'variant_class': 1})
+    async def vep_region(self, chrom, pos, ref, alt):
+        region, allele = vep_region_notation(chrom, pos, ref, alt)
+        return await self._get(f"/vep/human/region/{region}/{allele}", params={'variant_class': 1, 'hgvs': 1})
+    async def vep_region_bulk(self, variants):
+        results = {}
+        if self.mode != "live":
+            return results
+        for i in range(0, len(variants), VEP_BULK_SIZE):
+            lines = _vep_bulk_lines(variants[i:i + VEP_BULK_SIZE])
+            data = await self._fetch("/vep/human/region", payload={"variants": list(lines), "variant_class": 1, "hgvs": 1})
+            results.update(_vep_bulk_results(lines, data))
+        return results
+    async def vep_hgvs_bulk(self, notations):
+        results = {}
+        if self.mode != "live":
+            return results
+        for chunk in _chunks(notations, VEP_BULK_SIZE):
+            results.update(_vep_hgvs_bulk_results(chunk, await self._fetch("/vep/human/hgvs", payload={"hgvs_notations": chunk, "variant_class": 1})))
+        return results
+    async def lookup_ids_expand(self, identifiers):
+        if self.mode != "live":
+            models = await asyncio.gather(*(self.lookup_id_expand(i) for i in identifiers))
+            return {i: model for i, model in zip(identifiers, models) if model}
+        models = {}
+        for chunk in _chunks(identifiers, LOOKUP_BULK_SIZE):
+            models.update(_bulk_lookup_results(chunk, await self._fetch("/lookup/id", params={'expand': '1'}, payload={"ids": chunk})))
+        return models
+    async def get_cds_sequences(self, transcript_ids):
+        if self.mode != "live":
+            sequences = await asyncio.gather(*(self.get_cds_sequence(i) for i in transcript_ids))
+            return {i: seq for i, seq in zip(transcript_ids, sequences) if seq}
+        sequences = {}
+        for chunk in _chunks(transcript_ids, SEQUENCE_BULK_SIZE):
+            sequences.update(_bulk_sequence_results(chunk, await self._fetch("/sequence/id", params={"type": "cds"}, payload={"ids": chunk})))
+        return sequences
+    async def get_cds_sequence(self, transcript_id):
+        data = await self._get(f"/sequence/id/{transcript_id}", params={"type": "cds"})
+        return data.get("seq") if isinstance(data, dict) else None
+    async def get_domains(self, protein_id):
+        return _filter_domains(await self._get(f"/overlap/translation/{protein_id}", params={"feature": "protein_feature"}))
+    async def overlap_region_variation(self, chrom, start, end):
+        data = await self._get(f"/overlap/region/human/{chrom}:{start}-{end}", params={'feature': 'variation'})
+        return data if isinstance(data, list) else []
+    async def get_overlapping_genes(self, gene_id):
+        data = await self._get(f"/overlap/id/{gene_id}", params={"feature": "gene"})
+        return data if isinstance(data, list) else []
+    async def lookup_symbol(self, symbol):
+        data = await self._get(f"/lookup/symbol/human/{symbol}", params={'expand': '0'})
+        return data if isinstance(data, dict) else None
 
-    result = {"details": details}
-    consequence_terms = set(vep_data.get('transcript_consequences', [{}])[0].get('consequence_terms', []))
-    
-    is_intronic_by_consequence = 'intron_variant' in consequence_terms or 'splice_acceptor_variant' in consequence_terms or 'splice_donor_variant' in consequence_terms
-    is_intronic_by_notation = '+' in core_canonical_hgvs or '-' in core_canonical_hgvs
-    is_intronic = is_intronic_by_consequence or is_intronic_by_notation
-
-    if is_intronic:
-        dist_match = re.search(r'[+-](\d+)', core_canonical_hgvs)
-        if not dist_match: 
-            return None 
-        dist = int(dist_match.group(1))
-        
-        if '+' in core_canonical_hgvs: # Downstream (e.g., c.123+1G>A)
-            if dist <= 5:
-                result.update({"classification": "Not Eligible", "reason": "Variant is a validated splice-altering variant located too close to the canonical splice site (<=+5bp)."})
-            elif 6 <= dist <= 50:
-                result.update({"classification": "Unlikely Eligible", "reason": "Variant is a validated splice-altering variant located near the canonical splice site (+6-+50bp)."})
+# --- Assessment Step Drivers ---
+# The assessment logic is written once as generators that yield the Ensembl calls
+# they need instead of calling a client: either one call ("method", (args,)) or a
+# list of independent calls, which are answered with a list of results. run_sync
+# answers them with an EnsemblClient one by one; run_async with an
+# AsyncEnsemblClient, running a list of calls concurrently.
+
+EnsemblCall = Tuple[str, tuple]
+AssessmentSteps = Generator[Any, Any, Any]
+
+# Timing stage of each Ensembl call (calls in one list overlap under run_async)
+CALL_STAGES = {
+    "vep_hgvs": "vep",
+    "vep_region": "vep",
+    "lookup_id_expand": "transcript_lookup",
+    "lookup_ids_expand": "transcript_lookup",
+    "get_cds_sequence": "cds",
+    "get_cds_sequences": "cds",
+    "overlap_region_variation": "region_overlap",
+    "get_domains": "domains",
+    "get_overlapping_genes": "wt_upregulation",
+    "lookup_symbol": "wt_upregulation",
+}
+
+def _call_sync(client: EnsemblClient, name: str, args: tuple) -> Any:
+    with stage(CALL_STAGES.get(name, name)):
+        return getattr(client, name)(*args)
+
+async def _call_async(client: "AsyncEnsemblClient", name: str, args: tuple) -> Any:
+    with stage(CALL_STAGES.get(name, name)):
+        return await getattr(client, name)(*args)
+
+def run_sync(steps: AssessmentSteps, client: EnsemblClient) -> Any:
+    """Drives assessment steps to completion with a synchronous client."""
+    value, error = None, None
+    while True:
+        try:
+            call = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as done:
+            return done.value
+        try:
+            if isinstance(call, list):
+                value = [_call_sync(client, name, args) for name, args in call]
             else:
-                result.update({"classification": "Likely Eligible", "reason": "Variant is a validated splice-altering variant in a favorable deep-intronic position (>+50bp)."})
-        
-        elif '-' in core_canonical_hgvs: # Upstream (e.g., c.124-2A>G)
-            if dist <= 5:
-                result.update({"classification": "Not Eligible", "reason": "Variant is a validated splice-altering variant located too close to the canonical splice site (>=-5bp)."})
-            elif 6 <= dist <= 100:
-                result.update({"classification": "Unlikely Eligible", "reason": "Variant is a validated splice-altering variant located near the canonical splice site (-6-(-100b)p)."})
+                value = _call_sync(client, *call)
+            error = None
+        except Exception as e:
+            value, error = None, e
+
+async def run_async(steps: AssessmentSteps, client: AsyncEnsemblClient) -> Any:
+    """Drives assessment steps to completion with an async client."""
+    value, error = None, None
+    while True:
+        try:
+            call = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as done:
+            return done.value
+        try:
+            if isinstance(call, list):
+                value = list(await asyncio.gather(*(_call_async(client, name, args) for name, args in call)))
             else:
-                result.update({"classification": "Likely Eligible", "reason": "Variant is a validated splice-altering variant in a favorable deep-intronic position (<-100bp)."})
-        
-    elif any(c in consequence_terms for c in ['missense_variant', 'synonymous_variant']):
-        if 'splice_region_variant' in consequence_terms:
-            result.update({"classification": "Not Eligible", "reason": "This validated exonic splice-altering variant is within the canonical splice region, making it high-risk."})
-        else:
-            result.update({"classification": "Likely Eligible", "reason": "This validated exonic splice-altering variant is outside the immediate splice region, making it a potential candidate for correction."})
-    
-    else:
-        # Fallback if it's splice-altering but not in a recognized position
-        result.update({"classification": "Unlikely Eligible", "reason": "Variant is a validated splice-altering variant, but also presumed to cause other effects (e.g. it is a nonsense variant)."})
+                value = await _call_async(client, *call)
+            error = None
+        except Exception as e:
+            value, error = None, e
 
+def gather_steps(all_steps: List[AssessmentSteps], memo: Dict[EnsemblCall, Any]) -> AssessmentSteps:
+    """
+    Runs several assessment steps side by side: each round, the calls they are
+    waiting on are merged into one list, skipping calls already answered in memo
+    (new answers are added to it). Returns their results in order; steps that
+    failed return their exception instead, as with asyncio.gather(return_exceptions=True).
+    """
+    results: List[Any] = [None] * len(all_steps)
+    sends = {i: (None, None) for i in range(len(all_steps))}
+    while sends:
+        pending = {}
+        for i, (value, error) in sends.items():
+            try:
+                pending[i] = all_steps[i].throw(error) if error is not None else all_steps[i].send(value)
+            except StopIteration as done:
+                results[i] = done.value
+            except Exception as e:
+                results[i] = e
+        needed = list(dict.fromkeys(c for call in pending.values() for c in (call if isinstance(call, list) else [call]) if c not in memo))
+        failure = None
+        if needed:
+            try:
+                memo.update(zip(needed, (yield needed)))
+            except Exception as e:
+                failure = e
+        sends = {}
+        for i, call in pending.items():
+            calls = call if isinstance(call, list) else [call]
+            if any(c not in memo for c in calls):
+                sends[i] = (None, failure)
+            else:
+                answers = [memo[c] for c in calls]
+                sends[i] = (answers if isinstance(call, list) else answers[0], None)
+    return results
+
+def memoized_steps(steps: AssessmentSteps, memo: Dict[EnsemblCall, Any]) -> AssessmentSteps:
+    """Runs steps, answering calls from memo where it can (see gather_steps); failures are raised."""
+    result = (yield from gather_steps([steps], memo))[0]
+    if isinstance(result, Exception):
+        raise result
     return result
 
+# --- Splice Position Classification ---
+# A validated splice-altering variant is classified by the intronic offset of its c.
+# position: c.123+N lies N bases into the intron after an exon (donor side), c.124-N
+# N bases before the next exon (acceptor side). SPLICE_DISTANCE_BINS gives, per side,
+# the largest distance of each bin; classifying a position is a lookup by distance.
+# c.-N (5' UTR) and c.*N (3' UTR) without an offset are exonic positions, while
+# c.-N+M and c.*N-M are intronic like any other offset. Batches classify the
+# positions of all their variants in one pass per side when they are planned, and
+# their assessments look the class up instead.
+
+CDNA_POSITION_RE = re.compile(r'(?:^|[:\s])c\.(?:\(?([-*]?)(\d+)(?:([+-])(\d+))?(?:_\(?([-*]?)(\d+)(?:([+-])(\d+))?)?)?', re.IGNORECASE)
+
+class CdnaPosition:
+    """A position of a c. variant, e.g. c.-15+3: utr "-", base 15, offset +3."""
+    __slots__ = ("utr", "base", "offset")
+
+    def __init__(self, utr: str = "", base: Optional[int] = None, offset: int = 0):
+        self.utr = utr
+        self.base = base
+        self.offset = offset
+
+    @property
+    def intronic(self) -> bool:
+        return self.offset != 0
+
+    @property
+    def side(self) -> Optional[str]:
+        """The splice site side of an intronic position: donor for +N, acceptor for -N (None when exonic)."""
+        return "donor" if self.offset > 0 else "acceptor" if self.offset < 0 else None
+
+@lru_cache(maxsize=65536)
+def parse_cdna_position(variant_hgvs: str) -> Optional[CdnaPosition]:
+    """
+    The c. position of an HGVS string (with or without a transcript or gene prefix)
+    that decides its splice class: for a range, its first intronic end (c.654_659+2del
+    is +2). None without a c. part; unparsed positions (c.?) have no base.
+    """
+    match = CDNA_POSITION_RE.search(variant_hgvs.strip())
+    if not match:
+        return None
+    groups = match.groups()
+    ends = [CdnaPosition(utr or "", int(base), int(offset) * (-1 if sign == '-' else 1) if offset else 0)
+            for utr, base, sign, offset in (groups[:4], groups[4:]) if base]
+    return next((end for end in ends if end.intronic), ends[0] if ends else CdnaPosition())
+
+SPLICE_DISTANCE_BINS: Dict[str, Tuple[Tuple[Optional[int], str, str], ...]] = {
+    # side: (largest distance, classification, reason) per bin; the last bin is unbounded
+    "donor": (
+        (5, "Not Eligible", "Variant is a validated splice-altering variant located too close to the canonical splice site (<=+5bp)."),
+        (50, "Unlikely Eligible", "Variant is a validated splice-altering variant located near the canonical splice site (+6-+50bp)."),
+        (None, "Likely Eligible", "Variant is a validated splice-altering variant in a favorable deep-intronic position (>+50bp)."),
+    ),
+    "acceptor": (
+        (5, "Not Eligible", "Variant is a validated splice-altering variant located too close to the canonical splice site (>=-5bp)."),
+        (100, "Unlikely Eligible", "Variant is a validated splice-altering variant located near the canonical splice site (-6-(-100b)p)."),
+        (None, "Likely Eligible", "Variant is a validated splice-altering variant in a favorable deep-intronic position (<-100bp)."),
+    ),
+}
+_SPLICE_BIN_EDGES = {side: np.array([b[0] for b in bins[:-1]]) for side, bins in SPLICE_DISTANCE_BINS.items()}
+# Bin index by distance up to one past the last edge; farther positions use the last entry
+_SPLICE_BIN_BY_DISTANCE = {side: tuple(np.searchsorted(edges, np.arange(int(edges[-1]) + 2)).tolist())
+                           for side, edges in _SPLICE_BIN_EDGES.items()}
+
+def splice_position_class(position: CdnaPosition) -> Tuple[str, str]:
+    """(classification, reason) of an intronic position from SPLICE_DISTANCE_BINS."""
+    by_distance = _SPLICE_BIN_BY_DISTANCE[position.side]
+    _, classification, reason = SPLICE_DISTANCE_BINS[position.side][by_distance[min(abs(position.offset), len(by_distance) - 1)]]
+    return classification, reason
+
+# (classification, reason) per bin, indexed by the bin numbers np.searchsorted returns
+# (the leading None keeps numpy from turning the tuples into a 2-D array of strings)
+_SPLICE_BIN_CLASSES = {side: np.array([None] + [b[1:] for b in bins], dtype=object)[1:] for side, bins in SPLICE_DISTANCE_BINS.items()}
+
+def classify_splice_positions(positions: List[Optional[CdnaPosition]]) -> List[Optional[Tuple[str, str]]]:
+    """
+    splice_position_class over many positions at once (e.g. a whole batch); None
+    for positions that are missing or exonic.
+    """
+    offsets = np.array([p.offset if p is not None else 0 for p in positions], dtype=np.int64)
+    classes = np.full(len(positions), None, dtype=object)
+    for side, mask in (("donor", offsets > 0), ("acceptor", offsets < 0)):
+        classes[mask] = _SPLICE_BIN_CLASSES[side][np.searchsorted(_SPLICE_BIN_EDGES[side], np.abs(offsets[mask]))]
+    return classes.tolist()
+
+# Classes of the c. notations of the batch being assessed, from classify_splice_positions
+_splice_classes: contextvars.ContextVar[Optional[Dict[str, Tuple[str, str]]]] = contextvars.ContextVar("splice_classes", default=None)
+
+@contextmanager
+def splice_classes(classes: Dict[str, Tuple[str, str]]):
+    """Lets the assessments in the enclosed block use classes precomputed for their notations."""
+    token = _splice_classes.set(classes)
+    try:
+        yield
+    finally:
+        _splice_classes.reset(token)
+
+# --- Helper & Parsing Functions ---
+
+def _evaluate_splice_variant_position(variant_hgvs: str, vep_data: Dict[str, Any], details: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Assesses a validated splice-altering variant based on its genomic position.
+    This logic is shared by database-found variants and user-validated variants.
+    """
+    position = parse_cdna_position(variant_hgvs)
+    if position is None:
+        return None
+
+    result = {"details": details}
+    consequence_terms = set(vep_data.get('transcript_consequences', [{}])[0].get('consequence_terms', []))
+    
+    is_intronic_by_consequence = 'intron_variant' in consequence_terms or 'splice_acceptor_variant' in consequence_terms or 'splice_donor_variant' in consequence_terms
+
+    if position.intronic or is_intronic_by_consequence:
+        if not position.intronic:
+            # Intronic by consequence, but the notation gives no distance to the exon
+            return None
+        classification, reason = (_splice_classes.get() or {}).get(variant_hgvs) or splice_position_class(position)
+        result.update({"classification": classification, "reason": reason})
+        
+    elif any(c in consequence_terms for c in ['missense_variant', 'synonymous_variant']):
+        if 'splice_region_variant' in consequence_terms:
+            result.update({"classification": "Not Eligible", "reason": "This validated exonic splice-altering variant is within the canonical splice region, making it high-risk."})
+        else:
+            result.update({"classification": "Likely Eligible", "reason": "This validated exonic splice-altering variant is outside the immediate splice region, making it a potential candidate for correction."})
+    
+    else:
+        # Fallback if it's splice-altering but not in a recognized position
+        result.update({"classification": "Unlikely Eligible", "reason": "Variant is a validated splice-altering variant, but also presumed to cause other effects (e.g. it is a nonsense variant)."})
+
+    return result
+
 def parse_hgvs_query(query: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Parses a query string into a VEP-compatible HGVS string and an optional gene symbol.
@@ -1248,6 +3053,7 @@ def check_n1c_registry(gene_symbol: str, original_query: str, formatted_hgvs: st
     """
     Searches the pre-loaded N1C registry DataFrame for a matching variant.
     """
+    n1c_variants_df = current_reference().frame('n1c_variants')
     # Check if the DataFrame was loaded successfully
     if n1c_variants_df is None or n1c_variants_df.empty or not gene_symbol:
         return None
@@ -1259,7 +3065,9 @@ def check_n1c_registry(gene_symbol: str, original_query: str, formatted_hgvs: st
     core_hgvs = core_hgvs_match.group(1)
 
     # Filter the DataFrame for the correct gene (case-insensitive)
-    gene_matches = n1c_variants_df[n1c_variants_df['Gene'].str.upper() == gene_symbol.upper()]
+    gene_matches = rows_matching(n1c_variants_df, 'n1c_variants_gene', gene_symbol.upper())
+    if gene_matches is None:
+        gene_matches = n1c_variants_df[n1c_variants_df['Gene'].str.upper() == gene_symbol.upper()]
     if gene_matches.empty:
         return None
         
@@ -1311,6 +3119,7 @@ def _get_c_notation_from_row(row: pd.Series) -> Optional[str]:
 
 def check_n1c_assessed_variants(gene_symbol: str, formatted_hgvs: str) -> Optional[Dict[str, Any]]:
     """Checks the N1C assessed variants dataset for a curated match and returns a curated assessment."""
+    n1c_assessed_df = current_reference().frame('n1c_assessed')
     if n1c_assessed_df is None or n1c_assessed_df.empty or not gene_symbol or not formatted_hgvs:
         return None
 
@@ -1319,7 +3128,9 @@ def check_n1c_assessed_variants(gene_symbol: str, formatted_hgvs: str) -> Option
         return None
     core_hgvs = core_hgvs_match.group(1)
 
-    gene_matches = n1c_assessed_df[n1c_assessed_df['Gene'].str.upper() == gene_symbol.upper()] if 'Gene' in n1c_assessed_df.columns else n1c_assessed_df
+    gene_matches = rows_matching(n1c_assessed_df, 'n1c_assessed_gene', gene_symbol.upper())
+    if gene_matches is None:
+        gene_matches = n1c_assessed_df[n1c_assessed_df['Gene'].str.upper() == gene_symbol.upper()] if 'Gene' in n1c_assessed_df.columns else n1c_assessed_df
     if gene_matches.empty:
         return None
 
@@ -1426,12 +3237,15 @@ def n1c_exon_skipping_exon_numbers_for_gene(gene_symbol: str) -> Tuple[set, List
     Returns (set_of_exon_numbers, list_of_links) for N1C registry rows that indicate exon skipping
     for the given gene. Best-effort extraction across free-text columns.
     """
+    n1c_variants_df = current_reference().frame('n1c_variants')
     exon_set: set = set()
     links: List[str] = []
     if n1c_variants_df is None or n1c_variants_df.empty or not gene_symbol:
         return exon_set, links
     try:
-        gene_matches = n1c_variants_df[n1c_variants_df.get('Gene', '').str.upper() == gene_symbol.upper()]
+        gene_matches = rows_matching(n1c_variants_df, 'n1c_variants_gene', gene_symbol.upper())
+        if gene_matches is None:
+            gene_matches = n1c_variants_df[n1c_variants_df.get('Gene', '').str.upper() == gene_symbol.upper()]
     except Exception:
         # Fallback: if 'Gene' missing due to schema drift
         gene_matches = n1c_variants_df
@@ -1472,6 +3286,8 @@ def get_gene_characteristics(gene_symbol: str) -> Dict[str, Any]:
     Retrieves MOI, Haploinsufficiency, and MOA from loaded dataframes,
     including source URLs for better explainability.
     """
+    reference = current_reference()
+    clingen_df, goflof_df = reference.frame('clingen'), reference.frame('goflof')
     characteristics = {
         "moi": [],
         "haploinsufficiency": {"text": "Unknown", "url": None},
@@ -1567,6 +3383,10 @@ def assess_wt_upregulation(client: EnsemblClient, gene_id: str, gene_symbol: str
     searching for a conventional antisense gene name ([GENE]-AS1).
     Trusts the '-AS1' naming convention without a strict biotype check.
     """
+    return run_sync(wt_upregulation_steps(gene_id, gene_symbol), client)
+
+def wt_upregulation_steps(gene_id: str, gene_symbol: str) -> AssessmentSteps:
+    """Assessment steps behind assess_wt_upregulation (see run_sync/run_async)."""
     if not gene_id or not gene_symbol:
         return {"classification": "Unable to Assess", "reason": "Missing Gene ID or Symbol."}
 
@@ -1575,8 +3395,11 @@ def assess_wt_upregulation(client: EnsemblClient, gene_id: str, gene_symbol: str
     # Collect curated gene-level features from N1C supplementary table
     supp_details: Dict[str, str] = {}
     try:
-        if 'n1c_supp_df' in globals() and n1c_supp_df is not None and 'Gene' in n1c_supp_df.columns:
-            matches = n1c_supp_df[n1c_supp_df['Gene'].astype(str).str.strip() == str(gene_symbol).strip()]
+        n1c_supp_df = current_reference().frame('n1c_supp')
+        if n1c_supp_df is not None and 'Gene' in n1c_supp_df.columns:
+            matches = rows_matching(n1c_supp_df, 'n1c_supp_gene', str(gene_symbol).strip())
+            if matches is None:
+                matches = n1c_supp_df[n1c_supp_df['Gene'].astype(str).str.strip() == str(gene_symbol).strip()]
             def _norm(val: Any) -> str:
                 v = str(val).strip().upper()
                 if v in ("Y", "YES"): return "Available"
@@ -1602,16 +3425,16 @@ def assess_wt_upregulation(client: EnsemblClient, gene_id: str, gene_symbol: str
         supp_details["Poison exon (PE)"] = "Unknown"
 
     try:
+        # Both searches are independent, so they are requested together
+        antisense_symbol = f"{gene_symbol}-AS1"
+        overlapping_genes, as_gene = yield [("get_overlapping_genes", (gene_id,)), ("lookup_symbol", (antisense_symbol,))]
+
         # --- Method 1: Search by genomic coordinate overlap ---
-        overlapping_genes = client.get_overlapping_genes(gene_id)
         for gene in overlapping_genes:
             if gene.get('biotype') == 'antisense' and gene.get('id') != gene_id:
                 found_antisense_genes[gene['id']] = gene
 
         # --- Method 2: Search by conventional name ([GENE_SYMBOL]-AS1) ---
-        antisense_symbol = f"{gene_symbol}-AS1"
-        as_gene = client.lookup_symbol(antisense_symbol)
-        
         if as_gene:
             found_antisense_genes[as_gene['id']] = as_gene
 
@@ -1672,11 +3495,15 @@ def assess_wt_upregulation(client: EnsemblClient, gene_id: str, gene_symbol: str
             "checks": {}
         }
 
-def assess_splice_switching(variant_hgvs: str, vep_data: Dict[str, Any], gene_symbol: str) -> Optional[Dict[str, Any]]:
+def assess_splice_switching(variant_hgvs: str, vep_data: Dict[str, Any], gene_symbol: str, variant_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
     Assesses a variant for splice-switching potential, adding method and DOI link.
     If not found in the DB, it returns a prompt for user validation.
+    variant_key is the SSCVDB Variant ID when the query already was one (VCF input);
+    otherwise it is rebuilt from the VEP entry.
     """
+    reference = current_reference()
+    splicevar_df, sscvdb_df = reference.frame('splicevar'), reference.frame('sscvdb')
     if splicevar_df is None or not variant_hgvs or not gene_symbol:
         return None 
 
@@ -1686,13 +3513,15 @@ def assess_splice_switching(variant_hgvs: str, vep_data: Dict[str, Any], gene_sy
     if not core_hgvs_match: return None
     core_canonical_hgvs = core_hgvs_match.group(1).lower()
 
-    gene_rows = splicevar_df[splicevar_df['gene'].str.strip().str.contains(clean_gene, case=False, na=False)]
+    gene_rows = rows_matching(splicevar_df, 'splicevar_gene', clean_gene, contains=True)
+    if gene_rows is None:
+        gene_rows = splicevar_df[splicevar_df['gene'].str.strip().str.contains(clean_gene, case=False, na=False)]
     if gene_rows.empty:
         # Not found in SpliceVarDB for this gene � check SSCVDB fallback
         if sscvdb_df is not None and not sscvdb_df.empty and vep_data:
-            variant_key = _format_sscvdb_variant_id_from_vep(vep_data)
+            variant_key = variant_key or _format_sscvdb_variant_id_from_vep(vep_data)
             if variant_key and 'Variant ID' in sscvdb_df.columns:
-                if not sscvdb_df[sscvdb_df['Variant ID'].str.strip().str.lower() == variant_key.strip().lower()].empty:
+                if _sscvdb_has_variant(variant_key):
                     details = {
                         "Source Database": "SSCVDB",
                         "Evidence": "Splice-altering reported in SSCVDB",
@@ -1729,9 +3558,9 @@ def assess_splice_switching(variant_hgvs: str, vep_data: Dict[str, Any], gene_sy
 
     # --- If no exact HGVS match was found in SpliceVarDB, try SSCVDB before prompting ---
     if sscvdb_df is not None and not sscvdb_df.empty and vep_data:
-        variant_key = _format_sscvdb_variant_id_from_vep(vep_data)
+        variant_key = variant_key or _format_sscvdb_variant_id_from_vep(vep_data)
         if variant_key and 'Variant ID' in sscvdb_df.columns:
-            if not sscvdb_df[sscvdb_df['Variant ID'].str.strip().str.lower() == variant_key.strip().lower()].empty:
+            if _sscvdb_has_variant(variant_key):
                 details = {
                     "Source Database": "SSCVDB",
                     "Evidence": "Splice-altering reported in SSCVDB",
@@ -1747,11 +3576,14 @@ def assess_splice_switching(variant_hgvs: str, vep_data: Dict[str, Any], gene_sy
     }
 
 def assess_single_exon(client, original_query, transcript, all_exons, target_exon, vep_entry: Dict[str, Any], refseq_id_for_viewer: Optional[str] = None):
+    return run_sync(single_exon_steps(original_query, transcript, all_exons, target_exon, vep_entry, refseq_id_for_viewer), client)
+
+def single_exon_steps(original_query, transcript, all_exons, target_exon, vep_entry: Dict[str, Any], refseq_id_for_viewer: Optional[str] = None) -> AssessmentSteps:
+    """Assessment steps behind assess_single_exon (see run_sync/run_async)."""
     # --- Step 1: Data Gathering and Calculations ---
     gene_id = transcript.get('Parent') 
     transcript_id = transcript.get('id')
     protein_id = transcript.get("Translation", {}).get("id")
-    cds_seq = client.get_cds_sequence(transcript_id)
     
     coding_exons = [e for e in all_exons if e['cds_length'] > 0]
     total_coding_exons = len(coding_exons)
@@ -1761,7 +3593,12 @@ def assess_single_exon(client, original_query, transcript, all_exons, target_exo
         return {"classification": "Unable to Assess", "reason": f"The variant maps to exon {target_exon['total_exon_number']}, which is non-coding."}
     
     chrom, start, end = target_exon['seq_region_name'], target_exon['start'], target_exon['end']
-    variants_in_region = client.overlap_region_variation(chrom, start, end)
+    calls = [("get_cds_sequence", (transcript_id,)), ("overlap_region_variation", (chrom, start, end))]
+    if protein_id:
+        calls.append(("get_domains", (protein_id,)))
+    fetched = yield calls
+    cds_seq, variants_in_region = fetched[0], fetched[1]
+    domains = fetched[2] if protein_id else []
     
     clinvar_url = f"https://www.ncbi.nlm.nih.gov/clinvar/?term=GRCh38%3A{chrom}%3A{start}-{end}"
 
@@ -1785,22 +3622,22 @@ def assess_single_exon(client, original_query, transcript, all_exons, target_exo
     cond1_inframe = (exon_cds_len % 3 == 0)
     cond2_no_stop = False
     if cds_seq:
-        try:
-            cds_map, current_pos = {}, 0
-            sorted_coding_exons = sorted(coding_exons, key=lambda x: x['coding_exon_number'])
-            for exon in sorted_coding_exons:
-                cds_map[exon['coding_exon_number']] = cds_seq[current_pos : current_pos + exon['cds_length']]
-                current_pos += exon['cds_length']
-            skipped_cds = "".join(cds_map[i] for i in sorted(cds_map.keys()) if i != coding_exon_number)
-            if skipped_cds:
-                prot = str(Seq(skipped_cds).translate(to_stop=False))
-                cond2_no_stop = "*" not in prot[:-1]
-        except Exception: cond2_no_stop = False
+        with stage("translation"):
+            try:
+                cds_map, current_pos = {}, 0
+                sorted_coding_exons = sorted(coding_exons, key=lambda x: x['coding_exon_number'])
+                for exon in sorted_coding_exons:
+                    cds_map[exon['coding_exon_number']] = cds_seq[current_pos : current_pos + exon['cds_length']]
+                    current_pos += exon['cds_length']
+                skipped_cds = "".join(cds_map[i] for i in sorted(cds_map.keys()) if i != coding_exon_number)
+                if skipped_cds:
+                    prot = str(Seq(skipped_cds).translate(to_stop=False))
+                    cond2_no_stop = "*" not in prot[:-1]
+            except Exception: cond2_no_stop = False
 
     cond3_not_terminal = (coding_exon_number is not None and coding_exon_number not in (1, total_coding_exons))
     cond4_small = (exon_cds_len / total_cds_len) < 0.1 if total_cds_len > 0 else False
     
-    domains = client.get_domains(protein_id) if protein_id else []
     overlapping_domain_names = []
     if domains:
         cds_pos_start = sum(e['cds_length'] for e in sorted(coding_exons, key=lambda x: x['coding_exon_number']) if e['coding_exon_number'] < coding_exon_number)
@@ -1841,62 +3678,6 @@ def assess_single_exon(client, original_query, transcript, all_exons, target_exo
     else:
         classification, reason = "Likely Eligible", "Exon meets the primary criteria for a skippable exon."
 
-    # --- Step 4: Visualization Data Generation ---
-    visualization_data = None
-    try:
-        v_chrom, v_start, v_end = vep_entry.get('seq_region_name'), vep_entry.get('start'), vep_entry.get('end')
-        if not all([v_chrom, v_start, v_end]): 
-            raise ValueError("Missing variant coordinates for visualization.")
-        domain_features = []
-        if protein_id and domains:
-            cds_map = []
-            cumulative_cds_len = 0
-            is_reverse_strand = transcript.get('strand') == -1
-            for exon in sorted(coding_exons, key=lambda x: x['coding_exon_number']):
-                cds_len_of_exon = exon['cds_length']
-                cds_map.append({
-                    'chr': exon['seq_region_name'], 
-                    'genomic_start': exon['start'], 
-                    'genomic_end': exon['end'], 
-                    'transcript_cds_start': cumulative_cds_len + 1, 
-                    'transcript_cds_end': cumulative_cds_len + cds_len_of_exon
-                })
-                cumulative_cds_len += cds_len_of_exon
-            
-            for domain in domains:
-                domain_cds_start, domain_cds_end = (domain['start'] - 1) * 3 + 1, domain['end'] * 3
-                for exon_map_entry in cds_map:
-                    overlap_start = max(domain_cds_start, exon_map_entry['transcript_cds_start'])
-                    overlap_end = min(domain_cds_end, exon_map_entry['transcript_cds_end'])
-                    
-                    if overlap_start <= overlap_end:
-                        offset_start = overlap_start - exon_map_entry['transcript_cds_start']
-                        offset_end = overlap_end - exon_map_entry['transcript_cds_start']
-                        
-                        if not is_reverse_strand:
-                            feat_start = exon_map_entry['genomic_start'] + offset_start
-                            feat_end = exon_map_entry['genomic_start'] + offset_end
-                        else: # On reverse strand, offsets are from the end
-                            feat_start = exon_map_entry['genomic_end'] - offset_end
-                            feat_end = exon_map_entry['genomic_end'] - offset_start
-                            
-                        domain_features.append({
-                            "chr": exon_map_entry['chr'], 
-                            "start": feat_start - 1, 
-                            "end": feat_end, 
-                            "name": domain.get('description', domain.get('id', 'Domain'))
-                        })
-
-        padding = 1000
-        visualization_data = {
-            "locus": f"{v_chrom}:{max(1, v_start - padding)}-{v_end + padding}",
-            "variantTrack": {"name": "Variant", "features": [{"chr": v_chrom, "start": v_start - 1, "end": v_end, "name": vep_entry.get('id', 'Variant')}]},
-            "domainTrack": {"name": "Protein Domains", "features": domain_features} if domain_features else None
-        }
-    except Exception as e:
-        import traceback; traceback.print_exc()
-        visualization_data = None
-        
     # --- FINAL RETURN STATEMENT ---
     return {
         "classification": classification,
@@ -1916,30 +3697,691 @@ def assess_single_exon(client, original_query, transcript, all_exons, target_exo
             "No Pathogenic Splice Variants": cond7_splice, "No Pathogenic In-Frame Deletions": cond8_no_inframe_del,
             "No Domain Overlap": cond5_no_domain, "Low Missense Count": cond6_missense,
             "Is <10% of Protein": cond4_small
-        },
-        "visualization": visualization_data
+        }
+    }
+
+# --- Multi-Transcript Exon Skipping ---
+# With all_transcripts, the exon containing the variant is also assessed in every
+# other protein-coding transcript of the chosen gene in the VEP response. Their
+# models and CDS are fetched in bulk and all assessments share one memo of Ensembl
+# calls, so variation and domain lookups common to several transcripts are made once.
+
+def find_target_exon(all_exons: List[Dict[str, Any]], vep_entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The exon (from extract_exons_from_transcript) overlapping the VEP variant, if any."""
+    v_start, v_end = vep_entry['start'], vep_entry['end']
+    return next((ex for ex in all_exons if ex['seq_region_name'] == vep_entry['seq_region_name'] and max(v_start, ex['start']) <= min(v_end, ex['end'])), None)
+
+def coding_transcript_consequences(all_consequences: List[Dict[str, Any]], target_consequence: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The chosen consequence followed by the other protein-coding transcripts of its gene (one each)."""
+    gene_id, chosen = target_consequence.get('gene_id'), target_consequence['transcript_id']
+    others = {}
+    for c in all_consequences:
+        transcript_id = c.get('transcript_id')
+        if transcript_id and transcript_id != chosen and c.get('gene_id') == gene_id and c.get('biotype') == 'protein_coding':
+            others.setdefault(transcript_id, c)
+    return [target_consequence, *others.values()]
+
+def prefetch_transcripts_steps(transcript_ids: List[str], memo: Dict[EnsemblCall, Any]) -> AssessmentSteps:
+    """Seeds memo with the models and CDS of transcript_ids from two bulk requests."""
+    ids = tuple(transcript_ids)
+    try:
+        models, sequences = yield [("lookup_ids_expand", (ids,)), ("get_cds_sequences", (ids,))]
+    except Exception:
+        # Each transcript is then looked up on its own when it is assessed
+        return
+    for transcript_id in ids:
+        if transcript_id in models:
+            memo[("lookup_id_expand", (transcript_id,))] = models[transcript_id]
+        if transcript_id in sequences:
+            memo[("get_cds_sequence", (transcript_id,))] = sequences[transcript_id]
+
+COMPARISON_FIELDS = ("classification", "reason", "total_exon_number", "coding_exon_number", "frac_cds", "domain_names", "checks")
+
+def _comparison_row(consequence: Dict[str, Any], result: Any, primary: bool) -> Dict[str, Any]:
+    if isinstance(result, Exception):
+        result = {"classification": "Unable to Assess", "reason": f"Ensembl data for this transcript could not be retrieved: {result}"}
+    row = {"transcript_id": consequence['transcript_id'], "primary": primary,
+           "mane_select": consequence.get('mane_select'), "canonical": bool(consequence.get('canonical'))}
+    row.update({field: result.get(field) for field in COMPARISON_FIELDS})
+    return row
+
+def transcript_comparison_steps(query: str, vep_entry: Dict[str, Any], consequences: List[Dict[str, Any]],
+                                primary_result: Dict[str, Any], memo: Dict[EnsemblCall, Any]) -> AssessmentSteps:
+    """
+    Exon skipping comparison table: one row per consequence (from
+    coding_transcript_consequences), the first being the primary assessment.
+    """
+    others = consequences[1:]
+    lookups = [("lookup_id_expand", (c['transcript_id'],)) for c in others]
+    missing = [call for call in lookups if call not in memo]
+    if missing:
+        try:
+            memo.update(zip(missing, (yield missing)))
+        except Exception:
+            pass
+    results: List[Any] = [None] * len(others)
+    assessed, steps = [], []
+    for i, lookup in enumerate(lookups):
+        transcript = memo.get(lookup)
+        if not transcript:
+            results[i] = {"classification": "Unable to Assess", "reason": "The transcript model could not be retrieved from Ensembl."}
+            continue
+        all_exons = extract_exons_from_transcript(transcript)
+        target_exon = find_target_exon(all_exons, vep_entry)
+        if not target_exon:
+            results[i] = {"classification": "Not Applicable", "reason": "The variant is not in an exon of this transcript."}
+            continue
+        assessed.append(i)
+        steps.append(single_exon_steps(query, transcript, all_exons, target_exon, vep_entry))
+    for i, result in zip(assessed, (yield from gather_steps(steps, memo))):
+        results[i] = result
+    return [_comparison_row(consequences[0], primary_result, True),
+            *(_comparison_row(c, result, False) for c, result in zip(others, results))]
+
+# --- Result Cache ---
+# Whole assessment results keyed by the normalized HGVS, the user inputs, the
+# version of every reference dataset and the Ensembl release, so a data refresh
+# or a new Ensembl release never serves a stale result. Values are stored as
+# compressed JSON: the memory bound is exact and every hit is a private copy.
+
+# The memory tier is split by traffic class: batch rows ("batch") and everything
+# else ("interactive") each get their own byte budget (AVEC_CACHE_BATCH_SHARE of it
+# for batches), so a large one-off batch can only evict batch entries. Within a
+# budget, W-TinyLFU admission keeps frequently used entries over recently inserted
+# ones. Hit rates per class are reported in /healthz and /metrics.
+
+CACHE_BATCH_SHARE = float(os.environ.get('AVEC_CACHE_BATCH_SHARE', '0.25'))
+TRAFFIC_CLASSES = ("interactive", "batch")
+_traffic_class: contextvars.ContextVar[str] = contextvars.ContextVar("traffic_class", default="interactive")
+
+@contextmanager
+def traffic_class(name: str):
+    """Attributes the cache traffic of the enclosed block to traffic class name."""
+    token = _traffic_class.set(name)
+    try:
+        yield
+    finally:
+        _traffic_class.reset(token)
+
+class FrequencySketch:
+    """
+    Count-min sketch of recent access frequencies: four rows of 8-bit counters.
+    All counters are halved every 10 x width accesses, so past popularity fades.
+    """
+    def __init__(self, width: int):
+        self.width = 1 << max(10, min(20, (width - 1).bit_length()))
+        self.table = np.zeros((4, self.width), dtype=np.uint8)
+        self.sample_size = 10 * self.width
+        self.additions = 0
+        self._rows = np.arange(4)
+        self._lock = threading.Lock()
+
+    def _columns(self, key: str) -> np.ndarray:
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        return np.frombuffer(digest, dtype=np.uint32) & (self.width - 1)
+
+    def increment(self, key: str):
+        columns = self._columns(key)
+        with self._lock:
+            counts = self.table[self._rows, columns]
+            low = counts.min()
+            if low < 255:
+                # Conservative update: only the counters at the minimum are raised
+                self.table[self._rows, columns] = np.where(counts == low, low + 1, counts)
+            self.additions += 1
+            if self.additions >= self.sample_size:
+                self.table >>= 1
+                self.additions //= 2
+
+    def estimate(self, key: str) -> int:
+        return int(self.table[self._rows, self._columns(key)].min())
+
+class TinyLFUCache:
+    """
+    Thread-safe byte-bounded W-TinyLFU map of str -> bytes. New entries go to a small
+    LRU window (1%). What falls out of the window enters the main area's probation
+    segment only if the frequency sketch rates it above every entry it would evict.
+    A probation hit promotes the entry to the protected segment (80% of the main area).
+    """
+    def __init__(self, max_bytes: int, sketch: FrequencySketch):
+        self.max_bytes = max_bytes
+        self.window_max = max(1, max_bytes // 100)
+        self.main_max = max_bytes - self.window_max
+        self.protected_max = self.main_max * 8 // 10
+        self.sketch = sketch
+        self._segments: Dict[str, "OrderedDict[str, bytes]"] = {"window": OrderedDict(), "probation": OrderedDict(), "protected": OrderedDict()}
+        self._bytes = {name: 0 for name in self._segments}
+        self.admitted = self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _find(self, key: str) -> Tuple[Optional[str], Optional[bytes]]:
+        for name, segment in self._segments.items():
+            value = segment.get(key)
+            if value is not None:
+                return name, value
+        return None, None
+
+    def _add(self, name: str, key: str, value: bytes):
+        self._segments[name][key] = value
+        self._bytes[name] += len(value)
+
+    def _pop(self, name: str, key: Optional[str] = None) -> Tuple[str, bytes]:
+        segment = self._segments[name]
+        key, value = (key, segment.pop(key)) if key is not None else segment.popitem(last=False)
+        self._bytes[name] -= len(value)
+        return key, value
+
+    def get(self, key: str) -> Optional[bytes]:
+        self.sketch.increment(key)
+        with self._lock:
+            name, value = self._find(key)
+            if name == "probation":
+                self._pop(name, key)
+                self._add("protected", key, value)
+                while self._bytes["protected"] > self.protected_max:
+                    self._add("probation", *self._pop("protected"))
+            elif name is not None:
+                self._segments[name].move_to_end(key)
+            return value
+
+    def peek(self, key: str) -> Optional[bytes]:
+        """The value without counting an access or changing its recency."""
+        with self._lock:
+            return self._find(key)[1]
+
+    def put(self, key: str, value: bytes):
+        if len(value) > self.main_max:
+            return
+        with self._lock:
+            name, _ = self._find(key)
+            if name is not None:
+                self._pop(name, key)
+            self._add("window", key, value)
+            while self._bytes["window"] > self.window_max:
+                self._admit(*self._pop("window"))
+
+    def _admit(self, key: str, value: bytes):
+        free = self.main_max - self._bytes["probation"] - self._bytes["protected"]
+        frequency = self.sketch.estimate(key)
+        victims = []
+        for name in ("probation", "protected"):
+            for victim, victim_value in self._segments[name].items():
+                if free >= len(value):
+                    break
+                if self.sketch.estimate(victim) >= frequency:
+                    self.rejected += 1
+                    return
+                victims.append((name, victim))
+                free += len(victim_value)
+        if free < len(value):
+            self.rejected += 1
+            return
+        for name, victim in victims:
+            self._pop(name, victim)
+        self._add("probation", key, value)
+        self.admitted += 1
+
+    def size_bytes(self) -> int:
+        return sum(self._bytes.values())
+
+    def __len__(self):
+        return sum(len(segment) for segment in self._segments.values())
+
+class TrafficCache:
+    """
+    One TinyLFUCache per traffic class, sharing a frequency sketch. Each class
+    inserts into and evicts from its own partition only; an interactive hit on an
+    entry in the batch partition copies it into the interactive one.
+    """
+    def __init__(self, name: str, max_bytes: int, batch_share: float = CACHE_BATCH_SHARE):
+        self.name = name
+        # About one sketch column per kilobyte of budget (entries are compressed JSON)
+        sketch = FrequencySketch(max(1, max_bytes // 1024))
+        batch_bytes = int(max_bytes * min(max(batch_share, 0.0), 1.0))
+        self.partitions = {"interactive": TinyLFUCache(max_bytes - batch_bytes, sketch),
+                           "batch": TinyLFUCache(batch_bytes, sketch)}
+        self.hits = {traffic: 0 for traffic in TRAFFIC_CLASSES}
+        self.misses = {traffic: 0 for traffic in TRAFFIC_CLASSES}
+
+    def get(self, key: str) -> Optional[bytes]:
+        traffic = _traffic_class.get()
+        value = self.partitions[traffic].get(key)
+        if value is None:
+            other = "batch" if traffic == "interactive" else "interactive"
+            value = self.partitions[other].peek(key)
+            if value is not None and traffic == "interactive":
+                self.partitions[traffic].put(key, value)
+        if value is None:
+            self.misses[traffic] += 1
+        else:
+            self.hits[traffic] += 1
+        METRICS.inc("avec_cache_requests_total", {"cache": self.name, "traffic": traffic, "result": "hit" if value is not None else "miss"})
+        return value
+
+    def put(self, key: str, value: bytes):
+        self.partitions[_traffic_class.get()].put(key, value)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for traffic, partition in self.partitions.items():
+            lookups = self.hits[traffic] + self.misses[traffic]
+            out[traffic] = {"hits": self.hits[traffic], "misses": self.misses[traffic],
+                            "hit_rate": round(self.hits[traffic] / lookups, 4) if lookups else None,
+                            "entries": len(partition), "bytes": partition.size_bytes(), "max_bytes": partition.max_bytes,
+                            "admitted": partition.admitted, "rejected": partition.rejected}
+        return out
+
+    def __len__(self):
+        return sum(len(partition) for partition in self.partitions.values())
+
+class DiskCache:
+    """SQLite-backed str -> bytes store shared by all workers on a host; evicts least recently used rows."""
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, accessed REAL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with self._connect() as db:
+                row = db.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+                return row[0] if row else None
+        except sqlite3.Error:
+            return None
+
+    def put(self, key: str, value: bytes):
+        try:
+            with self._connect() as db:
+                db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, value, time.time()))
+                count = db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+                if count > self.max_entries:
+                    db.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                               (count - self.max_entries,))
+        except sqlite3.Error:
+            pass
+
+class ResultCache:
+    """
+    Memory tier (TrafficCache) in front of an optional disk tier. Coroutines use
+    get_async / put_async, which run the SQLite calls in a worker thread.
+    """
+    def __init__(self, max_bytes: int, disk: Optional[DiskCache] = None, name: str = "result"):
+        self.memory = TrafficCache(name, max_bytes)
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        blob = self.memory.get(key)
+        if blob is None and self.disk is not None:
+            blob = self.disk.get(key)
+            if blob is not None:
+                self.memory.put(key, blob)
+        return json.loads(zlib.decompress(blob)) if blob is not None else None
+
+    async def get_async(self, key: str) -> Optional[Dict[str, Any]]:
+        blob = self.memory.get(key)
+        if blob is None and self.disk is not None:
+            blob = await asyncio.to_thread(self.disk.get, key)
+            if blob is not None:
+                self.memory.put(key, blob)
+        return json.loads(zlib.decompress(blob)) if blob is not None else None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        blob = zlib.compress(json.dumps(result).encode('utf-8'))
+        self.memory.put(key, blob)
+        if self.disk is not None:
+            self.disk.put(key, blob)
+
+    async def put_async(self, key: str, result: Dict[str, Any]):
+        blob = zlib.compress(json.dumps(result).encode('utf-8'))
+        self.memory.put(key, blob)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, blob)
+
+def _build_result_cache() -> ResultCache:
+    disk_path = os.environ.get('AVEC_RESULT_CACHE_DB')
+    disk = DiskCache(disk_path, int(os.environ.get('AVEC_RESULT_CACHE_DISK_ENTRIES', '100000'))) if disk_path else None
+    return ResultCache(int(float(os.environ.get('AVEC_RESULT_CACHE_MB', '64')) * 1024 * 1024), disk)
+
+RESULT_CACHE = _build_result_cache()
+
+# --- Ensembl Response Cache ---
+# Gene-level Ensembl answers (transcript models, CDS, domains, exon variation,
+# overlapping genes and symbol lookups) change only with the Ensembl release, so
+# they are kept in a memory cache of AVEC_ENSEMBL_CACHE_MB (0 disables it) keyed by
+# release and request. VEP answers are per variant and are left to the result cache.
+# Not-found answers (None) are cached too: most "<GENE>-AS1" lookups are misses.
+
+CACHED_ENDPOINTS = {"/lookup/id", "/sequence/id", "/overlap/translation", "/overlap/region/human", "/overlap/id",
+                    "/lookup/symbol/human"}
+
+def _build_response_cache() -> Optional[ResultCache]:
+    max_bytes = int(float(os.environ.get('AVEC_ENSEMBL_CACHE_MB', '64')) * 1024 * 1024)
+    return ResultCache(max_bytes, name="ensembl") if max_bytes > 0 else None
+
+ENSEMBL_RESPONSE_CACHE = _build_response_cache()
+
+def _response_cache_key(path: str, key: Tuple) -> Optional[str]:
+    if ENSEMBL_RESPONSE_CACHE is None or _endpoint_name(path) not in CACHED_ENDPOINTS:
+        return None
+    return json.dumps([_ensembl_release["value"], key])
+
+def cached_response(path: str, key: Tuple) -> Tuple[bool, Any]:
+    """(found, value) for an Ensembl GET from the response cache; the value is a private copy."""
+    cache_key = _response_cache_key(path, key)
+    if cache_key is None:
+        return False, None
+    entry = ENSEMBL_RESPONSE_CACHE.get(cache_key)
+    METRICS.inc("avec_ensembl_cache_total", {"endpoint": _endpoint_name(path), "result": "hit" if entry else "miss"})
+    return (True, entry["value"]) if entry else (False, None)
+
+def cache_response(path: str, key: Tuple, value: Any):
+    cache_key = _response_cache_key(path, key)
+    if cache_key is not None:
+        ENSEMBL_RESPONSE_CACHE.put(cache_key, {"value": value})
+
+# --- Genome Viewer ---
+# The IGV payload (locus, variant and protein domain tracks) is served separately by
+# /api/v1/visualization/<transcript>/<variant> and fetched by the web UI only when
+# the viewer is opened; assessments just carry its URL. The domain -> genomic
+# feature mapping depends only on the transcript and is cached per transcript and
+# Ensembl release (AVEC_VISUALIZATION_CACHE_MB, 0 disables it).
+
+VIEWER_PADDING = 1000
+VIEWER_REGION_RE = re.compile(r'^(?:chr)?([0-9]{1,2}|X|Y|MT?):(\d+)-(\d+)$', re.IGNORECASE)
+TRANSCRIPT_ID_RE = re.compile(r'^ENST\d+(\.\d+)?$', re.IGNORECASE)
+
+def _build_visualization_cache() -> Optional[ResultCache]:
+    max_bytes = int(float(os.environ.get('AVEC_VISUALIZATION_CACHE_MB', '8')) * 1024 * 1024)
+    return ResultCache(max_bytes, name="visualization") if max_bytes > 0 else None
+
+VISUALIZATION_CACHE = _build_visualization_cache()
+
+def visualization_path(transcript_id: Optional[str], vep_entry: Dict[str, Any]) -> Optional[str]:
+    """URL of the viewer payload for a variant (GRCh38 VEP coordinates) on a transcript."""
+    chrom, start, end = vep_entry.get('seq_region_name'), vep_entry.get('start'), vep_entry.get('end')
+    if not (transcript_id and chrom and start and end):
+        return None
+    path = f"/api/v1/visualization/{transcript_id}/{chrom}:{start}-{end}"
+    name = vep_entry.get('id')
+    return f"{path}?name={quote(str(name), safe='')}" if name else path
+
+def parse_viewer_region(variant: str) -> Optional[Tuple[str, int, int]]:
+    """
+    (chrom, start, end) from "chrom:start-end" or a variant ID (chrom-pos-ref-alt);
+    raises LiftoverError for a GRCh37 variant ID that does not map to GRCh38.
+    """
+    match = VIEWER_REGION_RE.match(variant.strip())
+    if match:
+        chrom, start, end = match.group(1).upper(), int(match.group(2)), int(match.group(3))
+        return (chrom, start, end) if 0 < start <= end else None
+    coordinate = parse_variant_id(variant)
+    if coordinate:
+        chrom, pos, ref, _ = coordinate
+        return chrom, pos, pos + max(len(ref), 1) - 1
+    return None
+
+def domain_track_features(transcript: Dict[str, Any], domains: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Protein domains mapped through the coding exons of transcript to genomic features (0-based starts)."""
+    coding_exons = sorted((e for e in extract_exons_from_transcript(transcript) if e['cds_length'] > 0),
+                          key=lambda x: x['coding_exon_number'])
+    cds_map = []
+    cumulative_cds_len = 0
+    for exon in coding_exons:
+        cds_map.append({
+            'chr': exon['seq_region_name'],
+            'genomic_start': exon['start'],
+            'genomic_end': exon['end'],
+            'transcript_cds_start': cumulative_cds_len + 1,
+            'transcript_cds_end': cumulative_cds_len + exon['cds_length']
+        })
+        cumulative_cds_len += exon['cds_length']
+
+    is_reverse_strand = transcript.get('strand') == -1
+    features = []
+    for domain in domains:
+        domain_cds_start, domain_cds_end = (domain['start'] - 1) * 3 + 1, domain['end'] * 3
+        for exon_map_entry in cds_map:
+            overlap_start = max(domain_cds_start, exon_map_entry['transcript_cds_start'])
+            overlap_end = min(domain_cds_end, exon_map_entry['transcript_cds_end'])
+            if overlap_start <= overlap_end:
+                offset_start = overlap_start - exon_map_entry['transcript_cds_start']
+                offset_end = overlap_end - exon_map_entry['transcript_cds_start']
+                if not is_reverse_strand:
+                    feat_start = exon_map_entry['genomic_start'] + offset_start
+                    feat_end = exon_map_entry['genomic_start'] + offset_end
+                else: # On reverse strand, offsets are from the end
+                    feat_start = exon_map_entry['genomic_end'] - offset_end
+                    feat_end = exon_map_entry['genomic_end'] - offset_start
+                features.append({
+                    "chr": exon_map_entry['chr'],
+                    "start": feat_start - 1,
+                    "end": feat_end,
+                    "name": domain.get('description', domain.get('id', 'Domain'))
+                })
+    return features
+
+def visualization_steps(transcript_id: str, region: Tuple[str, int, int], name: Optional[str] = None) -> AssessmentSteps:
+    """Steps building the IGV payload for a variant region on a transcript (None if the transcript is unknown)."""
+    cache_key = json.dumps([_ensembl_release["value"], transcript_id])
+    cached = VISUALIZATION_CACHE.get(cache_key) if VISUALIZATION_CACHE is not None else None
+    if cached is None:
+        transcript = yield ("lookup_id_expand", (transcript_id,))
+        if not transcript:
+            return None
+        protein_id = transcript.get("Translation", {}).get("id")
+        domains = (yield ("get_domains", (protein_id,))) if protein_id else []
+        with stage("visualization"):
+            cached = {"features": domain_track_features(transcript, domains or [])}
+        if VISUALIZATION_CACHE is not None:
+            VISUALIZATION_CACHE.put(cache_key, cached)
+    chrom, start, end = region
+    return {
+        "locus": f"{chrom}:{max(1, start - VIEWER_PADDING)}-{end + VIEWER_PADDING}",
+        "variantTrack": {"name": "Variant", "features": [{"chr": chrom, "start": start - 1, "end": end, "name": name or f"{chrom}:{start}-{end}"}]},
+        "domainTrack": {"name": "Protein Domains", "features": cached["features"]} if cached["features"] else None
     }
 
-def process_single_variant(query: str, client: EnsemblClient, splice_user_input: Optional[str] = None, moa_user_input: Optional[str] = None) -> Dict[str, Any]:
+def normalize_hgvs(query: str) -> Optional[str]:
+    """
+    Canonical form of a query for cache keys: the parsed HGVS without whitespace,
+    with transcript accessions upper-cased and the coordinate type ("c.") lower-cased.
+    Gene symbols and alleles are left as typed since the assessment treats them verbatim.
+    Genomic variant IDs are written as chr<chrom>-<pos>-<ref>-<alt> (GRCh37:chr... for GRCh37 inputs).
+    """
+    parts = _variant_id_parts(query)
+    if parts:
+        assembly, *coordinate = parts
+        return ("GRCh37:" if assembly == "GRCh37" else "") + format_variant_id(*coordinate)
+    hgvs_query, _ = parse_hgvs_query(query)
+    if not hgvs_query:
+        return None
+    identifier, _, variant = re.sub(r'\s+', '', hgvs_query).partition(':')
+    if re.match(r'(N[MR]_|X[MR]_|ENST)', identifier, re.IGNORECASE):
+        identifier = identifier.upper()
+    return f"{identifier}:{variant[:2].lower()}{variant[2:]}"
+
+ENSEMBL_RELEASE_TTL = 6 * 3600
+_ensembl_release: Dict[str, Any] = {"value": None, "expires": 0.0}
+
+def _remember_release(data: Any) -> str:
+    releases = data.get('releases') if isinstance(data, dict) else None
+    value = str(releases[0]) if releases else "unknown"
+    # Retry an unknown release sooner than a known one
+    _ensembl_release.update({"value": value, "expires": time.time() + (ENSEMBL_RELEASE_TTL if releases else 300)})
+    return value
+
+def ensembl_release(client: EnsemblClient) -> str:
+    """Current Ensembl release number as a string (cached for ENSEMBL_RELEASE_TTL)."""
+    if _ensembl_release["value"] and time.time() < _ensembl_release["expires"]:
+        return _ensembl_release["value"]
+    try:
+        return _remember_release(client.get_release())
+    except Exception:
+        return _remember_release(None)
+
+async def ensembl_release_async(client: "AsyncEnsemblClient") -> str:
+    if _ensembl_release["value"] and time.time() < _ensembl_release["expires"]:
+        return _ensembl_release["value"]
+    try:
+        return _remember_release(await client.get_release())
+    except Exception:
+        return _remember_release(None)
+
+# Part of every result cache key: bump it when the shape or the logic of assessment
+# results changes, so the persistent disk tier does not serve stale results.
+# 2: "visualization_url" replaced the inline "visualization" payload.
+RESULT_SCHEMA_VERSION = 2
+
+def result_cache_key(query: str, splice_user_input: Optional[str], moa_user_input: Optional[str],
+                     snapshot: ReferenceSnapshot, release: str, all_transcripts: bool = False) -> Optional[str]:
+    normalized = normalize_hgvs(query)
+    if not normalized:
+        return None
+    parts = [RESULT_SCHEMA_VERSION, normalized, splice_user_input or "", moa_user_input or "", release,
+             sorted(snapshot.versions.items())]
+    if all_transcripts:
+        # Only appended when set, so existing cache entries stay valid
+        parts.append("all_transcripts")
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+def _cacheable(result: Dict[str, Any]) -> bool:
+    # Errors and failed lookups may be transient (e.g. Ensembl unavailable)
+    return bool(result.get("assessments"))
+
+def _cache_status(key: Optional[str], result: Dict[str, Any], snapshot: ReferenceSnapshot) -> str:
+    """Stamps the data versions on a fresh result; "MISS" if it is to be cached, else "BYPASS"."""
+    result["data_versions"] = dict(snapshot.versions)
+    unavailable = _ensembl_unavailable.get()
+    if unavailable and result.get("assessments"):
+        # Checks that swallowed the failure are incomplete: say so and do not cache
+        result.setdefault("warnings", []).append(
+            f"Ensembl was unavailable ({', '.join(sorted(unavailable))}); some checks may be incomplete.")
+        return "BYPASS"
+    return "MISS" if key and _cacheable(result) else "BYPASS"
+
+def _store_result(key: Optional[str], result: Dict[str, Any], snapshot: ReferenceSnapshot) -> str:
+    status = _cache_status(key, result, snapshot)
+    if status == "MISS":
+        RESULT_CACHE.put(key, result)
+    return status
+
+def _with_timings(result: Dict[str, Any], status: str, timings: Dict[str, float], started: float) -> Dict[str, Any]:
+    """Adds the (uncached) per-request timings block and records the assessment metrics."""
+    elapsed = time.perf_counter() - started
+    METRICS.inc("avec_result_cache_total", {"result": status})
+    METRICS.observe("avec_assessment_seconds", elapsed, {"cache": status})
+    result["timings"] = {"total_ms": round(elapsed * 1000, 3), "stages_ms": timings}
+    return result
+
+def process_single_variant(query: str, client: EnsemblClient, splice_user_input: Optional[str] = None, moa_user_input: Optional[str] = None,
+                           all_transcripts: bool = False) -> Dict[str, Any]:
+    """
+    Assesses a single variant query against one consistent reference data snapshot
+    and reports the dataset versions that were used.
+    """
+    return process_single_variant_cached(query, client, splice_user_input, moa_user_input, all_transcripts)[0]
+
+def process_single_variant_cached(query: str, client: EnsemblClient, splice_user_input: Optional[str] = None, moa_user_input: Optional[str] = None,
+                                  all_transcripts: bool = False) -> Tuple[Dict[str, Any], str]:
+    """
+    process_single_variant, also returning the result cache status: "HIT", "MISS" or "BYPASS".
+    The result carries a per-request "timings" block (never cached).
+    """
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    timings_token = _stage_timings.set(timings)
+    unavailable_token = _ensembl_unavailable.set(set())
+    try:
+        snapshot = REFERENCE.snapshot()
+        key = result_cache_key(query, splice_user_input, moa_user_input, snapshot, ensembl_release(client), all_transcripts)
+        with stage("result_cache"):
+            result = RESULT_CACHE.get(key) if key else None
+        status = "HIT"
+        if result is None:
+            token = _bound_reference.set(snapshot)
+            try:
+                result = run_sync(assess_variant_steps(query, splice_user_input, moa_user_input, all_transcripts), client)
+            finally:
+                _bound_reference.reset(token)
+            status = _store_result(key, result, snapshot)
+    finally:
+        _stage_timings.reset(timings_token)
+        _ensembl_unavailable.reset(unavailable_token)
+    return _with_timings(result, status, timings, started), status
+
+async def process_single_variant_async(query: str, client: "AsyncEnsemblClient", splice_user_input: Optional[str] = None, moa_user_input: Optional[str] = None,
+                                       all_transcripts: bool = False) -> Tuple[Dict[str, Any], str]:
+    """Async counterpart of process_single_variant_cached; runs the same assessment steps."""
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    timings_token = _stage_timings.set(timings)
+    unavailable_token = _ensembl_unavailable.set(set())
+    try:
+        snapshot = REFERENCE.snapshot()
+        key = result_cache_key(query, splice_user_input, moa_user_input, snapshot, await ensembl_release_async(client), all_transcripts)
+        with stage("result_cache"):
+            result = await RESULT_CACHE.get_async(key) if key else None
+        status = "HIT"
+        if result is None:
+            token = _bound_reference.set(snapshot)
+            try:
+                result = await run_async(assess_variant_steps(query, splice_user_input, moa_user_input, all_transcripts), client)
+            finally:
+                _bound_reference.reset(token)
+            status = _cache_status(key, result, snapshot)
+            if status == "MISS":
+                await RESULT_CACHE.put_async(key, result)
+    finally:
+        _stage_timings.reset(timings_token)
+        _ensembl_unavailable.reset(unavailable_token)
+    return _with_timings(result, status, timings, started), status
+
+# Consequences that trigger the exon skipping assessment
+EXONIC_TERMS = {'missense_variant', 'stop_gained', 'frameshift_variant', 'synonymous_variant', 'inframe_deletion', 'inframe_insertion','splice_donor_variant', 'splice_acceptor_variant'}
+
+def assess_variant_steps(query: str, splice_user_input: Optional[str] = None, moa_user_input: Optional[str] = None,
+                         all_transcripts: bool = False) -> AssessmentSteps:
     """
     Contains the complete assessment logic for a single variant query.
     This version is more robust and handles potential unpacking errors.
+    With all_transcripts, exonic variants also get a "transcript_comparison" table
+    of the exon skipping assessment in each protein-coding transcript of the gene.
     """
     try:
         # --- 1. VEP and Consequence Selection ---
-        parsed_output = parse_hgvs_query(query)
+        with stage("parse"):
+            try:
+                coordinate = parse_variant_id(query)
+            except LiftoverError as e:
+                return {"classification": "Unable to Assess", "reason": str(e)}
+            parsed_output = (None, None) if coordinate else parse_hgvs_query(query)
         if not isinstance(parsed_output, tuple) or len(parsed_output) != 2:
             return {"classification": "Error", "reason": f"Could not parse the input query: '{query}'. Please check the format."}
             
         hgvs_query, gene_symbol_from_query = parsed_output
-        if not hgvs_query:
-            return {"classification": "Error", "reason": "Invalid input format. Please use a recognized HGVS format (e.g., 'GENE c.123A>G')."}
-
-        vep_data = client.vep_hgvs(hgvs_query)
+        if coordinate:
+            # Genomic IDs (VCF input) go to VEP by region; no round trip through HGVS
+            vep_data = yield ("vep_region", coordinate)
+        elif not hgvs_query:
+            return {"classification": "Error", "reason": "Invalid input format. Please use a recognized HGVS format (e.g., 'GENE c.123A>G') or a GRCh38 variant ID (e.g., 'chr1-12345-A-G')."}
+        else:
+            vep_data = yield ("vep_hgvs", (hgvs_query,))
         if not vep_data or not isinstance(vep_data, list):
-            return {"classification": "Unable to Assess", "reason": f"VEP analysis failed for '{hgvs_query}'. The variant may be invalid or not found."}
+            return {"classification": "Unable to Assess", "reason": f"VEP analysis failed for '{hgvs_query or query}'. The variant may be invalid or not found."}
         
         vep_entry = vep_data[0]
+        genome_ref = reference_mismatch(coordinate, vep_entry) if coordinate else None
+        if genome_ref:
+            reason = f"The REF allele of {format_variant_id(*coordinate)} does not match the GRCh38 reference ({genome_ref})."
+            if _variant_id_parts(query)[0] == "GRCh37":
+                reason += " GRCh38 differs from GRCh37 at this position, so the lifted variant cannot be assessed."
+            return {"classification": "Unable to Assess", "reason": reason}
         all_consequences = vep_entry.get('transcript_consequences', [])
         target_consequence = choose_best_consequence(all_consequences, gene_symbol_from_query=gene_symbol_from_query)
         
@@ -1950,8 +4392,12 @@ def process_single_variant(query: str, client: EnsemblClient, splice_user_input:
             return {"classification": "Unable to Assess", "reason": reason}
 
         gene_symbol = target_consequence['gene_symbol']
+        record_gene_query(gene_symbol)
         definitive_transcript_id = target_consequence['transcript_id']
         gene_id = target_consequence.get('gene_id')
+        if coordinate:
+            # The registry and SpliceVarDB checks match on c. notation: use VEP's for the chosen transcript
+            hgvs_query = target_consequence.get('hgvsc') or query
 
         # --- 2. Get RefSeq ID (for viewer) ---
         refseq_id_for_viewer = None
@@ -1967,20 +4413,28 @@ def process_single_variant(query: str, client: EnsemblClient, splice_user_input:
                     break
 
         # --- 3. Initialize Result & Gene Characteristics ---
-        gene_characteristics = get_gene_characteristics(gene_symbol)
+        with stage("gene_characteristics"):
+            gene_characteristics = get_gene_characteristics(gene_symbol)
         final_result = {
             "summary": {"gene": gene_symbol, "transcript_id": definitive_transcript_id, **gene_characteristics},
             "assessments": {}
         }
+        if coordinate:
+            final_result["summary"]["coordinates"] = variant_coordinates(query, coordinate)
+        warnings = dataset_warnings()
+        if warnings:
+            final_result["warnings"] = warnings
         
         # --- 4. N1C Assessed Variants (curated) Check (Exit early if matched) ---
-        assessed_match = check_n1c_assessed_variants(gene_symbol, hgvs_query)
+        with stage("n1c_checks"):
+            assessed_match = check_n1c_assessed_variants(gene_symbol, hgvs_query)
         if assessed_match:
             final_result["assessments"]["N1C_Assessed_Variants"] = assessed_match
             return final_result
 
         # --- 4b. N1C Registry Check (Exit early if matched) ---
-        n1c_result = check_n1c_registry(gene_symbol, query, hgvs_query)
+        with stage("n1c_checks"):
+            n1c_result = check_n1c_registry(gene_symbol, query, hgvs_query)
         if n1c_result:
             final_result["assessments"]["N1C_Registry_Check"] = n1c_result
             return final_result
@@ -2000,28 +4454,29 @@ def process_single_variant(query: str, client: EnsemblClient, splice_user_input:
                 # Show WT Upregulation only when LoF and Autosomal Dominant MOI
                 is_lof_ad = any("Autosomal Dominant" in m for m in moi)
                 if is_lof_ad:
-                    final_result["assessments"]["WT_Upregulation"] = assess_wt_upregulation(client, gene_id, gene_symbol)
+                    final_result["assessments"]["WT_Upregulation"] = yield from wt_upregulation_steps(gene_id, gene_symbol)
 
         # --- 6. Variant-Specific Strategies (Splice & Exon Skipping) ---
         
         # Define variant type
         consequence_terms = set(target_consequence.get('consequence_terms', []))
-        exonic_terms = {'missense_variant', 'stop_gained', 'frameshift_variant', 'synonymous_variant', 'inframe_deletion', 'inframe_insertion','splice_donor_variant', 'splice_acceptor_variant'}
         splice_terms = {'splice_region_variant', }
-        is_exonic = any(term in consequence_terms for term in exonic_terms)
+        is_exonic = any(term in consequence_terms for term in EXONIC_TERMS)
         is_splice_region = any(term in consequence_terms for term in splice_terms)
         
         # Run Splice Switching Assessment
-        variant_identifier_from_vep = vep_entry.get('input')
+        variant_identifier_from_vep = hgvs_query if coordinate else vep_entry.get('input')
         if variant_identifier_from_vep:
             splice_assessment = None
-            if splice_user_input == 'yes':
-                details = {"Confirmation Method": "User-provided validation (qPCR/RNA-seq)"}
-                splice_assessment = _evaluate_splice_variant_position(variant_identifier_from_vep, vep_entry, details)
-            elif splice_user_input == 'no':
-                splice_assessment = {"classification": "Not Eligible", "reason": "User confirmed no known splice-altering effect."}
-            else:
-                splice_assessment = assess_splice_switching(variant_identifier_from_vep, vep_entry, gene_symbol)
+            with stage("splice_switching"):
+                if splice_user_input == 'yes':
+                    details = {"Confirmation Method": "User-provided validation (qPCR/RNA-seq)"}
+                    splice_assessment = _evaluate_splice_variant_position(variant_identifier_from_vep, vep_entry, details)
+                elif splice_user_input == 'no':
+                    splice_assessment = {"classification": "Not Eligible", "reason": "User confirmed no known splice-altering effect."}
+                else:
+                    splice_assessment = assess_splice_switching(variant_identifier_from_vep, vep_entry, gene_symbol,
+                                                                variant_key=format_variant_id(*coordinate) if coordinate else None)
             
             if splice_assessment:
                 final_result["assessments"]["Splice_Switching"] = splice_assessment
@@ -2029,19 +4484,26 @@ def process_single_variant(query: str, client: EnsemblClient, splice_user_input:
         # Run Exon Skipping Assessment *if* variant is exonic/splice
         if is_exonic:
             exon_skip_assessment_added = False
-            transcript_data = client.lookup_id_expand(definitive_transcript_id)
+            # Ensembl answers shared by the exon skipping assessments of this variant
+            memo: Dict[EnsemblCall, Any] = {}
+            if all_transcripts:
+                comparison_consequences = coding_transcript_consequences(all_consequences, target_consequence)
+                yield from prefetch_transcripts_steps([c['transcript_id'] for c in comparison_consequences], memo)
+            transcript_data = memo.get(("lookup_id_expand", (definitive_transcript_id,)))
+            if transcript_data is None:
+                transcript_data = yield ("lookup_id_expand", (definitive_transcript_id,))
             if transcript_data:
                 all_exons = extract_exons_from_transcript(transcript_data)
-                v_start, v_end = vep_entry['start'], vep_entry['end']
-                target_exon = next((ex for ex in all_exons if ex['seq_region_name'] == vep_entry['seq_region_name'] and max(v_start, ex['start']) <= min(v_end, ex['end'])), None)
+                target_exon = find_target_exon(all_exons, vep_entry)
                 
                 if target_exon:
-                    exon_skip_result = assess_single_exon(client, query, transcript_data, all_exons, target_exon, vep_entry, refseq_id_for_viewer)
-                    if "visualization" in exon_skip_result and exon_skip_result["visualization"]:
-                        final_result["visualization"] = exon_skip_result.pop("visualization")
+                    exon_skip_result = yield from memoized_steps(
+                        single_exon_steps(query, transcript_data, all_exons, target_exon, vep_entry, refseq_id_for_viewer), memo)
+                    final_result["visualization_url"] = visualization_path(transcript_data.get('id'), vep_entry)
                     # N1C registry exon-skipping support: if N1C lists exon skipping for this exon, mark eligible
                     try:
-                        n1c_exons, n1c_links = n1c_exon_skipping_exon_numbers_for_gene(gene_symbol)
+                        with stage("n1c_checks"):
+                            n1c_exons, n1c_links = n1c_exon_skipping_exon_numbers_for_gene(gene_symbol)
                     except Exception:
                         n1c_exons, n1c_links = set(), []
                     if target_exon.get('total_exon_number') in n1c_exons:
@@ -2065,6 +4527,9 @@ def process_single_variant(query: str, client: EnsemblClient, splice_user_input:
                     "classification": "Unable to Assess",
                     "reason": "Variant is exonic or in a splice region, but the target exon could not be determined (e.g., VEP/Ensembl data issue)."
                 }
+            if all_transcripts:
+                final_result["transcript_comparison"] = yield from transcript_comparison_steps(
+                    query, vep_entry, comparison_consequences, final_result["assessments"]["Exon_Skipping"], memo)
 
         # 7. Final Fallback
         # This will now only trigger for non-exonic, non-splice, non-gene-strategy variants.
@@ -2076,14 +4541,872 @@ def process_single_variant(query: str, client: EnsemblClient, splice_user_input:
         
         return final_result
 
+    except EnsemblUnavailable as e:
+        return {"classification": "Unable to Assess", "reason": f"{e} Please try again later.", "retry_after": round(e.retry_after)}
     except Exception as e:
         import traceback; traceback.print_exc()
         return {"classification": "Error", "reason": f"An unexpected server error occurred: {str(e)}"}
 
 # --- Main Flask Routes ---
+# --- Streaming Batch Input ---
+# Batch uploads are read lazily: chunked CSV/TSV via pandas, read-only openpyxl
+# iteration for xlsx, plain line iteration for txt and (optionally bgzipped)
+# VCF. Only the first column is used; VCF records become chr-pos-ref-alt IDs. Rows are assessed in windows of AVEC_BATCH_WINDOW rows (planning,
+# dedupe and the Ensembl memo are per window; repeats across windows are served
+# by the result cache).
+
+BATCH_WINDOW_ROWS = int(os.environ.get('AVEC_BATCH_WINDOW', '5000'))
+BATCH_CSV_CHUNK_ROWS = 10000
+# Streamed batches (/batch_assess?stream=ndjson): progress event spacing and where
+# the finished workbooks wait for download (shared by the workers on a host)
+BATCH_PROGRESS_INTERVAL = 1.0
+BATCH_OUTPUT_DIR = os.environ.get('AVEC_BATCH_OUTPUT_DIR', os.path.join(tempfile.gettempdir(), 'avec_batches'))
+BATCH_OUTPUT_TTL = 24 * 3600
+
+# Output columns of the batch workbook, in order (written before any row is known)
+ES_CHECK_NAMES = ["Benign splice variant found", "Is In-Frame", "No New Stop Codon", "Not First/Last Exon",
+                  "No Pathogenic Splice Variants", "No Pathogenic In-Frame Deletions", "No Domain Overlap",
+                  "Low Missense Count", "Is <10% of Protein"]
+BATCH_COLUMNS = [
+    "Variant", "Gene", "MOI", "MOA", "Ensembl Transcript", "Ensembl Transcript Link", "Haploinsufficiency",
+    "ClinGen Link", "ClinGen Curation Link", "Existing ASO (N1C)", "N1C Registry Link", "N1C Assessed (Curated) Link",
+    "Antisense Transcript ID", "Exon Skipping Assessment", *[f"ES Check: {name}" for name in ES_CHECK_NAMES],
+    "Ensembl Exon View Link", "Domains", "Splice Correction Assessment", "Splicing Validation DOI", "Splicing DB Link",
+    "WT-Upregulation", "Knockdown", "Knockdown (GoF)", "WT-Upregulation (LoF)", "MoA Dual Assessment Note",
+    "Manual Validations Needed", "Overall Eligibility", "Data Warnings", "Data Versions",
+]
+
+class BatchInputError(ValueError):
+    """The uploaded batch file could not be read."""
+
+# ##reference / ##contig header values of GRCh37 VCFs (hg19, b37, 1000 Genomes hs37d5 / human_g1k_v37)
+VCF_GRCH37_RE = re.compile(r'GRCh37|hg19|\bb37\b|hs37|g1k_v37', re.IGNORECASE)
+
+def iter_vcf_variants(stream) -> Iterator[str]:
+    """
+    Yields a chr-pos-ref-alt ID per ALT allele of each record of a VCF stream,
+    gunzipping it first when it is gzip/bgzip compressed. Records without an
+    ALT ('.') and spanning deletions ('*') are skipped; symbolic alleles are
+    passed through and reported as unparseable rows. IDs from VCFs whose
+    ##reference or ##contig header names GRCh37 are prefixed "GRCh37:".
+    """
+    magic = stream.read(2)
+    stream.seek(0)
+    raw = gzip.GzipFile(fileobj=stream) if magic == b'\x1f\x8b' else stream
+    prefix = ""
+    for line in io.TextIOWrapper(raw, encoding='utf-8', errors='replace'):
+        if line.startswith('##reference') or line.startswith('##contig'):
+            if VCF_GRCH37_RE.search(line):
+                prefix = "GRCh37:"
+            continue
+        if line.startswith('#') or not line.strip():
+            continue
+        fields = line.rstrip('\r\n').split('\t', 5)
+        if len(fields) < 5:
+            raise BatchInputError(f"Malformed VCF record: {line[:80]!r}")
+        chrom, pos, _, ref, alts = fields[:5]
+        chrom = re.sub(r'^chr', '', chrom, flags=re.IGNORECASE)
+        for alt in alts.split(','):
+            if alt not in ('.', '*'):
+                yield prefix + format_variant_id(chrom, pos, ref.upper(), alt.upper())
+
+def iter_batch_variants(file) -> Iterator[str]:
+    """Yields the non-empty first-column values of an uploaded batch file (.xlsx, .tsv, .txt, .vcf[.gz], else CSV)."""
+    name = (file.filename or '').lower()
+    try:
+        if name.endswith(('.vcf', '.vcf.gz', '.vcf.bgz')):
+            yield from iter_vcf_variants(file.stream)
+        elif name.endswith('.xlsx'):
+            workbook = load_workbook(file.stream, read_only=True, data_only=True)
+            try:
+                for (value,) in workbook.worksheets[0].iter_rows(min_col=1, max_col=1, values_only=True):
+                    if value is not None and str(value).strip():
+                        yield str(value).strip()
+            finally:
+                workbook.close()
+        elif name.endswith('.txt'):
+            for line in io.TextIOWrapper(file.stream, encoding='utf-8-sig', errors='replace'):
+                if line.strip():
+                    yield line.strip()
+        else:
+            sep = '\t' if name.endswith('.tsv') else ','
+            for chunk in pd.read_csv(file.stream, header=None, sep=sep, usecols=[0], dtype=str,
+                                     chunksize=BATCH_CSV_CHUNK_ROWS, encoding='utf-8-sig'):
+                for value in chunk[0].dropna():
+                    if value.strip():
+                        yield value.strip()
+    except pd.errors.EmptyDataError:
+        return
+    except Exception as e:
+        raise BatchInputError(str(e)) from e
+
+def batch_windows(variants: Iterator[str], size: int) -> Iterator[List[str]]:
+    while True:
+        window = list(islice(variants, size))
+        if not window:
+            return
+        yield window
+
+# --- Batch Planning ---
+# A batch is normalized and deduplicated, then VEP runs once per unique
+# variant so the variants can be grouped by gene and transcript. Transcript
+# evidence (exon structure, CDS, domains) is prefetched once per group, and
+# every Ensembl response is memoized for the rest of the batch, which also
+# covers the GoF/LoF re-runs. Results are fanned back out in the input order.
+# VEP results come from bulk requests up front (region requests for genomic
+# variant IDs, HGVS requests for the rest), seeded into the memo.
+
+class BatchClient:
+    """Memoizes Ensembl client calls for the lifetime of one batch and counts the calls saved."""
+    def __init__(self, client: EnsemblClient):
+        self.client = client
+        self._memo: Dict[Tuple[str, tuple], Any] = {}
+        # Counters are shared by the threads of a concurrent batch (the memo needs no lock:
+        # two threads missing the same key are coalesced by the single-flight group)
+        self._lock = threading.Lock()
+        self.requested = 0
+        self.fetched = 0
+
+    def __getattr__(self, name: str):
+        method = getattr(self.client, name)
+        if not callable(method):
+            return method
+        def call(*args):
+            key = (name, args)
+            with self._lock:
+                self.requested += 1
+                if key in self._memo:
+                    return self._memo[key]
+                self.fetched += 1
+            value = self._memo[key] = method(*args)
+            return value
+        return call
+
+    def prefetch_vep_regions(self, variants: List[Tuple[str, int, str, str]]):
+        """Answers later vep_region calls for these variants from bulk VEP requests."""
+        pending = [v for v in variants if ("vep_region", v) not in self._memo]
+        if not pending or self.client.mode != "live":
+            return
+        self.fetched += -(-len(pending) // VEP_BULK_SIZE)
+        for variant, vep_data in self.client.vep_region_bulk(pending).items():
+            self._memo[("vep_region", variant)] = vep_data
+
+    def prefetch_vep_hgvs(self, notations: List[str]):
+        """Answers later vep_hgvs calls for these HGVS notations from bulk VEP requests."""
+        pending = [n for n in dict.fromkeys(notations) if ("vep_hgvs", (n,)) not in self._memo]
+        if not pending or self.client.mode != "live":
+            return
+        self.fetched += -(-len(pending) // VEP_BULK_SIZE)
+        for notation, vep_data in self.client.vep_hgvs_bulk(pending).items():
+            self._memo[("vep_hgvs", (notation,))] = vep_data
+
+class BatchPlan:
+    """Unique variants of a batch, their groups and the order they are assessed in."""
+    def __init__(self, variants: List[str]):
+        self.row_keys: List[str] = []
+        self.queries: Dict[str, str] = {}
+        for variant in variants:
+            key = normalize_hgvs(variant) or variant.strip()
+            self.row_keys.append(key)
+            self.queries.setdefault(key, variant)
+        self.groups: Dict[Tuple[str, str], List[str]] = {}
+        self.order: List[str] = list(self.queries)
+        # Splice position class per c. notation the assessments will evaluate (intronic ones only)
+        self.splice_classes: Dict[str, Tuple[str, str]] = {}
+
+    @property
+    def duplicates(self) -> int:
+        return len(self.row_keys) - len(self.queries)
+
+def plan_batch(variants: List[str], client: BatchClient) -> BatchPlan:
+    """Dedupes the batch, runs VEP once per unique variant, groups by (gene, transcript) and prefetches per group."""
+    plan = BatchPlan(variants)
+    coordinates, notations = {}, []
+    for key, query in plan.queries.items():
+        try:
+            coordinate = parse_variant_id(query)
+        except LiftoverError:
+            # Reported by the assessment of the row
+            continue
+        if coordinate:
+            coordinates[key] = coordinate
+        else:
+            notations.append(parse_hgvs_query(query)[0])
+    try:
+        # Fall back to one VEP request per variant for whatever these do not answer
+        if coordinates:
+            client.prefetch_vep_regions(list(coordinates.values()))
+        if any(notations):
+            client.prefetch_vep_hgvs([n for n in notations if n])
+    except Exception:
+        pass
+    exonic: Dict[Tuple[str, str], bool] = {}
+    splice_notations = []
+    for key, query in plan.queries.items():
+        group = ("", "")
+        coordinate = coordinates.get(key)
+        hgvs_query, gene_symbol_from_query = (None, None) if coordinate else parse_hgvs_query(query)
+        if coordinate or hgvs_query:
+            try:
+                vep_data = client.vep_region(*coordinate) if coordinate else client.vep_hgvs(hgvs_query)
+            except Exception:
+                vep_data = None
+            if vep_data and isinstance(vep_data, list):
+                consequence = choose_best_consequence(vep_data[0].get('transcript_consequences', []), gene_symbol_from_query=gene_symbol_from_query)
+                if consequence:
+                    group = (consequence.get('gene_symbol') or "", consequence.get('transcript_id') or "")
+                    exonic[group] = exonic.get(group, False) or bool(EXONIC_TERMS & set(consequence.get('consequence_terms', [])))
+                    # The notation whose splice position assess_variant_steps evaluates
+                    splice_notations.append((consequence.get('hgvsc') or query) if coordinate else vep_data[0].get('input'))
+        plan.groups.setdefault(group, []).append(key)
+    plan.order = [key for members in plan.groups.values() for key in members]
+    splice_notations = [n for n in dict.fromkeys(splice_notations) if n]
+    classes = classify_splice_positions([parse_cdna_position(n) for n in splice_notations])
+    plan.splice_classes = {n: c for n, c in zip(splice_notations, classes) if c is not None}
+
+    for (gene, transcript_id), members in plan.groups.items():
+        if not transcript_id or not exonic.get((gene, transcript_id)):
+            continue
+        try:
+            transcript = client.lookup_id_expand(transcript_id)
+            if transcript:
+                client.get_cds_sequence(transcript_id)
+                protein_id = transcript.get("Translation", {}).get("id")
+                if protein_id:
+                    client.get_domains(protein_id)
+        except Exception:
+            # Prefetch is an optimization; the assessment fetches (and reports) whatever failed here
+            pass
+    return plan
+
+# --- Batch Result Store ---
+# Completed batches are kept in AVEC_RESULTS_DB (SQLite; set it empty to turn
+# this off): one row per input row, with a typed column for each strategy
+# classification and each exon skipping check (1/0, NULL when the check did not
+# run), so past batches can be filtered at /api/v1/results without re-running
+# anything. Rows are written window by window; a batch is listed once complete.
+
+RESULTS_DB_PATH = os.environ.get('AVEC_RESULTS_DB', os.path.join(DATA_DIR, 'batch_results.sqlite'))
+
+ES_CHECK_COLUMNS = {
+    "Benign splice variant found": "es_benign_splice_variant_found",
+    "Is In-Frame": "es_in_frame",
+    "No New Stop Codon": "es_no_new_stop_codon",
+    "Not First/Last Exon": "es_not_first_last_exon",
+    "No Pathogenic Splice Variants": "es_no_pathogenic_splice_variants",
+    "No Pathogenic In-Frame Deletions": "es_no_pathogenic_inframe_deletions",
+    "No Domain Overlap": "es_no_domain_overlap",
+    "Low Missense Count": "es_low_missense_count",
+    "Is <10% of Protein": "es_under_10pct_of_protein",
+}
+
+# (column, SQLite type, batch workbook column)
+RESULT_FIELDS = [
+    ("variant", "TEXT", "Variant"),
+    ("gene", "TEXT", "Gene"),
+    ("transcript_id", "TEXT", "Ensembl Transcript"),
+    ("moi", "TEXT", "MOI"),
+    ("moa", "TEXT", "MOA"),
+    ("haploinsufficiency", "TEXT", "Haploinsufficiency"),
+    ("existing_aso", "INTEGER", "Existing ASO (N1C)"),
+    ("exon_skipping", "TEXT", "Exon Skipping Assessment"),
+    *[(column, "INTEGER", f"ES Check: {name}") for name, column in ES_CHECK_COLUMNS.items()],
+    ("domains", "TEXT", "Domains"),
+    ("splice_switching", "TEXT", "Splice Correction Assessment"),
+    ("wt_upregulation", "TEXT", "WT-Upregulation"),
+    ("knockdown", "TEXT", "Knockdown"),
+    ("knockdown_gof", "TEXT", "Knockdown (GoF)"),
+    ("wt_upregulation_lof", "TEXT", "WT-Upregulation (LoF)"),
+    ("manual_validations", "TEXT", "Manual Validations Needed"),
+    ("overall", "TEXT", "Overall Eligibility"),
+    ("data_versions", "TEXT", "Data Versions"),
+]
+RESULT_COLUMN_TYPES = {column: kind for column, kind, _ in RESULT_FIELDS}
+# Filterable text columns (exact match, case-insensitive); every INTEGER column filters on 1/0
+RESULT_TEXT_FILTERS = ("variant", "gene", "transcript_id", "exon_skipping", "splice_switching",
+                       "wt_upregulation", "knockdown", "overall")
+RESULTS_PAGE_MAX = 1000
+
+def _result_value(value: Any, kind: str) -> Any:
+    if value is None or (isinstance(value, str) and value.strip() in ("", "N/A", "NA")):
+        return None
+    if kind == "INTEGER":
+        if isinstance(value, str):
+            return {"yes": 1, "no": 0, "true": 1, "false": 0, "1": 1, "0": 0}.get(value.strip().lower())
+        return int(bool(value))
+    return str(value)
+
+class SqliteStore:
+    """
+    Base of the SQLite stores shared by the workers. The file and its schema are
+    created on first use, and connections are per thread and per process: the app
+    is preloaded in the gunicorn master, and a connection must not cross a fork.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._schema_pid: Optional[int] = None
+
+    def _schema(self) -> List[str]:
+        """Statements creating the tables (idempotent)."""
+        return []
+
+    def _connect(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.row_factory = sqlite3.Row
+            if self._schema_pid != pid:
+                with db:
+                    for statement in self._schema():
+                        db.execute(statement)
+                self._schema_pid = pid
+            self._local.db, self._local.pid = db, pid
+        return self._local.db
+
+class BatchResultStore(SqliteStore):
+    """SQLite store of batch output rows, queried by /api/v1/results."""
+    def _schema(self) -> List[str]:
+        columns = ", ".join(f"{column} {kind}" for column, kind, _ in RESULT_FIELDS)
+        return ["PRAGMA journal_mode=WAL",
+                "CREATE TABLE IF NOT EXISTS batches (batch_id TEXT PRIMARY KEY, filename TEXT, created REAL, "
+                "completed REAL, status TEXT, rows INTEGER, unique_variants INTEGER)",
+                f"CREATE TABLE IF NOT EXISTS batch_results (batch_id TEXT, row INTEGER, {columns}, "
+                "PRIMARY KEY (batch_id, row)) WITHOUT ROWID"] + [
+                f"CREATE INDEX IF NOT EXISTS batch_results_{column} ON batch_results ({column} COLLATE NOCASE)"
+                for column in ("gene", "exon_skipping", "splice_switching", "overall")]
+
+    def start_batch(self, batch_id: str, filename: str):
+        with self._connect() as db:
+            db.execute("INSERT INTO batches (batch_id, filename, created, status) VALUES (?, ?, ?, 'running')",
+                       (batch_id, filename, time.time()))
+
+    def add_rows(self, batch_id: str, first_row: int, rows: List[Dict[str, Any]]):
+        placeholders = ", ".join("?" * (len(RESULT_FIELDS) + 2))
+        values = [(batch_id, first_row + i, *(_result_value(row.get(label), kind) for _, kind, label in RESULT_FIELDS))
+                  for i, row in enumerate(rows)]
+        with self._connect() as db:
+            db.executemany(f"INSERT OR REPLACE INTO batch_results VALUES ({placeholders})", values)
+
+    def finish_batch(self, batch_id: str, status: str, totals: Dict[str, int]):
+        with self._connect() as db:
+            db.execute("UPDATE batches SET completed = ?, status = ?, rows = ?, unique_variants = ? WHERE batch_id = ?",
+                       (time.time(), status, totals.get("Rows"), totals.get("Unique Variants"), batch_id))
+
+    def top_genes(self, limit: int) -> List[str]:
+        """Genes with the most rows over all stored batches."""
+        rows = self._connect().execute("SELECT gene, COUNT(*) AS n FROM batch_results WHERE gene IS NOT NULL "
+                                       "GROUP BY gene COLLATE NOCASE ORDER BY n DESC LIMIT ?", (limit,)).fetchall()
+        return [row[0] for row in rows]
+
+    def batches(self, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = self._connect().execute("SELECT * FROM batches ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def query(self, filters: Dict[str, Any], limit: int, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Rows of completed batches matching every filter (column -> value), newest batch first; also the total count."""
+        clauses, params = ["b.status = 'complete'"], []
+        for column, value in filters.items():
+            if column == "batch_id":
+                clauses.append("r.batch_id = ?")
+            elif RESULT_COLUMN_TYPES[column] == "INTEGER":
+                clauses.append(f"r.{column} = ?")
+            else:
+                clauses.append(f"r.{column} = ? COLLATE NOCASE")
+            params.append(value)
+        where = " AND ".join(clauses)
+        base = f"FROM batch_results r JOIN batches b ON b.batch_id = r.batch_id WHERE {where}"
+        db = self._connect()
+        total = db.execute(f"SELECT COUNT(*) {base}", params).fetchone()[0]
+        rows = db.execute(f"SELECT r.*, b.created AS batch_created {base} ORDER BY b.created DESC, r.row LIMIT ? OFFSET ?",
+                          params + [limit, offset]).fetchall()
+        results = []
+        for row in rows:
+            item = dict(row)
+            for column, kind in RESULT_COLUMN_TYPES.items():
+                if kind == "INTEGER" and item[column] is not None:
+                    item[column] = bool(item[column])
+            results.append(item)
+        return results, total
+
+RESULT_STORE = BatchResultStore(RESULTS_DB_PATH) if RESULTS_DB_PATH else None
+
+# --- API Keys and Quotas ---
+# API callers identify themselves with an X-API-Key header (or ?api_key=). Keys are
+# issued per tenant through /admin/api_keys and kept, hashed, in AVEC_API_KEYS_DB
+# (SQLite, shared by the workers; set it empty to turn keys and quotas off). Each
+# tenant has a daily quota of assessments (a batch item counts as one; 0 is
+# unlimited), counted per UTC day. Requests without a key share the "anonymous"
+# tenant and its AVEC_ANONYMOUS_DAILY_QUOTA, unless AVEC_API_KEY_REQUIRED=1.
+
+API_KEYS_DB_PATH = os.environ.get('AVEC_API_KEYS_DB', os.path.join(DATA_DIR, 'api_keys.sqlite'))
+API_KEY_REQUIRED = os.environ.get('AVEC_API_KEY_REQUIRED', '0') == '1'
+ANONYMOUS_TENANT = "anonymous"
+ANONYMOUS_DAILY_QUOTA = int(os.environ.get('AVEC_ANONYMOUS_DAILY_QUOTA', '0'))
+TENANT_NAME_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+
+class ApiAccessDenied(Exception):
+    """The API request is refused: an unknown key (401) or an exhausted quota (429)."""
+    def __init__(self, status: int, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"error": str(self)}
+        if self.retry_after is not None:
+            payload["retry_after"] = self.retry_after
+        return payload
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+
+def _hash_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+def _utc_day() -> str:
+    return time.strftime('%Y-%m-%d', time.gmtime())
+
+class ApiKeyStore(SqliteStore):
+    """SQLite store of tenants, their (hashed) API keys and daily usage."""
+    def _schema(self) -> List[str]:
+        return ["PRAGMA journal_mode=WAL",
+                "CREATE TABLE IF NOT EXISTS tenants (tenant TEXT PRIMARY KEY, daily_quota INTEGER, created REAL)",
+                "CREATE TABLE IF NOT EXISTS api_keys (key_hash TEXT PRIMARY KEY, tenant TEXT, created REAL, revoked REAL)",
+                "CREATE TABLE IF NOT EXISTS api_usage (tenant TEXT, day TEXT, requests INTEGER, units INTEGER, "
+                "rejected INTEGER, PRIMARY KEY (tenant, day)) WITHOUT ROWID"]
+
+    def issue_key(self, tenant: str, daily_quota: Optional[int] = None) -> str:
+        """A new key for tenant (created if needed; daily_quota updates its quota). Only the hash is stored."""
+        api_key = "avec_" + secrets.token_urlsafe(24)
+        with self._connect() as db:
+            db.execute("INSERT INTO tenants (tenant, daily_quota, created) VALUES (?, ?, ?) ON CONFLICT (tenant) DO NOTHING",
+                       (tenant, daily_quota or 0, time.time()))
+            if daily_quota is not None:
+                db.execute("UPDATE tenants SET daily_quota = ? WHERE tenant = ?", (daily_quota, tenant))
+            db.execute("INSERT INTO api_keys (key_hash, tenant, created) VALUES (?, ?, ?)", (_hash_key(api_key), tenant, time.time()))
+        return api_key
+
+    def revoke(self, tenant: str) -> int:
+        """Revokes every key of tenant; returns how many were active."""
+        with self._connect() as db:
+            return db.execute("UPDATE api_keys SET revoked = ? WHERE tenant = ? AND revoked IS NULL", (time.time(), tenant)).rowcount
+
+    def tenant(self, api_key: str) -> Optional[Tenant]:
+        if not os.path.exists(self.path):
+            # No key was ever issued; do not create the database to find out
+            return None
+        row = self._connect().execute(
+            "SELECT t.tenant, t.daily_quota FROM api_keys k JOIN tenants t ON t.tenant = k.tenant "
+            "WHERE k.key_hash = ? AND k.revoked IS NULL", (_hash_key(api_key),)).fetchone()
+        return Tenant(row["tenant"], row["daily_quota"] or 0) if row else None
+
+    def charge(self, tenant: Tenant, units: int) -> Optional[int]:
+        """Adds units to the tenant's usage today unless that exceeds its quota; the new usage, or None if refused."""
+        day = _utc_day()
+        db = self._connect()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT units FROM api_usage WHERE tenant = ? AND day = ?", (tenant.name, day)).fetchone()
+            used = row["units"] if row else 0
+            allowed = not tenant.daily_quota or used + units <= tenant.daily_quota
+            db.execute("INSERT INTO api_usage (tenant, day, requests, units, rejected) VALUES (?, ?, 1, ?, ?) "
+                       "ON CONFLICT (tenant, day) DO UPDATE SET requests = requests + 1, units = units + excluded.units, "
+                       "rejected = rejected + excluded.rejected",
+                       (tenant.name, day, units if allowed else 0, 0 if allowed else 1))
+        return used + units if allowed else None
+
+    def usage(self, tenant: Optional[str] = None, days: int = 7) -> List[Dict[str, Any]]:
+        """Daily usage rows, newest first, of one tenant or (tenant None) all of them."""
+        if not os.path.exists(self.path):
+            return []
+        cutoff = time.strftime('%Y-%m-%d', time.gmtime(time.time() - (days - 1) * 86400))
+        where, params = ("day >= ?", [cutoff]) if tenant is None else ("day >= ? AND tenant = ?", [cutoff, tenant])
+        rows = self._connect().execute(f"SELECT * FROM api_usage WHERE {where} ORDER BY day DESC, tenant", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def tenants(self) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT t.tenant, t.daily_quota, t.created, "
+            "(SELECT COUNT(*) FROM api_keys k WHERE k.tenant = t.tenant AND k.revoked IS NULL) AS active_keys, "
+            "COALESCE((SELECT units FROM api_usage u WHERE u.tenant = t.tenant AND u.day = ?), 0) AS units_today "
+            "FROM tenants t ORDER BY t.tenant", (_utc_day(),)).fetchall()
+        return [dict(row) for row in rows]
+
+API_KEYS = ApiKeyStore(API_KEYS_DB_PATH) if API_KEYS_DB_PATH else None
+
+def resolve_tenant(api_key: Optional[str]) -> Tenant:
+    """The tenant of an API request; raises ApiAccessDenied for unknown keys or a missing required key."""
+    if API_KEYS is None:
+        return Tenant(ANONYMOUS_TENANT)
+    if api_key:
+        tenant = API_KEYS.tenant(api_key)
+        if tenant is None:
+            raise ApiAccessDenied(401, "Unknown or revoked API key.")
+        return tenant
+    if API_KEY_REQUIRED:
+        raise ApiAccessDenied(401, "An API key is required (send it in the X-API-Key header).")
+    return Tenant(ANONYMOUS_TENANT, ANONYMOUS_DAILY_QUOTA)
+
+def charge_quota(units: int, tenant: Optional[Tenant] = None):
+    """Charges units to the (current) tenant's daily quota; raises ApiAccessDenied (429) when it would run out."""
+    tenant = tenant or _tenant.get()
+    if tenant is None or API_KEYS is None:
+        return
+    if tenant.name == ANONYMOUS_TENANT and not tenant.daily_quota:
+        # Unlimited anonymous use is only counted in the metrics
+        METRICS.inc("avec_tenant_units_total", {"tenant": tenant.name}, units)
+        return
+    used = API_KEYS.charge(tenant, units)
+    if used is None:
+        METRICS.inc("avec_tenant_quota_rejections_total", {"tenant": tenant.name})
+        # Quotas reset at midnight UTC
+        retry_after = 86400 - int(time.time()) % 86400
+        raise ApiAccessDenied(429, f"Daily quota of {tenant.daily_quota} assessments exhausted for tenant '{tenant.name}'.", retry_after)
+    tenant.used = used
+    METRICS.inc("avec_tenant_units_total", {"tenant": tenant.name}, units)
+
+def quota_headers(tenant: Tenant) -> Dict[str, str]:
+    if not tenant.daily_quota or tenant.used is None:
+        return {}
+    return {"X-RateLimit-Limit": str(tenant.daily_quota), "X-RateLimit-Remaining": str(max(0, tenant.daily_quota - tenant.used))}
+
+def record_tenant_request(tenant: Optional[Tenant], route: str, status: int):
+    METRICS.inc("avec_tenant_requests_total", {"tenant": tenant.name if tenant else "unknown", "route": route, "status": str(status)})
+
+METRICS.describe("avec_tenant_requests_total", "counter", "API requests by tenant, route and HTTP status.")
+METRICS.describe("avec_tenant_units_total", "counter", "Quota units (assessments) charged per tenant.")
+METRICS.describe("avec_tenant_quota_rejections_total", "counter", "API requests refused for an exhausted daily quota, per tenant.")
+
+def parse_result_filters(args) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Validated /api/v1/results filters from query parameters; (filters, error message)."""
+    filters: Dict[str, Any] = {}
+    for name, value in args.items():
+        if name in ("limit", "offset"):
+            continue
+        if name == "batch_id" or name in RESULT_TEXT_FILTERS:
+            filters[name] = value
+        elif RESULT_COLUMN_TYPES.get(name) == "INTEGER":
+            flag = _result_value(value, "INTEGER")
+            if flag is None:
+                return {}, f"'{name}' must be true or false."
+            filters[name] = flag
+        else:
+            allowed = ["batch_id", *RESULT_TEXT_FILTERS, *(c for c, k in RESULT_COLUMN_TYPES.items() if k == "INTEGER")]
+            return {}, f"Unknown filter '{name}'. Allowed: {', '.join(allowed)}."
+    return filters, None
+
+# --- Cache Prewarming ---
+# A background thread per process fills the Ensembl response cache for the genes
+# users are most likely to query: the most queried genes (this process and the
+# batch result store) first, then the N1C registry and supplementary table genes.
+# It issues the gene-level calls an exonic assessment in the canonical transcript
+# makes (everything but VEP) through its own client, paced at one request per
+# AVEC_PREWARM_DELAY seconds so it stays well inside the Ensembl rate budget left to
+# live traffic. It runs when started (create_app, or post_fork under preload) and
+# again after each reference refresh that changed a dataset. AVEC_PREWARM=0 turns it off.
+
+PREWARM_ENABLED = os.environ.get('AVEC_PREWARM', '1').lower() not in ('0', 'false', 'no')
+PREWARM_GENES = int(os.environ.get('AVEC_PREWARM_GENES', '200'))
+PREWARM_DELAY = float(os.environ.get('AVEC_PREWARM_DELAY', '1.0'))
+GENE_SYMBOL_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9-]*$')
+
+_gene_queries: Counter = Counter()
+_gene_queries_lock = threading.Lock()
+
+def record_gene_query(gene_symbol: str):
+    with _gene_queries_lock:
+        _gene_queries[gene_symbol] += 1
+
+def prewarm_genes(limit: int = PREWARM_GENES) -> List[str]:
+    """Gene symbols to prewarm, most important first."""
+    with _gene_queries_lock:
+        genes = [gene for gene, _ in _gene_queries.most_common(limit)]
+    if RESULT_STORE is not None:
+        try:
+            genes += RESULT_STORE.top_genes(limit)
+        except sqlite3.Error:
+            pass
+    reference = REFERENCE.snapshot()
+    for name in ('n1c_variants', 'n1c_supp'):
+        df = reference.frame(name)
+        if df is not None and 'Gene' in df.columns:
+            genes += df['Gene'].dropna().astype(str).str.strip().tolist()
+    unique: Dict[str, str] = {}
+    for gene in genes:
+        if GENE_SYMBOL_RE.match(gene):
+            unique.setdefault(gene.upper(), gene)
+    return list(unique.values())[:limit]
+
+def prewarm_gene_steps(gene_symbol: str) -> AssessmentSteps:
+    """The gene-level calls of an exonic assessment in gene_symbol's canonical transcript; returns how many were made."""
+    gene = yield ("lookup_symbol", (gene_symbol,))
+    transcript_id = ((gene or {}).get('canonical_transcript') or '').split('.')[0]
+    if not transcript_id:
+        return 1
+    transcript = yield ("lookup_id_expand", (transcript_id,))
+    calls = [("get_overlapping_genes", (gene['id'],)), ("lookup_symbol", (f"{gene_symbol}-AS1",))]
+    if transcript:
+        calls.append(("get_cds_sequence", (transcript_id,)))
+        protein_id = transcript.get("Translation", {}).get("id")
+        if protein_id:
+            calls.append(("get_domains", (protein_id,)))
+        calls += [("overlap_region_variation", (exon['seq_region_name'], exon['start'], exon['end']))
+                  for exon in extract_exons_from_transcript(transcript) if exon['cds_length'] > 0]
+    yield calls
+    return len(calls) + 2
+
+class Prewarmer:
+    """Runs prewarm rounds in a daemon thread; schedule() starts a new round (restarting one in progress)."""
+    def __init__(self):
+        self.status: Dict[str, Any] = {"state": "idle", "genes": 0, "done": 0, "requests": 0, "errors": 0}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Optional[threading.Thread]:
+        if not PREWARM_ENABLED or ENSEMBL_RESPONSE_CACHE is None:
+            self.status["state"] = "disabled"
+            return None
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="cache-prewarm", daemon=True)
+            self._thread.start()
+        self._wake.set()
+        return self._thread
+
+    def schedule(self):
+        """Starts a new round if this process runs the prewarmer (not in a preloading master)."""
+        if self._thread is not None:
+            self._wake.set()
+
+    def _run(self):
+        client = EnsemblClient(delay=PREWARM_DELAY)
+        # Scheduled behind every other request
+        _tenant.set(Tenant("prewarm", scheduling_class="background"))
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            # Entries are keyed by release: learn it first, as the assessments do
+            ensembl_release(client)
+            genes = prewarm_genes()
+            self.status.update(state="running", genes=len(genes), done=0, started_at=_utc_now())
+            for gene in genes:
+                if self._wake.is_set():
+                    break
+                try:
+                    self.status["requests"] += run_sync(prewarm_gene_steps(gene), client)
+                except EnsemblUnavailable as e:
+                    # Leave the budget to live traffic until the breaker lets requests through again
+                    self.status["errors"] += 1
+                    time.sleep(e.retry_after)
+                except Exception:
+                    self.status["errors"] += 1
+                self.status["done"] += 1
+            else:
+                self.status.update(state="idle", finished_at=_utc_now())
+
+PREWARMER = Prewarmer()
+REFERENCE.listeners.append(lambda changed: PREWARMER.schedule() if changed else None)
+
+def start_prewarmer() -> Optional[threading.Thread]:
+    """Starts the cache prewarmer of this process (after fork when the app is preloaded)."""
+    return PREWARMER.start()
+
+# --- Request Profiling ---
+# An admin request (X-Admin-Token) can ask for a profile of its assessment with an
+# X-Profile header or ?profile=: "cprofile" (deterministic, also "1") or "sample" (a
+# stack sampler at AVEC_PROFILE_SAMPLE_HZ, cheaper on long requests). The profile is
+# stored in AVEC_PROFILE_DIR under the request id (X-Request-ID, or a generated one;
+# returned as X-Profile-Id) and downloaded from /admin/profiles/<id>. A worker runs
+# one profile at a time and starts at most one every AVEC_PROFILE_MIN_INTERVAL
+# seconds; other requests run unprofiled. Only the request's own thread is profiled.
+# An empty AVEC_PROFILE_DIR turns profiling off.
+
+PROFILE_DIR = os.environ.get('AVEC_PROFILE_DIR', os.path.join(DATA_DIR, 'profiles'))
+PROFILE_MIN_INTERVAL = float(os.environ.get('AVEC_PROFILE_MIN_INTERVAL', '10'))
+PROFILE_KEEP = int(os.environ.get('AVEC_PROFILE_KEEP', '50'))
+PROFILE_SAMPLE_HZ = float(os.environ.get('AVEC_PROFILE_SAMPLE_HZ', '200'))
+PROFILE_MODES = {"cprofile": ".prof", "sample": ".folded"}
+PROFILE_ID_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+class StackSampler:
+    """Samples one thread's Python stack hz times a second, counting stacks in collapsed ("folded") form."""
+    def __init__(self, thread_id: int, hz: float):
+        self.thread_id = thread_id
+        self.interval = 1.0 / hz
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="avec-profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str):
+        """Writes "frame;frame;... count" lines, the input format of flamegraph.pl and speedscope."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class ProfileGate:
+    """Admits one profile at a time, and at most one start every min_interval seconds."""
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._busy = False
+        self._last_start = float('-inf')
+
+    def acquire(self) -> Optional[str]:
+        """None if a profile may start now, else why not ("busy" or "rate_limited")."""
+        with self._lock:
+            if self._busy:
+                return "busy"
+            now = time.monotonic()
+            if now - self._last_start < self.min_interval:
+                return "rate_limited"
+            self._busy, self._last_start = True, now
+            return None
+
+    def release(self):
+        with self._lock:
+            self._busy = False
+
+PROFILE_GATE = ProfileGate(PROFILE_MIN_INTERVAL)
+METRICS.describe("avec_profiles_total", "counter", "Requested assessment profiles by mode and result (stored or why skipped).")
+
+def _requested_profile_mode() -> Optional[str]:
+    mode = (request.headers.get('X-Profile') or request.args.get('profile') or '').strip().lower()
+    if mode in ('', '0', 'false', 'no'):
+        return None
+    return "cprofile" if mode in ('1', 'true', 'yes') else mode
+
+def _prune_profiles():
+    metas = sorted((e for e in os.scandir(PROFILE_DIR) if e.name.endswith('.json')), key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in metas[PROFILE_KEEP:]:
+        profile_id = entry.name[:-len('.json')]
+        for suffix in ('.json', *PROFILE_MODES.values()):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+@contextmanager
+def profiling(query: str) -> Iterator[Dict[str, Any]]:
+    """
+    Profiles the block if this request asks for it, is admin-authorized and the gate
+    admits it. Yields the profile metadata (empty when no profile was asked for); the
+    block may add fields, e.g. the cache status. See profile_headers.
+    """
+    mode = _requested_profile_mode()
+    meta: Dict[str, Any] = {}
+    if mode is None:
+        yield meta
+        return
+    meta.update(mode=mode, query=query, route=request.path)
+    if not PROFILE_DIR:
+        meta["status"] = "disabled"
+    elif not _admin_authorized():
+        meta["status"] = "forbidden"
+    elif mode not in PROFILE_MODES:
+        meta["status"] = "unknown_mode"
+    else:
+        meta["status"] = PROFILE_GATE.acquire()
+    if meta["status"] is not None:
+        METRICS.inc("avec_profiles_total", {"mode": mode if mode in PROFILE_MODES else "unknown", "result": meta["status"]})
+        yield meta
+        return
+    request_id = request.headers.get('X-Request-ID', '')
+    meta["id"] = request_id if PROFILE_ID_RE.match(request_id) else uuid.uuid4().hex
+    try:
+        profiler = cProfile.Profile() if mode == "cprofile" else StackSampler(threading.get_ident(), PROFILE_SAMPLE_HZ)
+        try:
+            if mode == "cprofile":
+                profiler.enable()
+            else:
+                profiler.start()
+        except ValueError:
+            # Another profiler (a debugger or coverage) holds the interpreter's profiling hook
+            profiler = None
+        if profiler is None:
+            meta["status"] = "busy"
+            METRICS.inc("avec_profiles_total", {"mode": mode, "result": "busy"})
+            yield meta
+            return
+        started = time.perf_counter()
+        try:
+            yield meta
+        finally:
+            if mode == "cprofile":
+                profiler.disable()
+            else:
+                profiler.stop()
+            meta.update(status="stored", duration_ms=round((time.perf_counter() - started) * 1000, 3), created=_utc_now())
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            base = os.path.join(PROFILE_DIR, meta["id"])
+            if mode == "cprofile":
+                profiler.dump_stats(base + ".prof")
+            else:
+                profiler.dump(base + ".folded")
+            with open(base + ".json", 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            _prune_profiles()
+            METRICS.inc("avec_profiles_total", {"mode": mode, "result": "stored"})
+            print(f"Stored {mode} profile {meta['id']} of '{query}' ({meta['duration_ms']:.0f} ms).")
+    finally:
+        PROFILE_GATE.release()
+
+def profile_headers(meta: Dict[str, Any]) -> Dict[str, str]:
+    headers = {"X-Profile": meta["status"]} if meta.get("status") else {}
+    if meta.get("status") == "stored":
+        headers["X-Profile-Id"] = meta["id"]
+    return headers
+
 app = Flask(__name__)
 
-load_databases()
+def create_app(load_mode: Optional[str] = None) -> Flask:
+    """
+    App factory used by wsgi.py. Writes the templates and loads the reference data.
+
+    load_mode (default: AVEC_LOAD_MODE, else "background"):
+      - "preload": load everything before returning. With gunicorn's preload_app this
+        runs in the master, so the forked workers share the loaded tables
+        copy-on-write instead of each parsing the Excel files and fetching the N1C
+        registry again. Threads do not survive fork, so the data file watcher is
+        started per worker (gunicorn.conf.py post_fork) rather than here.
+      - "background": return immediately and load the datasets in a thread; /readyz
+        reports when they are available and assessments skip checks whose data is
+        still loading.
+    """
+    load_mode = load_mode or os.environ.get('AVEC_LOAD_MODE', 'background')
+    setup_templates()
+    if load_mode == 'preload':
+        load_databases()
+        chain_index()
+        # Move everything allocated so far into the permanent generation; otherwise
+        # the cyclic GC in each worker writes to the inherited objects' headers and
+        # the shared pages get copied anyway.
+        gc.freeze()
+        print(f"Reference data loaded (memory kB: {process_memory()})")
+    else:
+        start_background_loading()
+        start_reference_watcher()
+        start_prewarmer()
+    return app
 
 @app.route('/')
 def index(): return render_template('index.html', title="Tool")
@@ -2092,32 +5415,597 @@ def about(): return render_template('about.html', title="About/Methods")
 @app.route('/cite')
 def cite(): return render_template('cite.html', title="How to Cite")
 
+def cache_stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Per traffic class statistics of the memory caches."""
+    caches = {"result": RESULT_CACHE}
+    if ENSEMBL_RESPONSE_CACHE is not None:
+        caches["ensembl"] = ENSEMBL_RESPONSE_CACHE
+    if VISUALIZATION_CACHE is not None:
+        caches["visualization"] = VISUALIZATION_CACHE
+    return {name: cache.memory.stats() for name, cache in caches.items()}
+
+@app.route('/healthz')
+def healthz():
+    """Liveness probe. Always 200 while the process is serving; includes per-dataset load status."""
+    return jsonify({"status": "ok", "datasets": dataset_status, "ensembl_mode": ENSEMBL_MODE,
+                    "ensembl_coalescing": ensembl_coalescing_stats(), "ensembl_breakers": ENSEMBL_BREAKERS.snapshot(), "liftover": liftover_status,
+                    "prewarm": PREWARMER.status, "caches": cache_stats(), "ensembl_scheduler": ENSEMBL_SCHEDULER.snapshot()})
+
+def metrics_text() -> str:
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = METRICS.render()
+    lines += ["# HELP avec_ensembl_coalescing_total Ensembl requests by single-flight outcome.",
+              "# TYPE avec_ensembl_coalescing_total counter"]
+    for endpoint, counts in sorted(ensembl_coalescing_stats().items()):
+        for outcome in ("upstream", "coalesced"):
+            lines.append(f"avec_ensembl_coalescing_total{_prom_labels((('endpoint', endpoint), ('outcome', outcome)))} {counts[outcome]}")
+    lines += ["# HELP avec_ensembl_breaker_state Circuit breaker state per Ensembl endpoint (0 closed, 1 half-open, 2 open).",
+              "# TYPE avec_ensembl_breaker_state gauge"]
+    for endpoint, breaker in ENSEMBL_BREAKERS.snapshot().items():
+        state = {"closed": 0, "half_open": 1, "open": 2}[breaker["state"]]
+        lines.append(f"avec_ensembl_breaker_state{_prom_labels((('endpoint', endpoint),))} {state}")
+    lines += ["# HELP avec_cache_bytes Bytes held per memory cache and traffic class partition.",
+              "# TYPE avec_cache_bytes gauge"]
+    for cache, classes in cache_stats().items():
+        for traffic, stats in classes.items():
+            lines.append(f"avec_cache_bytes{_prom_labels((('cache', cache), ('traffic', traffic)))} {stats['bytes']}")
+    lines += ["# HELP avec_result_cache_entries Entries in the in-memory result cache.",
+              "# TYPE avec_result_cache_entries gauge",
+              f"avec_result_cache_entries {len(RESULT_CACHE.memory)}",
+              "# HELP avec_dataset_loaded Whether a reference dataset is loaded (1) or not (0).",
+              "# TYPE avec_dataset_loaded gauge"]
+    for name in DATASETS:
+        lines.append(f"avec_dataset_loaded{_prom_labels((('dataset', name),))} {int(dataset_ready(name))}")
+    memory = process_memory()
+    if 'Rss' in memory:
+        lines += ["# HELP avec_process_rss_bytes Resident set size of this worker.",
+                  "# TYPE avec_process_rss_bytes gauge",
+                  f"avec_process_rss_bytes {memory['Rss'] * 1024}"]
+    return "\n".join(lines) + "\n"
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (per worker process)."""
+    return metrics_text(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe. 503 until every required reference dataset is loaded."""
+    ready = is_ready()
+    return jsonify({"ready": ready, "datasets": dataset_status}), (200 if ready else 503)
+
+def _admin_authorized() -> bool:
+    """Admin endpoints require AVEC_ADMIN_TOKEN to be set and sent as X-Admin-Token."""
+    expected = os.environ.get('AVEC_ADMIN_TOKEN')
+    provided = request.headers.get('X-Admin-Token', '')
+    return bool(expected) and hmac.compare_digest(expected, provided)
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    Reloads reference datasets in the background. Body (optional): {"datasets": [...]}.
+    In-flight requests finish on the snapshot they started with.
+    """
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    names = (request.get_json(silent=True) or {}).get('datasets') or None
+    unknown = [n for n in (names or []) if n not in DATASETS]
+    if unknown:
+        return jsonify({"error": f"Unknown datasets: {', '.join(unknown)}", "datasets": list(DATASETS)}), 400
+    request_reload(names)
+    return jsonify({"status": "reloading", "datasets": names or list(DATASETS),
+                    "current_versions": REFERENCE.snapshot().versions}), 202
+
+@app.route('/admin/api_keys', methods=['POST'])
+def admin_issue_api_key():
+    """Issues an API key for {"tenant": name, "daily_quota": n}; the key is only shown in this response."""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if API_KEYS is None:
+        return jsonify({"error": "API keys are disabled (AVEC_API_KEYS_DB is empty)."}), 404
+    data = request.get_json(silent=True) or {}
+    tenant, daily_quota = data.get('tenant'), data.get('daily_quota')
+    if not isinstance(tenant, str) or not TENANT_NAME_RE.match(tenant) or tenant == ANONYMOUS_TENANT:
+        return jsonify({"error": "'tenant' must be 1-64 letters, digits, '.', '_' or '-' (and not 'anonymous')."}), 400
+    if daily_quota is not None and (not isinstance(daily_quota, int) or daily_quota < 0):
+        return jsonify({"error": "'daily_quota' must be a non-negative integer (0 is unlimited)."}), 400
+    api_key = API_KEYS.issue_key(tenant, daily_quota)
+    return jsonify({"tenant": tenant, "api_key": api_key, "daily_quota": API_KEYS.tenant(api_key).daily_quota}), 201
+
+@app.route('/admin/api_keys/<tenant>', methods=['DELETE'])
+def admin_revoke_api_keys(tenant):
+    """Revokes every API key of a tenant."""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if API_KEYS is None:
+        return jsonify({"error": "API keys are disabled (AVEC_API_KEYS_DB is empty)."}), 404
+    return jsonify({"tenant": tenant, "revoked": API_KEYS.revoke(tenant)})
+
+@app.route('/admin/tenants', methods=['GET'])
+def admin_tenants():
+    """Tenants with their quota, active keys and usage (today, and per day for ?days=)."""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if API_KEYS is None:
+        return jsonify({"error": "API keys are disabled (AVEC_API_KEYS_DB is empty)."}), 404
+    try:
+        days = min(max(int(request.args.get('days', 7)), 1), 90)
+    except ValueError:
+        return jsonify({"error": "'days' must be an integer."}), 400
+    return jsonify({"tenants": API_KEYS.tenants(), "usage": API_KEYS.usage(days=days)})
+
+@app.route('/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """Stored request profiles, newest first."""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if not PROFILE_DIR or not os.path.isdir(PROFILE_DIR):
+        return jsonify({"profiles": []})
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.name.endswith('.json'):
+            with open(entry.path, encoding='utf-8') as f:
+                profiles.append(json.load(f))
+    profiles.sort(key=lambda p: p.get("created", ""), reverse=True)
+    return jsonify({"profiles": profiles})
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+def admin_profile(profile_id):
+    """
+    Downloads a stored profile: a pstats file (cprofile; ?format=text for the top
+    functions by cumulative time) or folded stacks (sample).
+    """
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    meta_path = os.path.join(PROFILE_DIR, profile_id + '.json') if PROFILE_DIR and PROFILE_ID_RE.match(profile_id) else None
+    if not meta_path or not os.path.exists(meta_path):
+        return jsonify({"error": "Profile not found."}), 404
+    with open(meta_path, encoding='utf-8') as f:
+        mode = json.load(f)["mode"]
+    path = os.path.join(PROFILE_DIR, profile_id + PROFILE_MODES[mode])
+    if mode == "cprofile" and request.args.get('format') == 'text':
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats('cumulative').print_stats(60)
+        return out.getvalue(), 200, {"Content-Type": "text/plain; charset=utf-8"}
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path),
+                     mimetype='text/plain' if mode == "sample" else 'application/octet-stream')
+
 @app.route('/api_docs')
 def api_docs():
     """Serves the API documentation page."""
     return render_template('api_docs.html', title="API Documentation")
 
+def tenant_api(view):
+    """
+    Runs an API view as the caller's tenant (see resolve_tenant): ApiAccessDenied
+    becomes its 401/429 response, and requests are counted per tenant.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        route = request.url_rule.rule if request.url_rule else request.path
+        try:
+            tenant = resolve_tenant(request.headers.get('X-API-Key') or request.args.get('api_key'))
+        except ApiAccessDenied as e:
+            record_tenant_request(None, route, e.status)
+            return jsonify(e.payload), e.status, e.headers
+        token = _tenant.set(tenant)
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except ApiAccessDenied as e:
+            response = app.make_response((jsonify(e.payload), e.status, e.headers))
+        finally:
+            _tenant.reset(token)
+        response.headers.update(quota_headers(tenant))
+        record_tenant_request(tenant, route, response.status_code)
+        return response
+    return wrapper
+
+@app.route('/api/v1/usage', methods=['GET'])
+@tenant_api
+def api_usage():
+    """The calling tenant's quota and its usage over the last days (?days=, at most 90)."""
+    tenant = _tenant.get()
+    if API_KEYS is None:
+        return jsonify({"error": "API keys and quotas are disabled."}), 404
+    try:
+        days = min(max(int(request.args.get('days', 7)), 1), 90)
+    except ValueError:
+        return jsonify({"error": "'days' must be an integer."}), 400
+    return jsonify({"tenant": tenant.name, "daily_quota": tenant.daily_quota, "usage": API_KEYS.usage(tenant.name, days)})
+
 @app.route('/api/v1/assess', methods=['GET'])
+@tenant_api
 def api_assess():
     """
     Handles a single variant assessment via a GET request for programmatic access.
-    Returns the full assessment data as JSON.
+    Returns the full assessment data as JSON (plus per-stage timings with ?timings=1,
+    a per-transcript exon skipping comparison with ?transcripts=all, and the compact
+    schema with ?view=compact).
     """
     query = request.args.get('query')
     if not query:
         return jsonify({"error": "The 'query' parameter is required."}), 400
 
+    charge_quota(1)
     client = EnsemblClient()
-    result = process_single_variant(query, client)
-    
+    compact = wants_compact(request.args.get('view'))
+    with profiling(query) as profile:
+        result, cache_status = process_single_variant_cached(query, client, all_transcripts=wants_all_transcripts(request.args.get('transcripts')))
+        profile["cache"] = cache_status
+    payload, status = api_result_payload(result, timings=wants_timings(request.args.get('timings')), compact=compact)
+    return Response(dumps_json(payload), status, {**api_result_headers(result, cache_status, compact), **profile_headers(profile)},
+                    mimetype='application/json')
+
+@app.route('/api/v1/assess/batch', methods=['POST'])
+@tenant_api
+def api_assess_batch():
+    """
+    Assesses a JSON list of queries (strings, or objects with "query" and optional
+    "splice_user_input"/"moa_user_input") through the batch pipeline and returns the
+    results in input order. Takes the same options as GET /api/v1/assess. Request
+    and response bodies may be gzip-compressed. Batches of more than
+    API_BATCH_SYNC_MAX unique variants are accepted as a job (202) instead.
+    """
+    try:
+        items, error = parse_batch_items(read_json_body())
+    except (ValueError, OSError, EOFError) as e:
+        return jsonify({"error": f"Could not read the request body: {e}"}), 400
+    if error:
+        return jsonify({"error": error}), 400
+    if unique_batch_items(items) > API_BATCH_SYNC_MAX:
+        if RESULT_STORE is None:
+            return jsonify({"error": f"At most {API_BATCH_SYNC_MAX} distinct queries per request on this server."}), 413
+        charge_quota(len(items))
+        batch_id = uuid.uuid4().hex
+        if not start_api_batch_job(batch_id, items, wants_all_transcripts(request.args.get('transcripts'))):
+            return jsonify({"error": "Too many batch jobs are running; please retry later.", "retry_after": 60}), 503, \
+                {"Retry-After": "60"}
+        results_url = url_for('api_results', batch_id=batch_id, _external=True)
+        return jsonify({"batch_id": batch_id, "status": "running", "rows": len(items), "results_url": results_url,
+                        "status_url": url_for('api_result_batches', _external=True)}), 202, {"Location": results_url}
+    charge_quota(len(items))
+    compact = wants_compact(request.args.get('view'))
+    timings = wants_timings(request.args.get('timings'))
+    results, totals = assess_api_batch(items, wants_all_transcripts(request.args.get('transcripts')))
+    rows = []
+    for item, result in zip(items, results):
+        payload, status = api_result_payload(result, timings=timings, compact=compact)
+        row = {"query": item["query"], "status": status}
+        if status == 200:
+            row["result"] = payload
+        else:
+            row.update(payload)
+        rows.append(row)
+    body = {"results": rows, "totals": totals}
+    headers = {"X-Batch-Unique-Variants": str(totals["Unique Variants"]), "X-Ensembl-Calls": str(totals["Ensembl Calls"])}
+    if compact:
+        body["schema_version"] = COMPACT_SCHEMA_VERSION
+        headers["X-Schema-Version"] = str(COMPACT_SCHEMA_VERSION)
+    return json_response(body, headers=headers)
+
+@app.route('/api/v1/schema', methods=['GET'])
+def api_schema():
+    """Version and code lists of the ?view=compact response schema."""
+    return jsonify(compact_schema())
+
+@app.route('/api/v1/results', methods=['GET'])
+@tenant_api
+def api_results():
+    """
+    Rows of past batches without re-running them, filtered by query parameters
+    (e.g. ?exon_skipping=Likely Eligible&es_in_frame=true). Paged with limit/offset.
+    """
+    if RESULT_STORE is None:
+        return jsonify({"error": "The batch result store is disabled."}), 404
+    filters, error = parse_result_filters(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), RESULTS_PAGE_MAX)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "'limit' and 'offset' must be integers."}), 400
+    results, total = RESULT_STORE.query(filters, limit, offset)
+    return jsonify({"results": results, "total": total, "limit": limit, "offset": offset})
+
+@app.route('/api/v1/results/batches', methods=['GET'])
+@tenant_api
+def api_result_batches():
+    """The most recent batches in the result store, with their status and row counts."""
+    if RESULT_STORE is None:
+        return jsonify({"error": "The batch result store is disabled."}), 404
+    return jsonify({"batches": RESULT_STORE.batches()})
+
+@app.route('/api/v1/visualization/<transcript_id>/<variant>', methods=['GET'])
+def api_visualization(transcript_id, variant):
+    """
+    IGV payload for the result viewer: a variant ("chrom:start-end" in GRCh38, or a
+    variant ID) on an Ensembl transcript, with the transcript's protein domain track.
+    The web UI fetches it without a key, so it takes no API key or quota and its
+    Ensembl requests are scheduled as interactive.
+    """
+    try:
+        region = parse_viewer_region(variant)
+    except LiftoverError as e:
+        return jsonify({"error": str(e)}), 422
+    if not TRANSCRIPT_ID_RE.match(transcript_id) or region is None:
+        return jsonify({"error": "Expected /api/v1/visualization/<ENST id>/<chrom:start-end>."}), 400
+    client = EnsemblClient()
+    ensembl_release(client)
+    try:
+        payload = run_sync(visualization_steps(transcript_id, region, request.args.get('name')), client)
+    except EnsemblUnavailable as e:
+        return jsonify({"error": f"{e} Please try again later.", "retry_after": round(e.retry_after)}), 503, \
+            {"Retry-After": str(max(1, int(e.retry_after)))}
+    if payload is None:
+        return jsonify({"error": f"Transcript {transcript_id} was not found."}), 404
+    return jsonify(payload)
+
+def wants_timings(value: Any) -> bool:
+    return value is True or str(value).lower() in ('1', 'true', 'yes')
+
+def wants_all_transcripts(value: Any) -> bool:
+    """?transcripts=all (API) or "all_transcripts": true (UI)."""
+    return value is True or str(value).lower() == 'all'
+
+# --- Compact API View ---
+# ?view=compact gives high-volume clients a smaller schema without HTML:
+# classifications, strategies and checks as enumerated codes, reasons as plain
+# text with their links listed once, and no timings. The layout is versioned by
+# COMPACT_SCHEMA_VERSION (in the body and the X-Schema-Version header) and the code
+# lists are published at /api/v1/schema; bump the version whenever either changes.
+
+COMPACT_SCHEMA_VERSION = 1
+CLASSIFICATIONS = ("Eligible", "Likely Eligible", "Unlikely Eligible", "Not Eligible", "Unable to Assess",
+                   "Not in Database", "Not Applicable", "Undetermined")
+STRATEGY_CODES = {
+    "N1C_Assessed_Variants": "n1c_assessed",
+    "N1C_Registry_Check": "n1c_registry",
+    "Allele_Specific_Knockdown": "knockdown",
+    "WT_Upregulation": "wt_upregulation",
+    "Splice_Switching": "splice_switching",
+    "Exon_Skipping": "exon_skipping",
+    "General_Assessment": "general",
+}
+# Assessment fields carried over unchanged (they hold no HTML)
+COMPACT_FIELDS = ("coding_exon_number", "total_exon_number", "frac_cds", "domain_names", "pathogenic_variant_counts",
+                  "antisense_gene_ids", "transcript_id")
+HTML_LINK_RE = re.compile(r'<a\s[^>]*href=[\'"]([^\'"]+)[\'"][^>]*>.*?</a>', re.IGNORECASE | re.DOTALL)
+HTML_BREAK_RE = re.compile(r'</(?:p|li|ul|div)>|<br\s*/?>', re.IGNORECASE)
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+def _code(text: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_').upper()
+
+CLASSIFICATION_CODES = {name: _code(name) for name in CLASSIFICATIONS}
+UNKNOWN_CODE = "UNKNOWN"
+
+def check_code(name: str) -> str:
+    column = ES_CHECK_COLUMNS.get(name)
+    return column[len("es_"):] if column else _code(name).lower()
+
+def html_to_text(value: Any) -> Tuple[str, List[str]]:
+    """(plain text, hrefs of its links) of an HTML fragment; anchors are dropped from the text."""
+    if not isinstance(value, str):
+        return ("" if value is None else str(value)), []
+    links = HTML_LINK_RE.findall(value)
+    text = HTML_TAG_RE.sub('', HTML_BREAK_RE.sub('\n', HTML_LINK_RE.sub('', value)))
+    lines = (re.sub(r'\s+', ' ', line).strip() for line in html.unescape(text).split('\n'))
+    return "\n".join(line for line in lines if line), links
+
+def _unique(values) -> List[Any]:
+    return list(dict.fromkeys(v for v in values if v))
+
+def _compact_assessment(name: str, assessment: Dict[str, Any]) -> Dict[str, Any]:
+    text, links = html_to_text(assessment.get("reason"))
+    out = {"strategy": STRATEGY_CODES.get(name, _code(name).lower()),
+           "classification": CLASSIFICATION_CODES.get(assessment.get("classification"), UNKNOWN_CODE),
+           "text": text}
+    if assessment.get("checks"):
+        out["checks"] = {check_code(check): passed for check, passed in assessment["checks"].items()}
+    details = assessment.get("details")
+    if isinstance(details, dict) and details:
+        out["details"] = {key: html_to_text(value)[0] if isinstance(value, str) else value for key, value in details.items()}
+    out.update({field: assessment[field] for field in COMPACT_FIELDS if assessment.get(field) is not None})
+    out["links"] = _unique([assessment.get("link"), assessment.get("clinvar_url"), *links])
+    return out
+
+def compact_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """The ?view=compact form of a successful assessment result."""
+    summary = result.get("summary", {})
+    haplo = summary.get("haploinsufficiency")
+    out = {"schema_version": COMPACT_SCHEMA_VERSION,
+           "gene": summary.get("gene"),
+           "transcript_id": summary.get("transcript_id"),
+           "moi": summary.get("moi") or [],
+           "moa": summary.get("moa") or [],
+           "haploinsufficiency": haplo.get("text") if isinstance(haplo, dict) else haplo,
+           "assessments": [_compact_assessment(name, a) for name, a in result.get("assessments", {}).items()]}
+    for key in ("coordinates", "resolved_moa"):
+        if summary.get(key):
+            out[key] = summary[key]
+    if summary.get("note"):
+        out["note"] = html_to_text(summary["note"])[0]
+    if result.get("warnings"):
+        out["warnings"] = [html_to_text(w)[0] for w in result["warnings"]]
+    if result.get("transcript_comparison"):
+        out["transcript_comparison"] = [
+            {"transcript_id": row["transcript_id"], "primary": row["primary"], "mane_select": row.get("mane_select"),
+             "canonical": row["canonical"], **_compact_assessment("Exon_Skipping", row)}
+            for row in result["transcript_comparison"]]
+    if result.get("visualization_url"):
+        out["visualization_url"] = result["visualization_url"]
+    return out
+
+def compact_schema() -> Dict[str, Any]:
+    """The code lists of the compact view (served at /api/v1/schema)."""
+    return {"schema_version": COMPACT_SCHEMA_VERSION,
+            "classifications": {**{code: name for name, code in CLASSIFICATION_CODES.items()}, UNKNOWN_CODE: "Other"},
+            "strategies": {code: name for name, code in STRATEGY_CODES.items()},
+            "checks": {check_code(name): name for name in ES_CHECK_COLUMNS}}
+
+def dumps_json(payload: Any) -> bytes:
+    """API response body: orjson when installed, else compact json."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+# --- JSON Batch API ---
+# POST /api/v1/assess/batch runs a list of queries through the file batch pipeline
+# (plan_batch: dedupe, bulk VEP, per-transcript prefetch, one Ensembl memo), with
+# API_BATCH_WORKERS unique variants in flight at once. Up to API_BATCH_SYNC_MAX
+# unique variants are answered in the response, one API payload per input item;
+# larger batches must fit in no request timeout, so they run as a job in the
+# background (at most API_BATCH_JOBS per worker) whose rows are stored and served
+# by /api/v1/results. Bodies may be gzip-compressed both ways; a decompressed
+# request is limited to API_BATCH_MAX_BYTES.
+
+API_BATCH_MAX = int(os.environ.get('AVEC_API_BATCH_MAX', '1000'))
+API_BATCH_SYNC_MAX = int(os.environ.get('AVEC_API_BATCH_SYNC_MAX', '100'))
+API_BATCH_WORKERS = int(os.environ.get('AVEC_API_BATCH_WORKERS', '4'))
+API_BATCH_JOBS = int(os.environ.get('AVEC_API_BATCH_JOBS', '2'))
+API_BATCH_MAX_BYTES = 16 * 1024 * 1024
+GZIP_MIN_BYTES = 1024
+_api_batch_jobs = threading.BoundedSemaphore(API_BATCH_JOBS)
+
+def read_json_body() -> Any:
+    """The request's JSON body, gunzipped first when sent with Content-Encoding: gzip."""
+    data = request.get_data(cache=False)
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        with gzip.GzipFile(fileobj=io.BytesIO(data)) as f:
+            data = f.read(API_BATCH_MAX_BYTES + 1)
+    if len(data) > API_BATCH_MAX_BYTES:
+        raise ValueError(f"larger than {API_BATCH_MAX_BYTES // (1024 * 1024)} MB")
+    return json.loads(data)
+
+def _user_input(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+def parse_batch_items(body: Any) -> Tuple[List[Dict[str, Optional[str]]], Optional[str]]:
+    """(items, error) from a batch request body: a list, or an object with a "queries" list."""
+    entries = body.get('queries') if isinstance(body, dict) else body
+    if not isinstance(entries, list) or not entries:
+        return [], "Expected a non-empty JSON list of queries (or {\"queries\": [...]})."
+    if len(entries) > API_BATCH_MAX:
+        return [], f"At most {API_BATCH_MAX} queries per request."
+    items = []
+    for i, entry in enumerate(entries):
+        if isinstance(entry, str):
+            entry = {"query": entry}
+        query = entry.get('query') if isinstance(entry, dict) else None
+        if not isinstance(query, str) or not query.strip():
+            return [], f"Item {i} has no 'query'."
+        items.append({"query": query.strip(), "splice_user_input": _user_input(entry.get('splice_user_input')),
+                      "moa_user_input": _user_input(entry.get('moa_user_input'))})
+    return items, None
+
+def unique_batch_items(items: List[Dict[str, Optional[str]]]) -> int:
+    """How many distinct (query, user inputs) a batch has, before planning it."""
+    return len({(normalize_hgvs(item["query"]) or item["query"], item["splice_user_input"], item["moa_user_input"])
+                for item in items})
+
+def assess_api_batch(items: List[Dict[str, Optional[str]]], all_transcripts: bool = False,
+                     client: Optional[BatchClient] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Results for items in input order, each unique (variant, user inputs) assessed
+    once and API_BATCH_WORKERS at a time (in plan order), plus the plan counters.
+    """
+    client = client or BatchClient(EnsemblClient())
+    with traffic_class("batch"):
+        plan = plan_batch([item["query"] for item in items], client)
+        rank = {key: n for n, key in enumerate(plan.order)}
+        keys = [(row_key, item["splice_user_input"], item["moa_user_input"]) for row_key, item in zip(plan.row_keys, items)]
+        unique = dict(zip(keys, items))
+        ordered = sorted(unique, key=lambda k: rank[k[0]])
+
+        def assess(key):
+            item = unique[key]
+            return process_single_variant_cached(item["query"], client, item["splice_user_input"], item["moa_user_input"],
+                                                 all_transcripts)[0]
+
+        with splice_classes(plan.splice_classes), \
+                futures.ThreadPoolExecutor(max_workers=max(1, API_BATCH_WORKERS), thread_name_prefix="api-batch") as pool:
+            # Each task runs in a copy of this context: traffic class, splice classes and tenant carry over
+            tasks = [pool.submit(contextvars.copy_context().run, assess, key) for key in ordered]
+            results = {key: task.result() for key, task in zip(ordered, tasks)}
+    totals = {"Rows": len(items), "Unique Variants": len(unique), "Duplicate Rows": len(items) - len(unique),
+              "Gene/Transcript Groups": len(plan.groups), "Ensembl Calls": client.fetched,
+              "Ensembl Calls Avoided": client.requested - client.fetched}
+    return [results[key] for key in keys], totals
+
+def start_api_batch_job(batch_id: str, items: List[Dict[str, Optional[str]]], all_transcripts: bool) -> bool:
+    """
+    Runs a large API batch in a background thread, storing its rows in the result
+    store under batch_id as for an uploaded file. False if API_BATCH_JOBS are running.
+    """
+    def run():
+        client = BatchClient(EnsemblClient())
+        totals: Dict[str, int] = {"Rows": len(items)}
+        try:
+            results, totals = assess_api_batch(items, all_transcripts, client)
+            rows = {}
+            with traffic_class("batch"):
+                for item, result in zip(items, results):
+                    key = (item["query"], item["splice_user_input"], item["moa_user_input"])
+                    if key not in rows:
+                        rows[key] = _batch_row(item["query"], client, result)
+            RESULT_STORE.add_rows(batch_id, 0, [dict(rows[(item["query"], item["splice_user_input"], item["moa_user_input"])],
+                                                     Variant=item["query"]) for item in items])
+        except Exception as e:
+            print(f"API batch {batch_id} failed: {e}")
+            RESULT_STORE.finish_batch(batch_id, "failed", totals)
+        else:
+            RESULT_STORE.finish_batch(batch_id, "complete", totals)
+            print(f"API batch {batch_id}: {totals}")
+        finally:
+            _api_batch_jobs.release()
+
+    if not _api_batch_jobs.acquire(blocking=False):
+        return False
+    try:
+        RESULT_STORE.start_batch(batch_id, "api")
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(run,), name=f"api-batch-{batch_id[:8]}", daemon=True).start()
+    except BaseException:
+        # The thread that would release the slot never started
+        _api_batch_jobs.release()
+        raise
+    return True
+
+def json_response(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """dumps_json response, gzip-compressed when the client accepts it and it is worth it."""
+    body = dumps_json(payload)
+    response = Response(body, status, headers, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def wants_compact(value: Any) -> bool:
+    return str(value).lower() == 'compact'
+
+def api_result_payload(result: Dict[str, Any], timings: bool = False, compact: bool = False) -> Tuple[Dict[str, Any], int]:
+    """Maps an assessment result to the API's JSON body and HTTP status (shared with asgi.py)."""
+    if not timings or compact:
+        result = {k: v for k, v in result.items() if k != "timings"}
     # Provide more specific HTTP status codes based on the outcome
     classification = result.get("classification")
     if classification == "Error":
-        return jsonify({"error": result.get("reason", "An internal server error occurred.")}), 500
+        return {"error": result.get("reason", "An internal server error occurred.")}, 500
     if classification == "Unable to Assess":
-         return jsonify({"error": result.get("reason", "Could not assess the provided variant.")}), 404
-    
-    return jsonify(result)
+        if "retry_after" in result:
+            return {"error": result.get("reason"), "retry_after": result["retry_after"]}, 503
+        return {"error": result.get("reason", "Could not assess the provided variant.")}, 404
+    return (compact_result(result) if compact else result), 200
+
+def api_result_headers(result: Dict[str, Any], cache_status: str, compact: bool = False) -> Dict[str, str]:
+    headers = {"X-Cache": cache_status}
+    if compact:
+        headers["X-Schema-Version"] = str(COMPACT_SCHEMA_VERSION)
+    if "retry_after" in result:
+        headers["Retry-After"] = str(max(1, int(result["retry_after"])))
+    return headers
 
 @app.route('/assess', methods=['POST'])
 def assess():
@@ -2129,181 +6017,346 @@ def assess():
     splice_input = data.get('splice_user_input', None)
     moa_input = data.get('moa_user_input', None)
     client = EnsemblClient()
-    result = process_single_variant(query, client, splice_user_input=splice_input, moa_user_input=moa_input)
-    
-    return jsonify(result)
+    with profiling(query) as profile:
+        result, cache_status = process_single_variant_cached(query, client, splice_user_input=splice_input, moa_user_input=moa_input,
+                                                             all_transcripts=wants_all_transcripts(data.get('all_transcripts')))
+        profile["cache"] = cache_status
+    if not wants_timings(data.get('timings')):
+        result.pop('timings', None)
+    return jsonify(result), 200, {"X-Cache": cache_status, **profile_headers(profile)}
 @app.route('/batch_assess', methods=['POST'])
 def batch_assess():
+    """
+    Assesses an uploaded batch file and returns the results workbook. With
+    ?stream=ndjson (or Accept: application/x-ndjson) the response is instead a
+    stream of JSON lines with each row as soon as it is assessed and the live
+    throughput; the last line links to the workbook.
+    """
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
     file = request.files['file']
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
+    # Rows are read lazily and assessed window by window, and the workbook is
+    # written in streaming mode, so memory does not grow with the file size.
+    variants = iter_batch_variants(file)
     try:
-        if file.filename.endswith('.xlsx'):
-            df = pd.read_excel(file, header=None)
-        else: # Handles .csv and .txt
-            df = pd.read_csv(file, header=None)
-    except Exception as e:
+        first_window = list(islice(variants, BATCH_WINDOW_ROWS))
+    except BatchInputError as e:
         return jsonify({"error": f"Error reading file: {e}"}), 400
+    if not first_window:
+        return jsonify({"error": "No variants found in file."}), 400
 
-    variants = df[0].dropna().astype(str).tolist()
-    client = EnsemblClient()
-    output_rows = []
-
-    for variant in variants:
-        result = process_single_variant(variant, client)
-        
-        row = {"Variant": variant}
-        summary = result.get("summary", {})
-        assessments = result.get("assessments", {})
-
-        row["Gene"] = summary.get("gene", "N/A")
-        row["MOI"] = ', '.join(summary.get("moi", []))
-        row["MOA"] = ', '.join(summary.get("moa", []))
-        # Ensembl Transcript ID and link
-        transcript_id = summary.get("transcript_id")
-        row["Ensembl Transcript"] = transcript_id or "N/A"
-        row["Ensembl Transcript Link"] = (
-            f"https://www.ensembl.org/Homo_sapiens/Transcript/Summary?t={transcript_id}" if transcript_id else "N/A"
-        )
-        
-        haplo_info = summary.get("haploinsufficiency", {})
-        row["Haploinsufficiency"] = haplo_info.get("text", "N/A")
-        row["ClinGen Link"] = haplo_info.get("url", "N/A")
-        # Duplicate explicitly as curation link for clarity
-        row["ClinGen Curation Link"] = haplo_info.get("url", "N/A")
-        
-        # --- START: NEW COLUMN LOGIC ---
-
-        # 1. Assess if an ASO exists and add the N1C link(s)
-        n1c_registry = assessments.get("N1C_Registry_Check", {}) or {}
-        n1c_assessed = assessments.get("N1C_Assessed_Variants", {}) or {}
-        if n1c_registry or n1c_assessed:
-            row["Existing ASO (N1C)"] = "Yes"
-            row["N1C Registry Link"] = n1c_registry.get("link", "N/A")
-            row["N1C Assessed (Curated) Link"] = n1c_assessed.get("link", "N/A")
-        else:
-            row["Existing ASO (N1C)"] = "No"
-            row["N1C Registry Link"] = "N/A"
-            row["N1C Assessed (Curated) Link"] = "N/A"
-            
-        # 2. Get the Antisense Transcript ID for WT Upregulation
-        wt_up = assessments.get("WT_Upregulation", {})
-        antisense_ids = wt_up.get("antisense_gene_ids", [])
-        row["Antisense Transcript ID"] = ", ".join(antisense_ids) if antisense_ids else "N/A"
-
-        # --- END: NEW COLUMN LOGIC ---
-
-        # Exon Skipping
-        skip = assessments.get("Exon_Skipping", {})
-        row["Exon Skipping Assessment"] = skip.get("classification", "NA")
-        for check, status in skip.get("checks", {}).items():
-            row[f"ES Check: {check}"] = status
-        # Ensembl exon view and domains (if available)
-        if skip:
-            gid = skip.get("gene_id")
-            tid = skip.get("transcript_id")
-            if gid and tid:
-                row["Ensembl Exon View Link"] = f"https://www.ensembl.org/Homo_sapiens/Transcript/Exons?db=core;g={gid};t={tid}"
-            else:
-                row["Ensembl Exon View Link"] = "N/A"
-            domain_names = skip.get("domain_names") or []
-            row["Domains"] = ", ".join(domain_names) if domain_names else "N/A"
-
-        # Splice Correction
-        splice = assessments.get("Splice_Switching", {})
-        row["Splice Correction Assessment"] = splice.get("classification", "Unable to Assess")
-        row["Splicing Validation DOI"] = splice.get("details", {}).get("Publication DOI", "NA")
-        # Splicing DB/Source links if available
-        splice_details = splice.get("details", {}) if isinstance(splice.get("details", {}), dict) else {}
-        splicing_db_link = splice_details.get("SSCVDB Gene Page") or splice_details.get("Publication") or "N/A"
-        row["Splicing DB Link"] = splicing_db_link
-
-        # WT Upregulation and Knockdown (assessments remain)
-        row["WT-Upregulation"] = wt_up.get("classification", "NA")
-        row["Knockdown"] = assessments.get("Allele_Specific_Knockdown", {}).get("classification", "NA")
-
-        # Manual validation needs and dual MoA assessment when MoA unresolved
-        manual_needs = []
-        summary_moa_list = summary.get("moa", []) or []
-        resolved_moa = summary.get("resolved_moa")
-        # Splice manual validation prompt
-        if splice.get("user_validation_prompt") or (splice.get("classification") in ("Not in Database", "Unable to Assess")):
-            manual_needs.append("Splice validation (Variant was not found in SpliceVarDB/SSCVDB and therefore requires user confirmation)")
-        # MoA unclear -> assess both and warn
-        if not resolved_moa and (len(summary_moa_list) != 1):
-            try:
-                gof_res = process_single_variant(variant, client, moa_user_input="GoF")
-                lof_res = process_single_variant(variant, client, moa_user_input="LoF")
-                kd_gof = (gof_res.get("assessments", {}).get("Allele_Specific_Knockdown", {}) or {}).get("classification", "N/A")
-                wt_lof = (lof_res.get("assessments", {}).get("WT_Upregulation", {}) or {}).get("classification", "N/A")
-                row["Knockdown (GoF)"] = kd_gof
-                row["WT-Upregulation (LoF)"] = wt_lof
-                row["MoA Dual Assessment Note"] = "Assessed both: use Knockdown if GoF; use WT-Upregulation if LoF."
-            except Exception:
-                row["Knockdown (GoF)"] = row.get("Knockdown", "N/A")
-                row["WT-Upregulation (LoF)"] = row.get("WT-Upregulation", "N/A")
-                row["MoA Dual Assessment Note"] = "MoA dual assessment unavailable."
-            manual_needs.append("Mechanism selection (GoF vs LoF)")
-
-        row["Manual Validations Needed"] = "; ".join(manual_needs) if manual_needs else "None"
-
-        # Overall Eligibility: highest across all assessment classifications
-        def _normalize_class(c: Optional[str]) -> str:
-            if not c:
-                return "Unable to Assess"
-            s = str(c).strip().lower().replace('-', ' ')
-            if 'not eligible' in s:
-                return 'Not Eligible'
-            if 'likely eligible' in s:
-                return 'Likely Eligible'
-            if 'unlikely eligible' in s:
-                return 'Unlikely Eligible'
-            if 'eligible' in s:
-                return 'Eligible'
-            if 'unable to assess' in s or 'not in database' in s:
-                return 'Unable to Assess'
-            return 'Unable to Assess'
-
-        rank_order = {
-            'Not Eligible': 1,
-            'Unable to Assess': 2,
-            'Unlikely Eligible': 3,
-            'Likely Eligible': 4,
-            'Eligible': 5,
-        }
-        best_label = 'Unable to Assess'
-        best_score = 0
-        for akey, aval in assessments.items():
-            if not isinstance(aval, dict):
-                continue
-            label = _normalize_class(aval.get('classification'))
-            score = rank_order.get(label, 2)
-            if score > best_score:
-                best_score = score
-                best_label = label
-        row["Overall Eligibility"] = best_label
-        
-        output_rows.append(row)
+    batch_id = uuid.uuid4().hex
+    if wants_batch_stream():
+        return stream_batch(batch_id, variants, first_window, file)
 
-    # --- Create and send the Excel file (no changes needed below this line) ---
-    if not output_rows:
-        return jsonify({"error": "No variants found in file."}), 400
-        
-    output_df = pd.DataFrame(output_rows)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        output_df.to_excel(writer, index=False, sheet_name='AVEC_Batch_Results')
+    output = tempfile.TemporaryFile()
+    try:
+        for event in batch_events(batch_id, variants, first_window, file.filename, output):
+            if event["event"] == "done":
+                totals = event["totals"]
+    except BatchInputError as e:
+        return jsonify({"error": f"Error reading file: {e}"}), 400
     output.seek(0)
     
-    return send_file(
+    response = send_file(
         output,
         as_attachment=True,
         download_name='avec_batch_results.xlsx',
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
+    response.headers["X-Batch-Unique-Variants"] = str(totals["Unique Variants"])
+    response.headers["X-Ensembl-Calls"] = str(totals["Ensembl Calls"])
+    response.headers["X-Ensembl-Calls-Avoided"] = str(totals["Ensembl Calls Avoided"])
+    response.headers["X-Batch-Id"] = batch_id
+    return response
+
+def wants_batch_stream() -> bool:
+    return (request.args.get('stream') == 'ndjson'
+            or 'application/x-ndjson' in request.headers.get('Accept', ''))
+
+def batch_output_path(batch_id: str) -> str:
+    return os.path.join(BATCH_OUTPUT_DIR, f"{batch_id}.xlsx")
+
+def _prune_batch_outputs():
+    """Deletes streamed-batch workbooks older than BATCH_OUTPUT_TTL."""
+    cutoff = time.time() - BATCH_OUTPUT_TTL
+    for entry in os.scandir(BATCH_OUTPUT_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            pass
 
-
-
+def stream_batch(batch_id: str, variants: Iterator[str], first_window: List[str], file) -> Response:
+    """NDJSON response for a batch; the workbook is kept in BATCH_OUTPUT_DIR for /batch_assess/<batch_id>.xlsx."""
+    os.makedirs(BATCH_OUTPUT_DIR, exist_ok=True)
+    _prune_batch_outputs()
+    partial_path = batch_output_path(batch_id) + ".part"
+    # The request closes its uploads when the view returns, but variants keeps
+    # reading this one while the response streams: detach it and close it here
+    upload, file.stream = file.stream, io.BytesIO()
+    filename = file.filename
+
+    def generate():
+        try:
+            with open(partial_path, 'wb') as output:
+                for event in batch_events(batch_id, variants, first_window, filename, output):
+                    if event["event"] == "done":
+                        output.close()
+                        os.replace(partial_path, batch_output_path(batch_id))
+                        event["download"] = url_for('batch_download', batch_id=batch_id)
+                    yield json.dumps(event) + "\n"
+        except BatchInputError as e:
+            yield json.dumps({"event": "error", "error": f"Error reading file: {e}"}) + "\n"
+        except Exception as e:
+            import traceback; traceback.print_exc()
+            yield json.dumps({"event": "error", "error": f"An unexpected server error occurred: {e}"}) + "\n"
+        finally:
+            upload.close()
+            if os.path.exists(partial_path):
+                os.unlink(partial_path)
+
+    # No buffering by reverse proxies (nginx honours X-Accel-Buffering)
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={"X-Batch-Id": batch_id, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/batch_assess/<batch_id>.xlsx', methods=['GET'])
+def batch_download(batch_id):
+    """Workbook of a streamed batch (kept for BATCH_OUTPUT_TTL)."""
+    path = batch_output_path(batch_id)
+    if not re.fullmatch(r'[0-9a-f]{32}', batch_id) or not os.path.exists(path):
+        return jsonify({"error": "Unknown or expired batch."}), 404
+    return send_file(path, as_attachment=True, download_name='avec_batch_results.xlsx',
+                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+def _progress_event(rows: int, elapsed: float) -> Dict[str, Any]:
+    return {"event": "progress", "rows": rows, "elapsed_s": round(elapsed, 2),
+            "rows_per_s": round(rows / elapsed, 2) if elapsed > 0 else 0.0}
+
+def batch_events(batch_id: str, variants: Iterator[str], first_window: List[str], filename: str, output) -> Iterator[Dict[str, Any]]:
+    """
+    Assesses a batch window by window, writing the workbook to output and the rows
+    to the result store. Yields a "start" event, a "row" event per output row as
+    soon as it is assessed (grouped by gene within a window, so "index", the input
+    row, is not monotonic), "progress" events at most every BATCH_PROGRESS_INTERVAL
+    seconds and after each window, and a final "done" event with the batch totals.
+    Raises BatchInputError if the file turns out to be unreadable part way through.
+    """
+    workbook = Workbook(write_only=True)
+    results_sheet = workbook.create_sheet('AVEC_Batch_Results')
+    results_sheet.append(BATCH_COLUMNS)
+    totals: Dict[str, int] = {"Rows": 0}
+    if RESULT_STORE:
+        RESULT_STORE.start_batch(batch_id, filename)
+    started = last_progress = time.perf_counter()
+    yield {"event": "start", "batch_id": batch_id}
+    try:
+        for window in chain([first_window], batch_windows(variants, BATCH_WINDOW_ROWS)):
+            rows: List[Optional[Dict[str, Any]]] = [None] * len(window)
+            counts: Dict[str, int] = {}
+            for index, row in iter_batch_window(window, counts):
+                rows[index] = row
+                yield {"event": "row", "index": totals["Rows"] + index, "row": row}
+                now = time.perf_counter()
+                if now - last_progress >= BATCH_PROGRESS_INTERVAL:
+                    last_progress = now
+                    yield _progress_event(totals["Rows"] + sum(r is not None for r in rows), now - started)
+            # The write-only sheet takes rows in input order, so each window is appended once complete
+            for row in rows:
+                results_sheet.append([row.get(column) for column in BATCH_COLUMNS])
+            if RESULT_STORE:
+                RESULT_STORE.add_rows(batch_id, totals["Rows"], rows)
+            for name, value in counts.items():
+                totals[name] = totals.get(name, 0) + value
+            print(f"Batch progress: {totals['Rows']} rows assessed")
+            yield _progress_event(totals["Rows"], time.perf_counter() - started)
+    except BaseException:
+        # Also reached when a streamed response is abandoned by the client (GeneratorExit)
+        if RESULT_STORE:
+            RESULT_STORE.finish_batch(batch_id, "failed", totals)
+        raise
+    if RESULT_STORE:
+        RESULT_STORE.finish_batch(batch_id, "complete", totals)
+    print(f"Batch plan: {totals}")
+
+    summary_sheet = workbook.create_sheet('Batch_Summary')
+    summary_sheet.append(list(totals))
+    summary_sheet.append(list(totals.values()))
+    workbook.save(output)
+    yield {"event": "done", "batch_id": batch_id, "totals": totals,
+           **{k: v for k, v in _progress_event(totals["Rows"], time.perf_counter() - started).items() if k != "event"}}
+
+def iter_batch_window(variants: List[str], counts: Dict[str, int]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Plans and assesses one window of batch rows. Yields (index in the window, output
+    row) for every input row as soon as its unique variant is assessed; counts
+    receives the plan counters once the window is done.
+    """
+    client = BatchClient(EnsemblClient())
+    with traffic_class("batch"):
+        plan = plan_batch(variants, client)
+    positions: Dict[str, List[int]] = {}
+    for index, key in enumerate(plan.row_keys):
+        positions.setdefault(key, []).append(index)
+    duplicate_calls = 0
+    for key in plan.order:
+        requested_before = client.requested
+        with traffic_class("batch"), splice_classes(plan.splice_classes):
+            row = _batch_row(plan.queries[key], client)
+        # Duplicate rows reuse the first occurrence's result (and the calls it made)
+        duplicate_calls += (client.requested - requested_before) * (len(positions[key]) - 1)
+        for index in positions[key]:
+            yield index, dict(row, Variant=variants[index])
+    counts.update({
+        "Rows": len(variants), "Unique Variants": len(plan.queries), "Duplicate Rows": plan.duplicates,
+        "Gene/Transcript Groups": len(plan.groups), "Ensembl Calls": client.fetched,
+        "Ensembl Calls Avoided": (client.requested - client.fetched) + duplicate_calls,
+    })
+
+def _batch_row(variant: str, client: BatchClient, result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Assesses one unique batch variant (unless its result is given) and flattens the result into an output row."""
+    if result is None:
+        result = process_single_variant(variant, client)
+    
+    row = {"Variant": variant}
+    summary = result.get("summary", {})
+    assessments = result.get("assessments", {})
+
+    row["Gene"] = summary.get("gene", "N/A")
+    row["MOI"] = ', '.join(summary.get("moi", []))
+    row["MOA"] = ', '.join(summary.get("moa", []))
+    # Ensembl Transcript ID and link
+    transcript_id = summary.get("transcript_id")
+    row["Ensembl Transcript"] = transcript_id or "N/A"
+    row["Ensembl Transcript Link"] = (
+        f"https://www.ensembl.org/Homo_sapiens/Transcript/Summary?t={transcript_id}" if transcript_id else "N/A"
+    )
+    
+    haplo_info = summary.get("haploinsufficiency", {})
+    row["Haploinsufficiency"] = haplo_info.get("text", "N/A")
+    row["ClinGen Link"] = haplo_info.get("url", "N/A")
+    # Duplicate explicitly as curation link for clarity
+    row["ClinGen Curation Link"] = haplo_info.get("url", "N/A")
+    
+    # --- START: NEW COLUMN LOGIC ---
+
+    # 1. Assess if an ASO exists and add the N1C link(s)
+    n1c_registry = assessments.get("N1C_Registry_Check", {}) or {}
+    n1c_assessed = assessments.get("N1C_Assessed_Variants", {}) or {}
+    if n1c_registry or n1c_assessed:
+        row["Existing ASO (N1C)"] = "Yes"
+        row["N1C Registry Link"] = n1c_registry.get("link", "N/A")
+        row["N1C Assessed (Curated) Link"] = n1c_assessed.get("link", "N/A")
+    else:
+        row["Existing ASO (N1C)"] = "No"
+        row["N1C Registry Link"] = "N/A"
+        row["N1C Assessed (Curated) Link"] = "N/A"
+        
+    # 2. Get the Antisense Transcript ID for WT Upregulation
+    wt_up = assessments.get("WT_Upregulation", {})
+    antisense_ids = wt_up.get("antisense_gene_ids", [])
+    row["Antisense Transcript ID"] = ", ".join(antisense_ids) if antisense_ids else "N/A"
+
+    # --- END: NEW COLUMN LOGIC ---
+
+    # Exon Skipping
+    skip = assessments.get("Exon_Skipping", {})
+    row["Exon Skipping Assessment"] = skip.get("classification", "NA")
+    for check, status in skip.get("checks", {}).items():
+        row[f"ES Check: {check}"] = status
+    # Ensembl exon view and domains (if available)
+    if skip:
+        gid = skip.get("gene_id")
+        tid = skip.get("transcript_id")
+        if gid and tid:
+            row["Ensembl Exon View Link"] = f"https://www.ensembl.org/Homo_sapiens/Transcript/Exons?db=core;g={gid};t={tid}"
+        else:
+            row["Ensembl Exon View Link"] = "N/A"
+        domain_names = skip.get("domain_names") or []
+        row["Domains"] = ", ".join(domain_names) if domain_names else "N/A"
+
+    # Splice Correction
+    splice = assessments.get("Splice_Switching", {})
+    row["Splice Correction Assessment"] = splice.get("classification", "Unable to Assess")
+    row["Splicing Validation DOI"] = splice.get("details", {}).get("Publication DOI", "NA")
+    # Splicing DB/Source links if available
+    splice_details = splice.get("details", {}) if isinstance(splice.get("details", {}), dict) else {}
+    splicing_db_link = splice_details.get("SSCVDB Gene Page") or splice_details.get("Publication") or "N/A"
+    row["Splicing DB Link"] = splicing_db_link
+
+    # WT Upregulation and Knockdown (assessments remain)
+    row["WT-Upregulation"] = wt_up.get("classification", "NA")
+    row["Knockdown"] = assessments.get("Allele_Specific_Knockdown", {}).get("classification", "NA")
+
+    # Manual validation needs and dual MoA assessment when MoA unresolved
+    manual_needs = []
+    summary_moa_list = summary.get("moa", []) or []
+    resolved_moa = summary.get("resolved_moa")
+    # Splice manual validation prompt
+    if splice.get("user_validation_prompt") or (splice.get("classification") in ("Not in Database", "Unable to Assess")):
+        manual_needs.append("Splice validation (Variant was not found in SpliceVarDB/SSCVDB and therefore requires user confirmation)")
+    # MoA unclear -> assess both and warn
+    if not resolved_moa and (len(summary_moa_list) != 1):
+        try:
+            gof_res = process_single_variant(variant, client, moa_user_input="GoF")
+            lof_res = process_single_variant(variant, client, moa_user_input="LoF")
+            kd_gof = (gof_res.get("assessments", {}).get("Allele_Specific_Knockdown", {}) or {}).get("classification", "N/A")
+            wt_lof = (lof_res.get("assessments", {}).get("WT_Upregulation", {}) or {}).get("classification", "N/A")
+            row["Knockdown (GoF)"] = kd_gof
+            row["WT-Upregulation (LoF)"] = wt_lof
+            row["MoA Dual Assessment Note"] = "Assessed both: use Knockdown if GoF; use WT-Upregulation if LoF."
+        except Exception:
+            row["Knockdown (GoF)"] = row.get("Knockdown", "N/A")
+            row["WT-Upregulation (LoF)"] = row.get("WT-Upregulation", "N/A")
+            row["MoA Dual Assessment Note"] = "MoA dual assessment unavailable."
+        manual_needs.append("Mechanism selection (GoF vs LoF)")
+
+    row["Manual Validations Needed"] = "; ".join(manual_needs) if manual_needs else "None"
+
+    # Overall Eligibility: highest across all assessment classifications
+    def _normalize_class(c: Optional[str]) -> str:
+        if not c:
+            return "Unable to Assess"
+        s = str(c).strip().lower().replace('-', ' ')
+        if 'not eligible' in s:
+            return 'Not Eligible'
+        if 'likely eligible' in s:
+            return 'Likely Eligible'
+        if 'unlikely eligible' in s:
+            return 'Unlikely Eligible'
+        if 'eligible' in s:
+            return 'Eligible'
+        if 'unable to assess' in s or 'not in database' in s:
+            return 'Unable to Assess'
+        return 'Unable to Assess'
+
+    rank_order = {
+        'Not Eligible': 1,
+        'Unable to Assess': 2,
+        'Unlikely Eligible': 3,
+        'Likely Eligible': 4,
+        'Eligible': 5,
+    }
+    best_label = 'Unable to Assess'
+    best_score = 0
+    for akey, aval in assessments.items():
+        if not isinstance(aval, dict):
+            continue
+        label = _normalize_class(aval.get('classification'))
+        score = rank_order.get(label, 2)
+        if score > best_score:
+            best_score = score
+            best_label = label
+    row["Overall Eligibility"] = best_label
+    row["Data Warnings"] = "; ".join(result.get("warnings", [])) or "None"
+    row["Data Versions"] = ", ".join(f"{k}={v}" for k, v in result.get("data_versions", {}).items())
+    return row
+
+if __name__ == "__main__":
+    create_app()
+    if os.environ.get('AVEC_LOAD_MODE') == 'preload':
+        start_reference_watcher()
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
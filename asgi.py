@@ -0,0 +1,116 @@
+import json
+import os
+from urllib.parse import parse_qsl
+
+# Ensure relative paths resolve from this directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+os.chdir(BASE_DIR)
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (ApiAccessDenied, AsyncEnsemblClient, _tenant, api_result_headers, api_result_payload, charge_quota,
+                 create_app, dumps_json, process_single_variant_async, quota_headers, record_tenant_request,
+                 resolve_tenant, wants_all_transcripts, wants_compact, wants_timings)
+
+# ASGI entry point, e.g. `WEB_CONCURRENCY=2 uvicorn asgi:application` (uvicorn reads its
+# worker count from WEB_CONCURRENCY, and the app divides the Ensembl rate by it).
+# The assessment endpoints run on the event loop with one shared AsyncEnsemblClient,
+# so a single process keeps hundreds of assessments in flight while they wait on
+# Ensembl. Every other route is served by the Flask app in a thread.
+flask_app = create_app()
+wsgi_application = WsgiToAsgi(flask_app)
+_client = None
+
+
+def _get_client() -> AsyncEnsemblClient:
+    global _client
+    if _client is None:
+        _client = AsyncEnsemblClient()
+    return _client
+
+
+async def _read_body(receive) -> bytes:
+    body, more = b"", True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    return body
+
+
+async def _send_json(send, payload, status=200, headers=None):
+    body = dumps_json(payload)
+    extra = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + extra})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def api_assess(scope, receive, send):
+    """GET /api/v1/assess, same contract as the Flask route."""
+    args = dict(parse_qsl(scope.get("query_string", b"").decode("utf-8")))
+    headers = dict(scope.get("headers") or [])
+    try:
+        tenant = resolve_tenant(headers.get(b"x-api-key", b"").decode("latin-1") or args.get("api_key"))
+    except ApiAccessDenied as e:
+        record_tenant_request(None, "/api/v1/assess", e.status)
+        return await _send_json(send, e.payload, e.status, e.headers)
+    query = args.get("query")
+    if not query:
+        record_tenant_request(tenant, "/api/v1/assess", 400)
+        return await _send_json(send, {"error": "The 'query' parameter is required."}, 400)
+    try:
+        charge_quota(1, tenant)
+    except ApiAccessDenied as e:
+        record_tenant_request(tenant, "/api/v1/assess", e.status)
+        return await _send_json(send, e.payload, e.status, e.headers)
+    compact = wants_compact(args.get("view"))
+    token = _tenant.set(tenant)
+    try:
+        result, cache_status = await process_single_variant_async(query, _get_client(),
+                                                                  all_transcripts=wants_all_transcripts(args.get("transcripts")))
+    finally:
+        _tenant.reset(token)
+    payload, status = api_result_payload(result, timings=wants_timings(args.get("timings")), compact=compact)
+    record_tenant_request(tenant, "/api/v1/assess", status)
+    await _send_json(send, payload, status, {**api_result_headers(result, cache_status, compact), **quota_headers(tenant)})
+
+
+async def assess(scope, receive, send):
+    """POST /assess from the web UI, same contract as the Flask route."""
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or 'query' not in data:
+        return await _send_json(send, {"classification": "Error", "reason": "No query provided."}, 400)
+    result, cache_status = await process_single_variant_async(data['query'], _get_client(),
+                                                              splice_user_input=data.get('splice_user_input'),
+                                                              moa_user_input=data.get('moa_user_input'),
+                                                              all_transcripts=wants_all_transcripts(data.get('all_transcripts')))
+    if not wants_timings(data.get('timings')):
+        result.pop('timings', None)
+    await _send_json(send, result, headers={"X-Cache": cache_status})
+
+
+ASYNC_ROUTES = {
+    ("GET", "/api/v1/assess"): api_assess,
+    ("POST", "/assess"): assess,
+}
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if _client is not None:
+                    await _client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    handler = ASYNC_ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if handler is not None:
+        return await handler(scope, receive, send)
+    return await wsgi_application(scope, receive, send)
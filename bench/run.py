@@ -0,0 +1,299 @@
+"""
+Throughput benchmark for the assessment pipeline.
+
+Replays a cassette of Ensembl / N1C responses through bench/stub_server.py
+(a subprocess) and runs the corpus through process_single_variant,
+GET /api/v1/assess and POST /batch_assess. For each scenario it reports p50/p95
+latency, rows per second, Ensembl requests per variant and peak RSS.
+
+    python bench/run.py                                   # synthetic cassette
+    python bench/run.py --cassette bench/cassettes/ensembl.json
+    python bench/run.py --baseline bench/baseline.json    # exit 1 on a requests/variant regression
+    python bench/run.py --update-baseline bench/baseline.json
+    python bench/run.py --cassette bench/cassettes/ensembl.json --record --delay 0.1
+    python bench/run.py --fault 503 --fault-rate 0.2         # degraded upstream
+
+--record fills a cassette from the live Ensembl REST API and N1C registry
+(requests missing from it are fetched and saved).
+
+Each scenario runs in a child forked after the app is loaded, so peak_rss_mb is
+that scenario's own peak. --baseline fails only on Ensembl requests per variant,
+which does not depend on the machine; latency, throughput and memory against the
+baseline are reported as NOTE lines, and only gated with --gate-timings (use that
+when the baseline was recorded on the same runner class).
+
+The result and Ensembl response caches are disabled unless --result-cache is
+given, so every iteration does the full work. Client pacing (AVEC_ENSEMBL_DELAY) defaults to 0
+here; pass --delay 0.1 to include the production pacing.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import synthetic  # noqa: E402
+
+ENSEMBL_UPSTREAM = "https://rest.ensembl.org"
+SCENARIOS = ("process_single_variant", "api_assess", "batch_assess")
+# metric -> (direction, relative tolerance multiplier, absolute slack, machine independent)
+# direction +1: higher is worse; -1: lower is worse
+CHECKS = {
+    "p50_ms": (+1, 1.0, 5.0, False),
+    "p95_ms": (+1, 1.0, 10.0, False),
+    "rows_per_s": (-1, 1.0, 0.0, False),
+    "requests_per_variant": (+1, 0.0, 0.02, True),
+    "peak_rss_mb": (+1, 0.8, 16.0, False),
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_stub(cassette_path, latency, record=False, fault_args=()):
+    port = _free_port()
+    cmd = [sys.executable, os.path.join(BENCH_DIR, 'stub_server.py'), '--cassette', cassette_path,
+           '--port', str(port), '--latency', str(latency), *fault_args]
+    if record:
+        cmd += ['--record', ENSEMBL_UPSTREAM]
+    proc = subprocess.Popen(cmd, stderr=None if record else subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{base}/__stats", timeout=1)
+            return proc, base
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("stub server did not start")
+
+
+def stub_requests(base) -> int:
+    return requests.get(f"{base}/__stats", timeout=5).json()["requests"]
+
+
+def reset_stub(base):
+    requests.post(f"{base}/__stats", timeout=5)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is kB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def summarize(latencies, rows, elapsed, requests_made):
+    lat = np.array(latencies) * 1000
+    return {
+        "variants": rows,
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "rows_per_s": round(rows / elapsed, 2) if elapsed else 0.0,
+        "requests_per_variant": round(requests_made / rows, 3) if rows else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(name, app, queries, repeat, stub):
+    """run_scenario in a forked child, so that ru_maxrss is the peak of this scenario alone."""
+    if not hasattr(os, 'fork'):
+        return run_scenario(name, app, queries, repeat, stub)
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            payload = {"result": run_scenario(name, app, queries, repeat, stub)}
+        except BaseException as e:
+            payload = {"error": f"{type(e).__name__}: {e}"}
+        with os.fdopen(write_fd, 'w') as f:
+            json.dump(payload, f)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    payload = json.loads(data) if data else {"error": "scenario process exited without a result"}
+    if "error" in payload:
+        raise RuntimeError(f"{name}: {payload['error']}")
+    return payload["result"]
+
+
+def run_scenario(name, app, queries, repeat, stub):
+    reset_stub(stub)
+    latencies = []
+    started = time.perf_counter()
+    if name == "process_single_variant":
+        for _ in range(repeat):
+            for q in queries:
+                t = time.perf_counter()
+                app.process_single_variant(q, app.EnsemblClient())
+                latencies.append(time.perf_counter() - t)
+    elif name == "api_assess":
+        client = app.app.test_client()
+        for _ in range(repeat):
+            for q in queries:
+                t = time.perf_counter()
+                resp = client.get('/api/v1/assess', query_string={'query': q})
+                latencies.append(time.perf_counter() - t)
+                if resp.status_code >= 500:
+                    raise RuntimeError(f"/api/v1/assess failed for {q}: {resp.get_data(as_text=True)[:200]}")
+    elif name == "batch_assess":
+        client = app.app.test_client()
+        payload = "\n".join(queries).encode('utf-8')
+        for _ in range(repeat):
+            t = time.perf_counter()
+            resp = client.post('/batch_assess', data={'file': (io.BytesIO(payload), 'corpus.csv')},
+                               content_type='multipart/form-data')
+            latencies.append(time.perf_counter() - t)
+            if resp.status_code != 200:
+                raise RuntimeError(f"/batch_assess failed: {resp.get_data(as_text=True)[:200]}")
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, len(queries) * repeat, elapsed, stub_requests(stub))
+
+
+def compare(report, baseline, tolerance, gate_timings=False):
+    """
+    Returns (regressions, notes): human-readable regressions of report against
+    baseline that fail the run, and those of machine-dependent metrics that are
+    only reported (unless gate_timings).
+    """
+    regressions, notes = [], []
+    for name, base in baseline.get("scenarios", {}).items():
+        current = report["scenarios"].get(name)
+        if not current:
+            continue
+        for metric, (direction, weight, slack, portable) in CHECKS.items():
+            if metric not in base or metric not in current:
+                continue
+            allowed = base[metric] * tolerance * weight + slack
+            delta = (current[metric] - base[metric]) * direction
+            if delta > allowed:
+                (regressions if portable or gate_timings else notes).append(
+                    f"{name}.{metric}: {current[metric]} vs baseline {base[metric]}")
+    return regressions, notes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cassette', help="recorded cassette (default: synthetic cassette built from the corpus)")
+    parser.add_argument('--corpus', default=synthetic.CORPUS_PATH)
+    parser.add_argument('--repeat', type=int, default=3, help="passes over the corpus per scenario")
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds the stub adds to every response")
+    parser.add_argument('--delay', type=float, default=0.0, help="client pacing per Ensembl request (AVEC_ENSEMBL_DELAY)")
+    parser.add_argument('--result-cache', action='store_true', help="keep the result and Ensembl response caches enabled")
+    parser.add_argument('--record', action='store_true', help="fetch requests missing from --cassette live and save them")
+    parser.add_argument('--fault', help="stub injects this failure (HTTP status or 'timeout'), see stub_server.py")
+    parser.add_argument('--fault-rate', type=float, default=1.0)
+    parser.add_argument('--output', help="write the JSON report here (default: stdout)")
+    parser.add_argument('--baseline', help="compare against this report and exit 1 on regressions")
+    parser.add_argument('--gate-timings', action='store_true',
+                        help="also fail on latency, throughput and memory regressions (same-machine baselines)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    parser.add_argument('--update-baseline', metavar='PATH', help="write the report as the new baseline")
+    args = parser.parse_args(argv)
+
+    if args.record and not args.cassette:
+        parser.error("--record needs --cassette")
+    rows = synthetic.read_corpus(args.corpus)
+    queries = [r["query"] for r in rows]
+    tmp = None
+    cassette_path = args.cassette
+    if not cassette_path:
+        tmp = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        json.dump(synthetic.build_cassette(rows), tmp)
+        tmp.close()
+        cassette_path = tmp.name
+
+    fault_args = ['--fault', args.fault, '--fault-rate', str(args.fault_rate)] if args.fault else []
+    stub_proc, stub = start_stub(cassette_path, args.latency, args.record, fault_args)
+    try:
+        os.environ.update({
+            "AVEC_ENSEMBL_REST": stub,
+            "AVEC_N1C_API_URL": f"{stub}/api/data?table=N1C_projects",
+            "AVEC_N1C_ASSESSED_URL": f"{stub}/api/data?table=assessed_variants",
+            "AVEC_ENSEMBL_DELAY": str(args.delay),
+            "AVEC_LOAD_MODE": "preload",
+            # Keep benchmark batches out of the batch result store
+            "AVEC_RESULTS_DB": "",
+            # No API keys or quotas, and no shared Ensembl rate limit: the stub is the only upstream
+            "AVEC_API_KEYS_DB": "",
+            "AVEC_ENSEMBL_RATE": "0",
+        })
+        if not args.result_cache:
+            os.environ["AVEC_RESULT_CACHE_MB"] = "0"
+            os.environ["AVEC_ENSEMBL_CACHE_MB"] = "0"
+            os.environ.pop("AVEC_RESULT_CACHE_DB", None)
+        # Synthetic exons are often out of frame; Biopython warns on every partial-codon translation
+        warnings.filterwarnings("ignore", message="Partial codon")
+        os.chdir(REPO_DIR)
+        sys.path.insert(0, REPO_DIR)
+        import app
+        app.create_app()
+
+        report = {
+            "meta": {
+                "cassette": os.path.basename(args.cassette) if args.cassette else "synthetic",
+                "corpus_size": len(queries),
+                "repeat": args.repeat,
+                "stub_latency_s": args.latency,
+                "client_delay_s": args.delay,
+                "fault": f"{args.fault}@{args.fault_rate}" if args.fault else None,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+            },
+            "scenarios": {},
+        }
+        for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            if name not in SCENARIOS:
+                parser.error(f"unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+            report["scenarios"][name] = result = run_isolated(name, app, queries, args.repeat, stub)
+            print(f"{name:24s} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                  f"{result['rows_per_s']:8.2f} rows/s  {result['requests_per_variant']:6.2f} req/variant  "
+                  f"peak RSS {result['peak_rss_mb']} MB", file=sys.stderr)
+    finally:
+        stub_proc.terminate()
+        stub_proc.wait()
+        if tmp:
+            os.unlink(tmp.name)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.update_baseline:
+        with open(args.update_baseline, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions, notes = compare(report, json.load(f), args.tolerance, args.gate_timings)
+        for line in notes:
+            print(f"NOTE {line}", file=sys.stderr)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Local stand-in for the Ensembl REST API and the N1C registry that replays a
+cassette of recorded responses.
+
+A cassette is a JSON file: {"meta": {...}, "interactions": [{"request":
+{"method", "path", "query"}, "response": {"status", "body"}}, ...]}. Requests
+are matched on method, unquoted path and sorted query parameters.
+
+    python bench/stub_server.py --cassette bench/cassettes/ensembl.json --port 18090
+    python bench/stub_server.py --cassette bench/cassettes/ensembl.json --record https://rest.ensembl.org
+
+With --record, requests missing from the cassette are forwarded upstream
+(N1C registry paths to --n1c-upstream) and the cassette is rewritten on exit. GET /__stats returns request counters
+(POST /__stats resets them).
+
+Faults can be injected to exercise the client's retries, circuit breakers and
+hedging: --fault 503 (or 429, or timeout) --fault-rate 0.3 --fault-path /vep,
+or at runtime with POST /__faults {"status": "timeout", "rate": 1, "delay": 5}
+(an empty object clears them). A timeout fault holds the response for --fault-delay
+seconds before answering normally.
+
+Bulk VEP (POST /vep/human/hgvs) is answered from the recorded per-notation GETs;
+notations missing from the cassette are left out of the answer, so the client
+falls back to (and, with --record, records) the GET.
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import requests
+
+
+def request_key(method, path, query):
+    split = urlsplit(path)
+    params = sorted(parse_qsl(query if query is not None else split.query, keep_blank_values=True))
+    return f"{method} {unquote(split.path)}?{'&'.join(f'{k}={v}' for k, v in params)}"
+
+
+class Cassette:
+    def __init__(self, path=None, data=None):
+        self.path = path
+        if data is None:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        self.meta = data.get("meta", {})
+        self.interactions = {}
+        for item in data.get("interactions", []):
+            req = item["request"]
+            self.interactions[request_key(req["method"], req["path"], req.get("query", ""))] = item
+        self.dirty = False
+
+    def lookup(self, key):
+        return self.interactions.get(key)
+
+    def add(self, key, item):
+        self.interactions[key] = item
+        self.dirty = True
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({"meta": self.meta, "interactions": list(self.interactions.values())}, f, indent=1, sort_keys=True)
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.misses = 0
+        self.faults = 0
+        self.by_endpoint = {}
+
+    def record(self, path, hit):
+        endpoint = urlsplit(path).path.rsplit('/', 1)[0]
+        with self.lock:
+            self.requests += 1
+            self.misses += 0 if hit else 1
+            self.by_endpoint[endpoint] = self.by_endpoint.get(endpoint, 0) + 1
+
+    def record_fault(self):
+        with self.lock:
+            self.faults += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": self.requests, "misses": self.misses, "faults": self.faults,
+                    "by_endpoint": dict(self.by_endpoint)}
+
+
+class Faults:
+    """Injected failures: an HTTP status (429 and 503 carry Retry-After) or "timeout"."""
+    def __init__(self, status=None, rate=1.0, path="", delay=60.0, retry_after=0, seed=0):
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.update({"status": status, "rate": rate, "path": path, "delay": delay, "retry_after": retry_after})
+
+    def update(self, config):
+        with self.lock:
+            status = config.get("status")
+            self.status = None if status in (None, "") else (status if status == "timeout" else int(status))
+            self.rate = float(config.get("rate", 1.0))
+            self.path = config.get("path") or ""
+            self.delay = float(config.get("delay", 60.0))
+            self.retry_after = int(config.get("retry_after", 0))
+
+    def snapshot(self):
+        with self.lock:
+            return {"status": self.status, "rate": self.rate, "path": self.path, "delay": self.delay,
+                    "retry_after": self.retry_after}
+
+    def pick(self, path):
+        """The fault to inject for a request to path, if any."""
+        with self.lock:
+            if self.status is None or not path.startswith(self.path) or self.random.random() >= self.rate:
+                return None
+            return self.status
+
+
+N1C_UPSTREAM = "https://gene-registry.onrender.com"
+N1C_PATHS = ("/api/data",)
+
+
+def make_handler(cassette, stats, latency=0.0, upstream=None, n1c_upstream=N1C_UPSTREAM, faults=None):
+    lock = threading.Lock()
+    faults = faults or Faults()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; avoid the delayed-ACK stall on keep-alive connections
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            payload = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _record(self, key):
+            split = urlsplit(self.path)
+            base = n1c_upstream if split.path.startswith(N1C_PATHS) else upstream
+            url = base.rstrip('/') + self.path
+            resp = requests.get(url, headers={"Accept": "application/json"}, timeout=60)
+            try:
+                body = resp.json()
+            except ValueError:
+                body = resp.text
+            item = {"request": {"method": "GET", "path": unquote(split.path), "query": split.query},
+                    "response": {"status": resp.status_code, "body": body}}
+            if resp.status_code < 500 and resp.status_code != 429:
+                with lock:
+                    cassette.add(key, item)
+            return item
+
+        def do_GET(self):
+            split = urlsplit(self.path)
+            if split.path == '/__stats':
+                return self._send(200, stats.snapshot())
+            if split.path == '/__faults':
+                return self._send(200, faults.snapshot())
+            fault = faults.pick(split.path)
+            if fault is not None:
+                stats.record_fault()
+                if fault != "timeout":
+                    headers = {"Retry-After": str(faults.retry_after)} if fault in (429, 503) else None
+                    return self._send(fault, {"error": f"injected fault {fault}"}, headers)
+                time.sleep(faults.delay)
+            key = request_key("GET", self.path, None)
+            item = cassette.lookup(key)
+            if item is None and upstream:
+                item = self._record(key)
+            stats.record(self.path, item is not None)
+            if latency:
+                time.sleep(latency)
+            if item is None:
+                return self._send(404, {"error": f"not in cassette: {key}"})
+            return self._send(item["response"]["status"], item["response"]["body"])
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length)
+            if path == '/__stats':
+                stats.reset()
+                return self._send(200, {"reset": True})
+            if path == '/__faults':
+                faults.update(json.loads(body or b"{}"))
+                return self._send(200, faults.snapshot())
+            if path == '/vep/human/hgvs':
+                return self._bulk_vep_hgvs(json.loads(body or b"{}"))
+            return self._send(405, {"error": "method not allowed"})
+
+        def _bulk_vep_hgvs(self, payload):
+            fault = faults.pick(self.path)
+            if fault is not None:
+                stats.record_fault()
+                if fault != "timeout":
+                    headers = {"Retry-After": str(faults.retry_after)} if fault in (429, 503) else None
+                    return self._send(fault, {"error": f"injected fault {fault}"}, headers)
+                time.sleep(faults.delay)
+            answers = []
+            for notation in payload.get("hgvs_notations", []):
+                item = cassette.lookup(request_key("GET", f"/vep/human/hgvs/{notation}", "variant_class=1"))
+                if item and item["response"]["status"] == 200 and isinstance(item["response"]["body"], list):
+                    answers.extend(item["response"]["body"])
+            stats.record(self.path + "/", True)
+            if latency:
+                time.sleep(latency)
+            return self._send(200, answers)
+
+    return Handler
+
+
+def serve(cassette, port=0, latency=0.0, upstream=None, n1c_upstream=N1C_UPSTREAM, faults=None):
+    """Starts the stub in a daemon thread; returns (server, stats). server.server_port has the bound port."""
+    stats = Stats()
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(cassette, stats, latency, upstream, n1c_upstream, faults))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cassette', required=True)
+    parser.add_argument('--port', type=int, default=18090)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--record', metavar='UPSTREAM', help="forward unknown requests to this base URL and save them")
+    parser.add_argument('--n1c-upstream', default=N1C_UPSTREAM, help="upstream for N1C registry paths when recording")
+    parser.add_argument('--fault', help="inject this failure: an HTTP status (e.g. 429, 503) or 'timeout'")
+    parser.add_argument('--fault-rate', type=float, default=1.0, help="fraction of requests that fail (default 1)")
+    parser.add_argument('--fault-path', default="", help="only inject into paths with this prefix")
+    parser.add_argument('--fault-delay', type=float, default=60.0, help="seconds a 'timeout' fault holds the response")
+    args = parser.parse_args(argv)
+    # Save a recorded cassette when stopped by bench/run.py as well as by Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    if args.record and not os.path.exists(args.cassette):
+        cassette = Cassette(args.cassette, {"meta": {"source": args.record, "recorded": time.strftime('%Y-%m-%d')}})
+    else:
+        cassette = Cassette(args.cassette)
+    faults = Faults(args.fault, args.fault_rate, args.fault_path, args.fault_delay)
+    server, _ = serve(cassette, args.port, args.latency, args.record, args.n1c_upstream, faults)
+    print(f"Replaying {len(cassette.interactions)} interactions on http://127.0.0.1:{server.server_port}", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.shutdown()
+        if cassette.dirty:
+            cassette.save()
+            print(f"Saved {len(cassette.interactions)} interactions to {args.cassette}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Builds a SYNTHETIC cassette for the benchmark corpus.
+
+The responses have the shape of the Ensembl REST and N1C registry responses
+the app consumes, but gene models, sequences, variants and domains are
+generated deterministically from the corpus rows. They exercise the same code
+paths and call counts as real data and are fine for regression tracking, but
+the resulting classifications are meaningless. Record a real cassette with
+`stub_server.py --record` for representative numbers.
+
+    python bench/synthetic.py > bench/cassettes/synthetic.json
+"""
+import csv
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus.csv')
+ENSEMBL_RELEASE = 113
+CODONS = [a + b + c for a in "ACGT" for b in "ACGT" for c in "ACGT" if a + b + c not in ("TAA", "TAG", "TGA")]
+
+
+def read_corpus(path=CORPUS_PATH):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _seed(text):
+    return int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:12], 16)
+
+
+def _vep_hgvs(query):
+    """The HGVS string the app sends to VEP for a query (mirrors app.parse_hgvs_query)."""
+    match = re.search(r'([^:]+):([cgnmp]\..*)', query, re.IGNORECASE)
+    if match:
+        return f"{match.group(1).strip()}:{match.group(2).strip()}"
+    gene, variant = query.split(None, 1)
+    return f"{gene.strip()}:{variant.strip()}"
+
+
+def _gene_model(gene, chrom, anchor, intronic):
+    """Twelve exons around `anchor`; the anchor falls in an exon (or the intron after it)."""
+    rng = random.Random(_seed(gene))
+    n = _seed(gene) % 10**9
+    ids = {"gene": f"ENSG{n:011d}", "transcript": f"ENST{n:011d}", "protein": f"ENSP{n:011d}"}
+    lengths = [rng.choice((96, 117, 132, 150, 171, 204, 100, 128)) for _ in range(12)]
+    target = 2 + n % 8
+    introns = [rng.randint(800, 4000) for _ in range(12)]
+    starts = [0] * 12
+    if intronic:
+        starts[target] = anchor - 40 - lengths[target]
+    else:
+        starts[target] = anchor - lengths[target] // 2
+    for i in range(target + 1, 12):
+        starts[i] = starts[i - 1] + lengths[i - 1] + introns[i]
+    for i in range(target - 1, -1, -1):
+        starts[i] = starts[i + 1] - introns[i] - lengths[i]
+    exons = [{"id": f"ENSE{n:08d}{i:03d}", "start": s, "end": s + length - 1, "seq_region_name": chrom}
+             for i, (s, length) in enumerate(zip(starts, lengths))]
+    # CDS from inside the first exon to inside the last
+    cds_start, cds_end = exons[0]["start"] + 30, exons[-1]["end"] - 40
+    cds_len = sum(min(e["end"], cds_end) - max(e["start"], cds_start) + 1 for e in exons)
+    codons = cds_len // 3 - 2
+    seq = "ATG" + "".join(rng.choice(CODONS) for _ in range(codons)) + "TAA"
+    seq += "A" * (cds_len - len(seq))
+    return ids, exons, (cds_start, cds_end), seq, target
+
+
+def _region_variants(rng, chrom, exon):
+    classes = ["pathogenic", "likely pathogenic", "benign", "uncertain significance", None]
+    terms = ["missense_variant", "synonymous_variant", "stop_gained", "frameshift_variant",
+             "splice_donor_variant", "inframe_deletion"]
+    out = []
+    for i in range(rng.randint(5, 40)):
+        pos = rng.randint(exon["start"], exon["end"])
+        significance = rng.choice(classes)
+        out.append({"id": f"rs{rng.randint(10**6, 10**9)}", "seq_region_name": chrom, "start": pos, "end": pos,
+                    "consequence_type": rng.choice(terms),
+                    "clinical_significance": [significance] if significance else []})
+    return out
+
+
+def _domains(rng, protein_len):
+    sources = ["Pfam", "SMART", "CDD", "PROSITE profiles", "MobiDBLite", "Gene3D"]
+    out = []
+    for i in range(rng.randint(1, 6)):
+        start = rng.randint(1, max(1, protein_len - 60))
+        out.append({"type": rng.choice(sources), "interpro": f"IPR{rng.randint(0, 99999):06d}", "id": f"PF{i:05d}",
+                    "start": start, "end": min(protein_len, start + rng.randint(20, 120)),
+                    "description": f"Synthetic domain {i + 1}"})
+    return out
+
+
+def build_cassette(rows):
+    interactions = {}
+
+    def add(path, query, body, status=200):
+        interactions[(path, query)] = {"request": {"method": "GET", "path": path, "query": query},
+                                       "response": {"status": status, "body": body}}
+
+    add("/info/data", "", {"releases": [ENSEMBL_RELEASE]})
+    models = {}
+    for row in rows:
+        gene, chrom, pos = row["gene"], row["chrom"], int(row["pos"])
+        intronic = row["consequence"] == "intron_variant"
+        if gene not in models:
+            models[gene] = _gene_model(gene, chrom, pos, intronic)
+        ids, exons, (cds_start, cds_end), seq, target = models[gene]
+        rng = random.Random(_seed(gene + row["query"]))
+
+        hgvs = _vep_hgvs(row["query"])
+        refseq = row["query"].split(":")[0] if row["query"].startswith("NM_") else "NM_000000.1"
+        consequence = {"gene_symbol": gene, "gene_id": ids["gene"], "transcript_id": ids["transcript"],
+                       "biotype": "protein_coding", "canonical": 1, "mane_select": refseq,
+                       "consequence_terms": [row["consequence"]], "cds_start": 1, "cds_end": len(seq)}
+        add(f"/vep/human/hgvs/{hgvs}", "variant_class=1", [{
+            "input": hgvs, "id": hgvs, "seq_region_name": chrom, "start": pos, "end": pos,
+            "allele_string": f"{row['ref']}/{row['alt']}", "strand": 1,
+            "transcript_consequences": [consequence]}])
+
+        translation = {"id": ids["protein"], "start": cds_start, "end": cds_end}
+        add(f"/lookup/id/{ids['transcript']}", "expand=1", {
+            "id": ids["transcript"], "Parent": ids["gene"], "display_name": f"{gene}-201", "strand": 1,
+            "seq_region_name": chrom, "start": exons[0]["start"], "end": exons[-1]["end"],
+            "Translation": translation, "Exon": exons})
+        add(f"/sequence/id/{ids['transcript']}", "type=cds", {"id": ids["transcript"], "seq": seq})
+        for exon in exons:
+            add(f"/overlap/region/human/{chrom}:{exon['start']}-{exon['end']}", "feature=variation",
+                _region_variants(random.Random(_seed(exon["id"])), chrom, exon))
+        add(f"/overlap/translation/{ids['protein']}", "feature=protein_feature", _domains(rng, len(seq) // 3))
+        overlapping = [{"id": ids["gene"], "external_name": gene, "biotype": "protein_coding", "strand": 1}]
+        if _seed(gene) % 3 == 0:
+            overlapping.append({"id": f"ENSG9{_seed(gene) % 10**10:010d}", "external_name": f"{gene}-AS1",
+                                "biotype": "lncRNA", "strand": -1})
+        add(f"/overlap/id/{ids['gene']}", "feature=gene", overlapping)
+        add(f"/lookup/symbol/human/{gene}-AS1", "expand=0", {"error": f"No valid lookup found for symbol {gene}-AS1"}, 400)
+
+    # N1C registry tables: a few corpus genes with unrelated variants plus one exact match
+    genes = sorted(models)
+    projects = [{"ID": i + 1, "Gene": g, "Coding DNA change (c.)": f"c.{100 + i}del", "Status": "Preclinical",
+                 "Therapeutic Modality": "ASO", "Therapy Publication": ""} for i, g in enumerate(genes[:8])]
+    first = rows[0]
+    projects.append({"ID": 999, "Gene": first["gene"], "Coding DNA change (c.)": _vep_hgvs(first["query"]).split(":")[1],
+                     "Status": "Treated", "Therapeutic Modality": "ASO", "Therapy Publication": ""})
+    add("/api/data", "table=N1C_projects", projects)
+    add("/api/data", "table=assessed_variants", [
+        {"Gene": g, "Variant (c.)": f"c.{200 + i}G>A", "Eligibility": "Not Eligible", "Link": ""}
+        for i, g in enumerate(genes[8:14])])
+
+    return {"meta": {"synthetic": True, "ensembl_release": ENSEMBL_RELEASE,
+                     "note": "Generated by bench/synthetic.py; not real Ensembl data."},
+            "interactions": list(interactions.values())}
+
+
+if __name__ == '__main__':
+    json.dump(build_cassette(read_corpus(sys.argv[1] if len(sys.argv) > 1 else CORPUS_PATH)), sys.stdout, indent=1, sort_keys=True)
@@ -0,0 +1,36 @@
+import os
+
+# Default to loading app.py (and with it all reference data) in the master before
+# forking so workers share the tables copy-on-write. With AVEC_LOAD_MODE=background
+# each worker starts serving immediately and loads its own copy in a thread, which
+# cannot happen in the master (threads do not survive fork).
+os.environ.setdefault("AVEC_LOAD_MODE", "preload")
+preload_app = os.environ["AVEC_LOAD_MODE"] == "preload"
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# Exported so that the app divides the shared Ensembl rate (AVEC_ENSEMBL_RATE) between the workers
+workers = int(os.environ.setdefault("WEB_CONCURRENCY", "2"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "600"))
+
+
+def _memory():
+    from app import process_memory
+    return process_memory()
+
+
+def when_ready(server):
+    server.log.info("Master ready, memory kB: %s", _memory())
+
+
+def post_fork(server, worker):
+    # Baseline right after fork: Private_* should be small, Shared_* large.
+    worker.log.info("Worker %s forked, memory kB: %s", worker.pid, _memory())
+    if preload_app:
+        # The watcher and prewarm threads have to be started after fork to exist in the worker
+        from app import start_prewarmer, start_reference_watcher
+        start_reference_watcher()
+        start_prewarmer()
+
+
+def worker_exit(server, worker):
+    # Compare against the post_fork line to see how many shared pages were copied.
+    worker.log.info("Worker %s exiting, memory kB: %s", worker.pid, _memory())